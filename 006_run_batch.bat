@@ -0,0 +1,2 @@
+@echo off
+python batch_runner.py requests.jsonl --output batch_results.jsonl %*
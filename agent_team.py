@@ -0,0 +1,375 @@
+import os
+
+import autogen
+from autogen.io import IOStream
+
+from artifact_store import artifact_store_from_env
+from async_runtime import in_async_chat
+from code_execution import build_code_execution_config, close_pool
+from early_termination import CompletionDetector
+from execution_cache import execution_cache_from_env, invalidate_on_new_code
+from fan_out import attach_review_fan_out
+from history_compaction import attach_history_compaction
+from model_router import shared_router
+from ollama_transport import pooled_llm_config, register_pooled_clients
+from speaker_selection import StateMachineSpeakerSelector, message_text, pipeline_transitions
+from speculative_execution import speculative_execution_from_env
+from streaming import ConversationStream
+from token_budget import attach_token_accounting
+from tracing import instrument_team
+
+# --- System Messages ---
+ADMIN_SYSTEM_MESSAGE = "A human administrator who initiates tasks and reviews final outcomes. You will execute tests and report results as requested by other agents. Do not ask for human input during the conversation."
+
+CODER_SYSTEM_MESSAGE = """You are a helpful AI assistant specialized in Python programming.
+    You can write Python code, explain concepts, and debug issues.
+    When you provide code, ensure it is complete, runnable, and follows good practices including documentation.
+    If you need to run code or tests, suggest it and wait for approval.
+    Once the task is complete, reply with 'TERMINATE' to end the conversation."""
+
+REVIEWER_SYSTEM_MESSAGE = """You are a meticulous Code Reviewer.
+    Your sole role is to provide feedback, suggestions, and critique on **any Python code presented in the conversation, including application code and test code.**
+    **NEVER write or rewrite any code yourself.**
+    **NEVER suggest specific code implementations.** Instead, describe *what* needs to be changed or improved conceptually.
+
+    Focus on the following aspects of the code:
+    - **Correctness:** Does it solve the problem accurately and without bugs (for application code) or does it accurately test the application code (for test code)?
+    - **Efficiency:** Can it be optimized for speed or resource usage?
+    - **Readability & Style (PEP 8):** Does it follow Python's PEP 8 style guide for formatting, naming conventions, and overall code structure?
+    - **Documentation (PEP 257 for Docstrings):**
+        - **Docstrings:** Are all public modules, classes, functions, and methods properly documented with clear, concise docstrings following PEP 257 conventions?
+        - **Comments:** Are inline comments used judiciously to explain complex logic or non-obvious parts of the code where necessary?
+    - **Edge Cases:** Does the code handle potential edge cases and error conditions gracefully (for application code) or does it include tests for these (for test code)?
+    - **Test Coverage (for test code):** Does the test code adequately cover the functionality of the application code? Are there enough test cases?
+
+    Provide constructive feedback and suggest improvements for all the above points.
+    If the code is flawless and needs no changes, respond with: 'Looks good!'
+    If changes are needed, clearly explain the areas for improvement.
+    Once the code is approved or deemed perfect, you are done.
+    """
+
+TEST_ENGINEER_SYSTEM_MESSAGE = """You are a skilled Test Engineer specialized in Python.
+    Your primary role is to create comprehensive unit tests for the Python code provided by the Coder.
+    Your tests should:
+    - Be written using Python's `unittest` or `pytest` framework (prefer `unittest` for simplicity if not specified).
+    - Cover various scenarios, including normal cases, edge cases, and invalid inputs.
+    - Assert the correctness of the Coder's functions.
+    - Be self-contained and runnable.
+    Once the test code is complete, **present it to the Reviewer for their feedback before requesting execution by the Admin.**
+    After the test code has been reviewed and approved, then you can request the Admin to execute the tests.
+    If tests look good and no more test cases are needed, signal approval for the main script to proceed.
+    """
+
+
+# --- Model Configuration ---
+def config_list_from_env(provider="auto"):
+    """
+    Build a config_list for 'openai' (gpt-4, gpt-3.5-turbo with OPENAI_API_KEY) or
+    'ollama' (llama2:13b on OLLAMA_BASE_URL). 'auto' prefers OpenAI when a key is set.
+    """
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+    if provider == "auto":
+        provider = "openai" if openai_api_key else "ollama"
+    if provider == "openai":
+        if not openai_api_key:
+            raise ValueError("OPENAI_API_KEY not found in environment variables. Please set it in your .env file or as an environment variable.")
+        return [
+            {"model": "gpt-4", "api_key": openai_api_key},
+            {"model": "gpt-3.5-turbo", "api_key": openai_api_key},
+        ]
+    if provider == "ollama":
+        return [
+            {
+                "model": os.getenv("OLLAMA_MODEL", "llama2:13b"),
+                "api_type": "ollama",
+                "base_url": os.getenv("OLLAMA_BASE_URL", "http://localhost:11434/api"),
+            }
+        ]
+    raise ValueError(f"Unknown LLM provider '{provider}'. Expected 'openai', 'ollama' or 'auto'.")
+
+
+# --- Message Logger ---
+def stream_message_logger(recipient, messages, sender, config):
+    """
+    Reply function that reports every finished message to the team's ConversationStream.
+    It runs right before 'recipient' generates its reply, so the logged message is final
+    and the recipient's streamed tokens belong to the next message block.
+    """
+    if in_async_chat():
+        return False, None  # a_stream_message_logger reports it.
+    return _log_message(recipient, messages, sender, config)
+
+
+# Already async-aware: AsyncRuntime.adapt() leaves it on the loop.
+stream_message_logger._async_twinned = True
+
+
+async def a_stream_message_logger(recipient, messages, sender, config):
+    """stream_message_logger for conversations run with a_initiate_chat (see async_runtime)."""
+    return _log_message(recipient, messages, sender, config)
+
+
+def _log_message(recipient, messages, sender, config):
+    message = messages[-1] if messages else {}
+    # In a group chat 'sender' is the chat manager; the original speaker is in 'name'.
+    config["stream"].message_received(message.get("name", sender.name), recipient.name, message_text(message))
+    return False, None
+
+
+def register_logger_to_agent(agent, stream):
+    for reply_func in (stream_message_logger, a_stream_message_logger):
+        agent.register_reply(
+            [autogen.Agent, None],  # Trigger for any agent or None (which covers initiation messages)
+            reply_func=reply_func,
+            config={"stream": stream},
+            ignore_async_in_sync_chat=True,
+        )
+
+
+class AgentTeam:
+    """
+    One independent Admin/Coder/Reviewer/Test_Engineer group chat.
+
+    Every conversation that may run concurrently with another one (background jobs, batch
+    tasks) gets its own team, so agents, chat histories and the speaker selector state are
+    never shared between conversations.
+    """
+
+    def __init__(self, user_proxy, coder, reviewer, test_engineer, groupchat, manager,
+                 speaker_selector, stream=None, cache=None, compaction=None, execution_cache=None,
+                 completion=None, fan_out=None, tokens=None, speculation=None, artifacts=None, work_dir=None):
+        self.user_proxy = user_proxy
+        self.coder = coder
+        self.reviewer = reviewer
+        self.test_engineer = test_engineer
+        self.groupchat = groupchat
+        self.manager = manager
+        self.speaker_selector = speaker_selector
+        self.stream = stream
+        self.cache = cache
+        self.compaction = compaction
+        self.execution_cache = execution_cache
+        self.completion = completion
+        self.fan_out = fan_out
+        self.tokens = tokens
+        self.speculation = speculation
+        self.artifacts = artifacts
+        self.work_dir = work_dir
+        # Stats of the work dir's warm interpreter pool, taken when close() shuts it down.
+        self.code_execution = None
+        # Set by tracing.instrument_team() when the conversation is traced.
+        self.tracer = None
+        # Set by checkpoint.CheckpointWriter.attach() when the conversation is checkpointed.
+        self.checkpoint = None
+
+    @property
+    def agents(self):
+        return [self.user_proxy, self.coder, self.reviewer, self.test_engineer]
+
+    def run(self, prompt):
+        """
+        Run the conversation to completion and return AutoGen's ChatResult. Teams built
+        without a stream (the CLI scripts) keep AutoGen's console input/output.
+        """
+        if self.checkpoint is not None:
+            self.checkpoint.start(prompt)
+        return self._converse(lambda: self.user_proxy.initiate_chat(self.manager, message=prompt, cache=self.cache))
+
+    def resume(self, state):
+        """
+        Continue an interrupted conversation from a checkpoint.CheckpointState. The
+        recorded messages are loaded with GroupChatManager.resume(), so none of their LLM
+        calls are made again, and the chat goes on from the last recorded message.
+        """
+        last_agent, last_message = self._load(state)
+        return self._converse(lambda: last_agent.initiate_chat(
+            self.manager, message=last_message, clear_history=False, cache=self.cache))
+
+    def _load(self, state):
+        messages = [dict(m) for m in state.messages]
+        if self.completion is not None:
+            for message in messages[:-1]:
+                self.completion(message)
+        last_agent, last_message = self.manager.resume(messages=messages)
+        # max_round is the budget of the whole conversation, not of each run.
+        self.groupchat.max_round = max(2, self.groupchat.max_round - len(messages) + 1)
+        return last_agent, last_message
+
+    def _converse(self, start_chat):
+        first = len(self.groupchat.messages)
+        try:
+            if self.stream is None:
+                result = start_chat()
+            else:
+                with IOStream.set_default(self.stream):
+                    result = start_chat()
+            return self._finish(result, first)
+        finally:
+            self.close()
+
+    # --- Async ---
+    async def a_run(self, prompt):
+        """run() on the event loop with a_initiate_chat; use async_runtime.AsyncRuntime.run() to drive it."""
+        if self.checkpoint is not None:
+            self.checkpoint.start(prompt)
+        return await self._a_converse(lambda: self.user_proxy.a_initiate_chat(
+            self.manager, message=prompt, cache=self.cache))
+
+    async def a_resume(self, state):
+        last_agent, last_message = self._load(state)
+        return await self._a_converse(lambda: last_agent.a_initiate_chat(
+            self.manager, message=last_message, clear_history=False, cache=self.cache))
+
+    async def _a_converse(self, start_chat):
+        first = len(self.groupchat.messages)
+        try:
+            if self.stream is None:
+                result = await start_chat()
+            else:
+                # IOStream's default is a context variable, so every conversation task has its own.
+                with IOStream.set_default(self.stream):
+                    result = await start_chat()
+            return self._finish(result, first)
+        finally:
+            self.close()
+
+    def _finish(self, result, first):
+        """'first' is the index of the first message this run posted; earlier ones were loaded by resume()."""
+        if self.stream is not None:
+            messages = self.groupchat.messages
+            self.stream.finish(messages[-1] if len(messages) > first else None, len(messages) - first)
+        if self.checkpoint is not None:
+            self.checkpoint.finish()
+        return result
+
+    def close(self):
+        """
+        Release what the conversation holds outside its agents: the checkpoint's writer
+        thread, the speculation sandbox and the warm interpreter pool of the work dir.
+        Called when a run ends, also when it fails or is cancelled; a later resume()
+        starts them again.
+        """
+        if self.checkpoint is not None:
+            self.checkpoint.flush()
+        if self.speculation is not None:
+            self.speculation.close()
+        if self.work_dir is not None:
+            pool = close_pool(self.work_dir)
+            if pool is not None:
+                self.code_execution = pool.stats()
+
+
+SYSTEM_MESSAGES = {
+    "Admin": ADMIN_SYSTEM_MESSAGE,
+    "Coder": CODER_SYSTEM_MESSAGE,
+    "Reviewer": REVIEWER_SYSTEM_MESSAGE,
+    "Test_Engineer": TEST_ENGINEER_SYSTEM_MESSAGE,
+}
+
+
+def build_team(config_list=None, work_dir="coding", view=None, cache=None, stream_tokens=True,
+               human_input_mode="NEVER", max_round=30, echo=False, tracer=None, llm_config=None,
+               system_messages=None, code_executors=("Admin",), admin_llm=True, console=False):
+    """
+    Build a fresh agent team wired to its own ConversationStream.
+
+    'view' receives the conversation as it happens (see streaming.ConversationStream);
+    'cache' is an optional shared llm_cache.ResponseCache; 'echo' prints AutoGen's
+    console output, which is otherwise swallowed by the stream; 'tracer' is an optional
+    tracing.Tracer that records the conversation's spans.
+
+    The CLI scripts build their teams here too: 'llm_config' replaces the config built
+    from 'config_list', 'system_messages' overrides the prompts per role,
+    'code_executors' names the agents that run code, 'admin_llm=False' leaves the Admin
+    without a model, and 'console=True' keeps AutoGen's console input/output instead of
+    a ConversationStream (tokens are then not streamed).
+    """
+    # "cache_seed": None turns off AutoGen's legacy per-seed cache in favour of 'cache'.
+    llm_config = llm_config or {"config_list": config_list, "cache_seed": None}
+    config_list = llm_config["config_list"]
+    system_messages = {**SYSTEM_MESSAGES, **(system_messages or {})}
+    # The manager keeps a non-streaming config so LLM speaker selection never leaks into a message block.
+    agent_llm_config = {**llm_config, "stream": True} if stream_tokens and not console else llm_config
+    # Agents reach Ollama through the shared pooled transport; the manager keeps AutoGen's
+    # client because LLM speaker selection builds throwaway agents from its llm_config.
+    agent_llm_config = pooled_llm_config(agent_llm_config)
+    stream = None if console else ConversationStream(view, echo=echo)
+
+    # One process-wide router assigns models per role and fails over on slow/failing models.
+    router = shared_router()
+
+    def routed(role, config):
+        return router.route_llm_config(role, config) if router else config
+
+    # Repeated executions of unchanged code against unchanged files are answered from memory.
+    execution_cache = execution_cache_from_env(work_dir)
+    # Opt-in: code is run in a sandbox while the Reviewer reviews it (see speculative_execution).
+    speculation = speculative_execution_from_env(work_dir)
+    # Large code blocks and outputs are kept once on disk and referenced from messages.
+    artifacts = artifact_store_from_env(os.path.join(work_dir, ".artifacts"))
+
+    def code_execution_config(name):
+        if name not in code_executors:
+            return False
+        return build_code_execution_config(work_dir, cache=execution_cache, speculation=speculation,
+                                           artifacts=artifacts)
+
+    user_proxy = autogen.UserProxyAgent(
+        name="Admin",
+        system_message=system_messages["Admin"],
+        llm_config=routed("Admin", pooled_llm_config(llm_config)) if admin_llm else False,
+        human_input_mode=human_input_mode,
+        code_execution_config=code_execution_config("Admin"),
+        is_termination_msg=lambda x: (x.get("content") or "").rstrip().endswith("TERMINATE"),
+    )
+    coder, reviewer, test_engineer = (
+        autogen.AssistantAgent(
+            name=name,
+            llm_config=routed(name, agent_llm_config),
+            system_message=system_messages[name],
+            code_execution_config=code_execution_config(name),
+        )
+        for name in ("Coder", "Reviewer", "Test_Engineer")
+    )
+    agents = [user_proxy, coder, reviewer, test_engineer]
+    if stream is not None:
+        for agent in agents:
+            register_logger_to_agent(agent, stream)
+
+    # The pipeline is fixed, so the next speaker is picked by a transition graph; the
+    # GroupChatManager's LLM is only consulted when no transition matches.
+    speaker_selector = StateMachineSpeakerSelector(pipeline_transitions())
+    groupchat = autogen.GroupChat(
+        agents=agents,
+        messages=[],
+        max_round=max_round,
+        speaker_selection_method=speaker_selector,
+    )
+    # The chat ends as soon as the pipeline's milestones are met or the agents loop.
+    completion = CompletionDetector.from_env()
+    manager = autogen.GroupChatManager(groupchat=groupchat, llm_config=routed("chat_manager", llm_config),
+                                       is_termination_msg=completion)
+    register_pooled_clients(agents)
+    # Each Coder revision is reviewed and tested concurrently (see fan_out).
+    fan_out = attach_review_fan_out(groupchat, manager, coder, reviewer, test_engineer)
+    if speculation is not None:
+        speculation.attach(groupchat, reviewer)
+    if router is not None:
+        router.attach(agents + [manager])
+    if execution_cache is not None:
+        invalidate_on_new_code([agent for agent in agents if agent.name in code_executors], execution_cache)
+    if artifacts is not None:
+        artifacts.attach(groupchat, agents + [manager], stream)
+    # Superseded code and old reviews are compacted before each LLM call (see history_compaction).
+    compaction = attach_history_compaction(agents)
+    # Every LLM request is counted per agent and round, within the configured token budgets.
+    tokens = attach_token_accounting(groupchat, agents + [manager], compaction, config_list)
+
+    team = AgentTeam(user_proxy, coder, reviewer, test_engineer, groupchat, manager,
+                     speaker_selector, stream, cache=cache, compaction=compaction,
+                     execution_cache=execution_cache, completion=completion,
+                     fan_out=fan_out, tokens=tokens, speculation=speculation,
+                     artifacts=artifacts, work_dir=work_dir)
+    if tracer is not None:
+        instrument_team(team, tracer)
+    return team
@@ -1,160 +1,226 @@
+import time
+
 import streamlit as st
-import autogen
 import os
 from dotenv import load_dotenv
 
+# AutoGen and the agent stack (agent_team) are imported by the job worker when the first
+# conversation starts, never on a page rerun; see 'python import_profile.py' for the cost.
+from checkpoint import checkpoint_path, load_checkpoint
+from job_runner import JobRunner, job_team_factory
+from llm_cache import ResponseCache
+from tracing import tracing_enabled
+
+_rerun_start = time.perf_counter()
+
+# How often (seconds) the conversation log polls a running job for new messages.
+POLL_INTERVAL = 1.0
+# Messages drawn per page of the conversation log; older pages are only drawn when picked.
+LOG_PAGE_SIZE = int(os.getenv("LOG_PAGE_SIZE", "20"))
+
 # --- Streamlit Session State Initialization ---
-if "chat_history" not in st.session_state:
-    st.session_state.chat_history = []
-if "is_chatting" not in st.session_state:
-    st.session_state.is_chatting = False
+if "job_id" not in st.session_state:
+    # A job id in the URL lets a reloaded page reattach to a conversation that is still running.
+    st.session_state.job_id = st.query_params.get("job")
 
 # --- AutoGen Configuration ---
-load_dotenv()
-openai_api_key = os.getenv("OPENAI_API_KEY")
+@st.cache_resource
+def load_app_config():
+    """Read .env once per server process; returns the hashable config the job runner is keyed on."""
+    load_dotenv()
+    models = tuple(m.strip() for m in os.getenv("OPENAI_MODELS", "gpt-4,gpt-3.5-turbo").split(",") if m.strip())
+    return os.getenv("OPENAI_API_KEY"), models
+
+
+def openai_config_list(api_key, models=("gpt-4", "gpt-3.5-turbo")):
+    return [
+        {
+            "model": model,
+            "api_key": api_key,
+        }
+        for model in models
+    ]
+
+
+openai_api_key, openai_models = load_app_config()
 
 if not openai_api_key:
     st.error("OPENAI_API_KEY not found. Please set it in your Streamlit secrets (for deployment) or in a .env file (for local development).")
     st.stop()
 
-config_list = [
-    {
-        "model": "gpt-4",
-        "api_key": openai_api_key,
-    },
-    {
-        "model": "gpt-3.5-turbo",
-        "api_key": openai_api_key
-    }
-]
-
-# --- Custom Message Logger for Streamlit ---
-# UPDATED: Changed the signature to include 'messages' and 'config'
-def custom_message_logger(recipient, messages, sender, config):
-    """
-    Callback function to log messages from AutoGen agents to Streamlit's session state.
-    This allows the Streamlit UI to display the ongoing conversation.
-    """
-    # The actual message content is typically the last message in the 'messages' list
-    message = messages[-1] if messages else {}
-
-    # Extract message content. AutoGen messages can have various structures.
-    content = message.get("content", "")
-    if isinstance(content, dict) and "message" in content:
-        content = content["message"]
-    elif not isinstance(content, str):
-        content = str(content)
-
-    st.session_state.chat_history.append({
-        "sender": sender.name,
-        "recipient": recipient.name,
-        "message": content
-    })
-    # This return is crucial for AutoGen's internal message handling to continue
-    return False, None # Return False, None to allow other reply functions to process if needed
-
-# --- Agent Definitions ---
-def register_logger_to_agent(agent):
-    # Register the custom_message_logger to be called whenever this agent sends a reply
-    # The 'reply_func' argument is used to specify the callback function
-    agent.register_reply(
-        [autogen.Agent, None], # Trigger for any agent or None (which covers initiation messages)
-        reply_func=custom_message_logger,
-        config={"callback": None}, # You can pass additional config if needed
-    )
-
-user_proxy = autogen.UserProxyAgent(
-    name="Admin",
-    system_message="A human administrator who initiates tasks and reviews final outcomes. You will execute tests and report results as requested by other agents. Do not ask for human input during the conversation.",
-    llm_config={"config_list": config_list},
-    human_input_mode="NEVER",
-    code_execution_config={
-        "work_dir": "coding",
-        "use_docker": False,
-    },
-    is_termination_msg=lambda x: x.get("content", "").rstrip().endswith("TERMINATE"),
-)
-register_logger_to_agent(user_proxy)
-
-assistant = autogen.AssistantAgent(
-    name="Coder",
-    llm_config={"config_list": config_list},
-    system_message="""You are a helpful AI assistant specialized in Python programming.
-    You can write Python code, explain concepts, and debug issues.
-    When you provide code, ensure it is complete, runnable, and follows good practices including documentation.
-    If you need to run code or tests, suggest it and wait for approval.
-    Once the task is complete, reply with 'TERMINATE' to end the conversation."""
-)
-register_logger_to_agent(assistant)
-
-reviewer = autogen.AssistantAgent(
-    name="Reviewer",
-    llm_config={"config_list": config_list},
-    system_message="""You are a meticulous Code Reviewer.
-    Your sole role is to provide feedback, suggestions, and critique on **any Python code presented in the conversation, including application code and test code.**
-    **NEVER write or rewrite any code yourself.**
-    **NEVER suggest specific code implementations.** Instead, describe *what* needs to be changed or improved conceptually.
-
-    Focus on the following aspects of the code:
-    - **Correctness:** Does it solve the problem accurately and without bugs (for application code) or does it accurately test the application code (for test code)?
-    - **Efficiency:** Can it be optimized for speed or resource usage?
-    - **Readability & Style (PEP 8):** Does it follow Python's PEP 8 style guide for formatting, naming conventions, and overall code structure?
-    - **Documentation (PEP 257 for Docstrings):**
-        - **Docstrings:** Are all public modules, classes, functions, and methods properly documented with clear, concise docstrings following PEP 257 conventions?
-        - **Comments:** Are inline comments used judiciously to explain complex logic or non-obvious parts of the code where necessary?
-    - **Edge Cases:** Does the code handle potential edge cases and error conditions gracefully (for application code) or does it include tests for these (for test code)?
-    - **Test Coverage (for test code):** Does the test code adequately cover the functionality of the application code? Are there enough test cases?
-
-    Provide constructive feedback and suggest improvements for all the above points.
-    If the code is flawless and needs no changes, respond with: 'Looks good!'
-    If changes are needed, clearly explain the areas for improvement.
-    Once the code is approved or deemed perfect, you are done.
+
+# --- Background Job Runner ---
+@st.cache_resource
+def get_job_runner(api_key, models):
     """
-)
-register_logger_to_agent(reviewer)
-
-test_engineer = autogen.AssistantAgent(
-    name="Test_Engineer",
-    llm_config={"config_list": config_list},
-    system_message="""You are a skilled Test Engineer specialized in Python.
-    Your primary role is to create comprehensive unit tests for the Python code provided by the Coder.
-    Your tests should:
-    - Be written using Python's `unittest` or `pytest` framework (prefer `unittest` for simplicity if not specified).
-    - Cover various scenarios, including normal cases, edge cases, and invalid inputs.
-    - Assert the correctness of the Coder's functions.
-    - Be self-contained and runnable.
-    Once the test code is complete, **present it to the Reviewer for their feedback before requesting execution by the Admin.**
-    After the test code has been reviewed and approved, then you can request the Admin to execute the tests.
-    If tests look good and no more test cases are needed, signal approval for the main script to proceed.
+    One JobRunner per server process and config, shared by every browser session. Each
+    submitted conversation gets its own agents and its own work dir under 'coding/', and
+    runs on a bounded worker pool (JOB_WORKERS, default 2) instead of the Streamlit
+    script thread. Reruns reuse the cached runner, so they build nothing.
     """
-)
-register_logger_to_agent(test_engineer)
-
-# --- Group Chat Setup ---
-groupchat = autogen.GroupChat(
-    agents=[user_proxy, assistant, reviewer, test_engineer],
-    messages=[],
-    max_round=30,
-    speaker_selection_method="auto",
-)
+    config_list = openai_config_list(api_key, models)
+    # The completion cache is shared across jobs; it is safe to use from several threads.
+    response_cache = ResponseCache.from_env()
+    return JobRunner.from_env(job_team_factory(config_list, cache=response_cache, entry="agentic_ai_ux"))
 
-manager = autogen.GroupChatManager(groupchat=groupchat, llm_config={"config_list": config_list})
 
+job_runner = get_job_runner(openai_api_key, openai_models)
 
-# --- Function to run the AutoGen conversation ---
-def run_autogen_conversation(prompt):
-    st.session_state.chat_history = []
-    st.session_state.is_chatting = True
 
-    try:
-        user_proxy.initiate_chat(
-            manager,
-            message=prompt
+# --- Conversation Rendering ---
+def render_message(target, sender, segments, key):
+    """
+    Render one finished message (its message_store segments) into a Streamlit container.
+    Code blocks are collapsed: each is drawn only while its toggle is on.
+    """
+    style = {"Admin": target.info, "Coder": target.success, "Reviewer": target.warning,
+             "Test_Engineer": target.error}.get(sender, target.write)
+    text, blocks = [], []
+    for segment in segments:
+        if segment[0] == "text":
+            text.append(segment[1])
+        else:
+            blocks.append(segment[1:])
+            text.append(f"`[code block {len(blocks)}: {segment[1]}]`")
+    style(f"**{sender}:**\n\n" + "\n".join(part.strip("\n") for part in text))
+    for n, (language, body) in enumerate(blocks, 1):
+        if target.toggle(f"Show code block {n} ({language}, {body.count(chr(10)) + 1} lines)", key=f"{key}-code-{n}"):
+            target.code(body, language=language)
+
+
+def log_window(job_id, total):
+    """
+    (start, stop) of the messages to draw: the latest LOG_PAGE_SIZE while following the
+    conversation, otherwise the page picked by the user.
+    """
+    pages = max(1, -(-total // LOG_PAGE_SIZE))
+    if pages == 1 or st.toggle("Follow latest messages", value=True, key=f"follow-{job_id}"):
+        return max(0, total - LOG_PAGE_SIZE), total
+    page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=pages, key=f"page-{job_id}")
+    start = (page - 1) * LOG_PAGE_SIZE
+    return start, min(total, start + LOG_PAGE_SIZE)
+
+
+def render_performance(trace, trace_file=None):
+    """Collapsible per-round waterfall of a traced job, plus time and token totals."""
+    totals = trace["totals"]
+    with st.expander("Performance", expanded=False):
+        seconds = totals["seconds"]
+        columns = st.columns(len(seconds) + 1)
+        columns[0].metric("Wall time", f"{totals['wall']:.1f}s")
+        for column, (phase, value) in zip(columns[1:], seconds.items()):
+            column.metric(phase.capitalize(), f"{value:.2f}s")
+        st.caption(f"{totals['rounds']} rounds, {totals['prompt_tokens']} prompt / "
+                   f"{totals['completion_tokens']} completion tokens.")
+        rows = [{"round": f"{s['round'] + 1:02d} {s['speaker']}".rstrip(), "span": s["name"], "phase": s["phase"],
+                 "start": round(s["start"], 3), "end": round(s["end"], 3),
+                 "ms": round((s["end"] - s["start"]) * 1000, 1), "model": s["args"].get("model") or ""}
+                for s in trace["spans"]]
+        if rows:
+            st.vega_lite_chart(rows, {
+                "mark": {"type": "bar"},
+                "encoding": {
+                    "y": {"field": "round", "type": "ordinal", "title": "Round"},
+                    "x": {"field": "start", "type": "quantitative", "title": "Seconds since start"},
+                    "x2": {"field": "end"},
+                    "color": {"field": "phase", "type": "nominal"},
+                    "tooltip": [{"field": "span"}, {"field": "ms"}, {"field": "model"}],
+                },
+            }, use_container_width=True)
+        if trace_file:
+            st.caption(f"Trace written to `{trace_file}` (Chrome trace format, open it in https://ui.perfetto.dev).")
+
+
+def render_token_usage(tokens):
+    """Collapsible token totals of a job: per agent, with budgets and the degradation steps taken."""
+    with st.expander(f"Tokens: {tokens['total_tokens']}", expanded=False):
+        columns = st.columns(4)
+        columns[0].metric("Prompt", tokens["prompt_tokens"])
+        columns[1].metric("Completion", tokens["completion_tokens"])
+        columns[2].metric("LLM calls", tokens["calls"])
+        columns[3].metric("Budget left", tokens["remaining"] if tokens["budget"] else "-")
+        st.dataframe([{"agent": name, **usage} for name, usage in tokens["agents"].items()],
+                     use_container_width=True, hide_index=True)
+        for action in tokens["actions"]:
+            st.caption(f"Round {action['round']}: {action['agent']} {action['action']} "
+                       f"({action['scope']} budget, {action['used']} of {action['budget']} tokens used).")
+
+
+def render_job(job):
+    """Render a job's status, one window of its finished messages and the message still being streamed."""
+    total = len(job.messages)
+    start, stop = log_window(job.id, total)
+    snapshot = job.snapshot(start, stop)
+    status = snapshot["status"]
+    if status == "queued":
+        st.info(f"Waiting for a free worker ({job_runner.queue_position(job)} conversations ahead).")
+    elif status == "running":
+        st.progress(snapshot["progress"], text=f"AI Agents are collaborating... "
+                    f"{snapshot['message_count']} messages, {snapshot['elapsed']:.0f}s elapsed.")
+    elif status == "failed":
+        st.error(f"An error occurred during the AutoGen conversation: {snapshot['error']}")
+    elif status == "cancelled":
+        st.warning("The conversation was cancelled.")
+
+    messages = snapshot["messages"]
+    if len(messages) < snapshot["message_count"]:
+        st.caption(f"Messages {start + 1}-{start + len(messages)} of {snapshot['message_count']}.")
+    for i, msg in enumerate(messages):
+        render_message(st, msg["sender"], msg["segments"], key=f"{job.id}-{start + i}")
+        if i < len(messages) - 1 or snapshot["partial"]:
+            st.markdown("---")
+    # The message being streamed belongs after the latest page only.
+    if snapshot["partial"] and stop >= total:
+        speaker, text = snapshot["partial"]
+        st.markdown(f"**{speaker}:**\n\n{text} ▌")
+
+    if not messages and not snapshot["partial"] and status in ("queued", "running"):
+        st.caption("Messages appear here as soon as the first agent starts answering.")
+
+    stats = snapshot["stats"].get("speaker_selection")
+    if stats:
+        st.caption(
+            f"Speaker selection: {stats['manager_calls_avoided']} of {stats['selections']} "
+            f"GroupChatManager LLM calls avoided ({stats['llm_fallbacks']} LLM fallbacks)."
         )
-    except Exception as e:
-        st.error(f"An error occurred during the AutoGen conversation: {e}")
-    finally:
-        st.session_state.is_chatting = False
+    if "tokens_saved" in snapshot["stats"]:
+        st.caption(f"History compaction saved {snapshot['stats']['tokens_saved']} prompt tokens.")
+    exec_stats = snapshot["stats"].get("execution_cache")
+    if exec_stats and exec_stats["hits"]:
+        st.caption(f"Execution cache: {exec_stats['hits']} repeated runs skipped, {exec_stats['time_saved']:.2f}s saved.")
+    fan_out = snapshot["stats"].get("fan_out")
+    if fan_out and fan_out["joined"]:
+        st.caption(f"Tests were drafted during code review {fan_out['joined']} times, "
+                   f"{fan_out['time_saved']:.1f}s saved.")
+    speculation = snapshot["stats"].get("speculative_execution")
+    if speculation and speculation["launched"]:
+        st.caption(f"Speculative execution: {speculation['hits']} of {speculation['launched']} runs used "
+                   f"({speculation['hit_rate']:.0%}), {speculation['time_saved']:.1f}s of execution hidden behind review.")
+    artifacts = snapshot["stats"].get("artifacts")
+    if artifacts and artifacts["references"]:
+        st.caption(f"Artifact store: {artifacts['references']} code blocks and outputs referenced, "
+                   f"{artifacts['referenced_chars']} characters kept out of the chat history.")
+    ended = snapshot["stats"].get("early_termination")
+    if ended and ended["reason"] in ("complete", "loop"):
+        why = "all milestones met" if ended["reason"] == "complete" else "the agents were repeating themselves"
+        st.caption(f"Ended after {ended['rounds']} rounds ({why}), {ended['rounds_saved']} rounds saved.")
+    if snapshot["stats"].get("tokens"):
+        render_token_usage(snapshot["stats"]["tokens"])
+    if snapshot["trace"]:
+        render_performance(snapshot["trace"], snapshot["trace_file"])
+
+
+def render_resume_offer(job_id):
+    """A job unknown to this server (e.g. after a restart) can be continued from its checkpoint."""
+    path = checkpoint_path(f"job-{job_id}")
+    state = load_checkpoint(path) if os.path.exists(path) else None
+    if state is None or state.finished is not None or not state.messages:
+        st.info("That conversation is no longer available on this server.")
+        return
+    st.warning(f"This conversation was interrupted after {state.rounds} rounds.")
+    if st.button("Resume from checkpoint", key="resume_job"):
+        job_runner.resume(state, job_id)
+        st.rerun()
 
 
 # --- Streamlit UI Layout ---
@@ -184,36 +250,42 @@ Ensure the code is reviewed for correctness, efficiency, and proper documentatio
 Once tests pass and the application code is finalized, I will provide final approval to run the main script.
 """
 
-if st.button("Start AI Conversation", disabled=st.session_state.is_chatting):
+record_trace = st.checkbox("Record performance trace", value=tracing_enabled(),
+                           help="Time LLM calls, speaker selection, code execution and callbacks per round.")
+
+current_job = job_runner.get(st.session_state.job_id) if st.session_state.job_id else None
+is_chatting = current_job is not None and not current_job.done
+
+if st.button("Start AI Conversation", disabled=is_chatting):
     if user_question:
-        with st.spinner("AI Agents are collaborating... This may take a few minutes, please be patient."):
-            run_autogen_conversation(user_question)
+        current_job = job_runner.submit(user_question, trace=record_trace)
+        st.session_state.job_id = current_job.id
+        st.query_params["job"] = current_job.id
+        is_chatting = True
     else:
         st.warning("Please enter a development request to start the conversation.")
 
 st.markdown("---")
 st.subheader("Conversation Log:")
 
-if st.session_state.chat_history:
-    for i, msg in enumerate(st.session_state.chat_history):
-        sender = msg["sender"]
-        content = msg["message"]
-
-        if sender == "Admin":
-            st.info(f"**{sender}:**\n\n{content}")
-        elif sender == "Coder":
-            st.success(f"**{sender}:**\n\n{content}")
-        elif sender == "Reviewer":
-            st.warning(f"**{sender}:**\n\n{content}")
-        elif sender == "Test_Engineer":
-            st.error(f"**{sender}:**\n\n{content}")
+
+@st.fragment(run_every=POLL_INTERVAL if is_chatting else None)
+def conversation_log():
+    """Only this fragment re-runs while a job is in progress, not the whole page."""
+    if current_job is None:
+        if st.session_state.job_id:
+            render_resume_offer(st.session_state.job_id)
         else:
-            st.write(f"**{sender}:**\n\n{content}")
+            st.info("No conversation started yet. Enter a request and click 'Start AI Conversation'.")
+        return
+    render_job(current_job)
+    if is_chatting and current_job.done:
+        # Re-enable the start button and stop polling.
+        st.rerun()
 
-        if i < len(st.session_state.chat_history) - 1:
-            st.markdown("---")
-else:
-    st.info("No conversation started yet. Enter a request and click 'Start AI Conversation'.")
+
+conversation_log()
 
 st.markdown("---")
-st.markdown("For more details, check the `coding` directory for any generated files (e.g., Python scripts, test files).")
\ No newline at end of file
+st.markdown("For more details, check the `coding/<job id>` directory for any generated files (e.g., Python scripts, test files).")
+st.caption(f"Page rendered in {(time.perf_counter() - _rerun_start) * 1000:.0f} ms.")
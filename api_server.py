@@ -0,0 +1,287 @@
+import argparse
+import asyncio
+import io
+import json
+import os
+import sys
+import hmac
+import zipfile
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from checkpoint import ArtifactManifest
+from job_runner import JobRunner, job_team_factory
+from llm_cache import ResponseCache
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+WORK_ROOT = "coding"
+MAX_BODY_BYTES = 1 << 20
+# An SSE comment is sent after this many idle seconds, so proxies keep the stream open.
+HEARTBEAT_SECONDS = 15.0
+REASONS = {200: "OK", 201: "Created", 202: "Accepted", 400: "Bad Request", 401: "Unauthorized",
+           404: "Not Found", 405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def session_summary(job):
+    snapshot = job.snapshot(since=0, until=0)
+    return {"id": job.id, "status": snapshot["status"], "error": snapshot["error"],
+            "message_count": snapshot["message_count"], "elapsed": round(snapshot["elapsed"], 3),
+            "created": job.created, "stats": snapshot["stats"]}
+
+
+def _sse(event, data, event_id=None):
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.extend(f"data: {line}" for line in json.dumps(data, default=str).splitlines())
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+
+class APIServer:
+    """
+    Headless HTTP API for the agent pipeline, on asyncio streams.
+
+    Every session is a job_runner.Job: conversations run on the JobRunner's bounded
+    worker threads, while each HTTP connection (including long-lived event streams) is
+    a coroutine on one event loop, so idle clients cost no thread. Jobs wake their
+    event streams through Job.subscribe(); nothing polls.
+
+      POST   /sessions                          {"prompt", "max_round", "trace"} -> 201 session
+      GET    /sessions                          all sessions
+      GET    /sessions/<id>                     status and stats ('?since=N' adds messages N..)
+      GET    /sessions/<id>/events              server-sent events (see events())
+      POST   /sessions/<id>/cancel              cancel (also DELETE /sessions/<id>)
+      GET    /sessions/<id>/artifacts           files under coding/<id>/ with size and sha256
+      GET    /sessions/<id>/artifacts/<path>    one file
+      GET    /sessions/<id>/artifacts.zip       every file as a zip
+
+    With 'token' set, requests need 'Authorization: Bearer <token>'.
+    """
+
+    def __init__(self, runner, work_root=WORK_ROOT, token=None):
+        self.runner = runner
+        self.work_root = work_root
+        self.token = token
+        self.connections = 0
+
+    # --- HTTP ---
+    async def handle(self, reader, writer):
+        self.connections += 1
+        try:
+            method, target, headers, body = await self._read_request(reader)
+            url = urlsplit(target)
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            authorization = headers.get("authorization", "").encode("latin-1")
+            if self.token and not hmac.compare_digest(authorization, f"Bearer {self.token}".encode("utf-8")):
+                raise HTTPError(401, "Missing or wrong bearer token.")
+            await self._route(method, [unquote(p) for p in url.path.strip("/").split("/") if p],
+                              query, headers, body, writer)
+        except HTTPError as e:
+            await self._send_json(writer, e.status, {"error": str(e)})
+        except ValueError as e:
+            await self._send_json(writer, 400, {"error": str(e)})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def _read_request(self, reader):
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        parts = request_line.split()
+        if len(parts) != 3:
+            raise HTTPError(400, "Malformed request line.")
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1")
+            if line in ("\r\n", "\n", ""):
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length") or 0)
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413, f"Request body above {MAX_BODY_BYTES} bytes.")
+        body = await reader.readexactly(length) if length else b""
+        return parts[0].upper(), parts[1], headers, body
+
+    async def _send(self, writer, status, body, content_type, extra_headers=()):
+        head = [f"HTTP/1.1 {status} {REASONS.get(status, '')}", f"Content-Type: {content_type}",
+                f"Content-Length: {len(body)}", "Connection: close", *extra_headers]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    async def _send_json(self, writer, status, payload):
+        await self._send(writer, status, json.dumps(payload, default=str).encode("utf-8"), "application/json")
+
+    async def _route(self, method, path, query, headers, body, writer):
+        if path == ["sessions"]:
+            if method == "POST":
+                return await self._send_json(writer, 201, self.create(body))
+            if method == "GET":
+                return await self._send_json(writer, 200, [session_summary(job) for job in self.runner.jobs()])
+            raise HTTPError(405, "Use GET or POST.")
+        if len(path) < 2 or path[0] != "sessions":
+            raise HTTPError(404, "Unknown path.")
+        job = self.runner.get(path[1])
+        if job is None:
+            raise HTTPError(404, f"No session '{path[1]}'.")
+        rest = path[2:]
+        if not rest and method == "GET":
+            summary = session_summary(job)
+            if "since" in query:
+                summary["messages"] = job.snapshot(since=int(query["since"]))["messages"]
+            return await self._send_json(writer, 200, summary)
+        if (rest == ["cancel"] and method == "POST") or (not rest and method == "DELETE"):
+            if job.done:
+                raise HTTPError(409, f"Session '{job.id}' already {job.status}.")
+            self.runner.cancel(job.id)
+            return await self._send_json(writer, 202, session_summary(job))
+        if rest == ["events"] and method == "GET":
+            # A reconnecting EventSource sends the id of the last message it got.
+            last_id = headers.get("last-event-id")
+            since = int(last_id) + 1 if last_id else int(query.get("since", 0))
+            return await self.events(job, writer, since, tokens=query.get("tokens") in ("1", "true"))
+        if rest and rest[0] in ("artifacts", "artifacts.zip") and method == "GET":
+            return await self.artifacts(job, rest, writer)
+        raise HTTPError(404 if method == "GET" else 405, "Unknown path or method.")
+
+    # --- Sessions ---
+    def create(self, body):
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "Body must be JSON.")
+        prompt = request.get("prompt") if isinstance(request, dict) else None
+        if not isinstance(prompt, str) or not prompt.strip():
+            raise HTTPError(400, "'prompt' is required.")
+        job = self.runner.submit(prompt, max_round=int(request.get("max_round", 30)),
+                                 trace=bool(request.get("trace", False)))
+        return {**session_summary(job), "events": f"/sessions/{job.id}/events",
+                "artifacts": f"/sessions/{job.id}/artifacts"}
+
+    async def events(self, job, writer, since=0, tokens=False):
+        """
+        Stream a session as server-sent events: 'message' (id = message index, so a
+        client reconnecting with Last-Event-ID gets only what it missed), 'status' on
+        every status change, 'token' with the text streamed so far when '?tokens=1', and
+        a final 'end' with the session summary.
+        """
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
+
+        def listener():
+            loop.call_soon_threadsafe(changed.set)
+
+        job.subscribe(listener)
+        try:
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                         b"Connection: close\r\n\r\n")
+            status, partial_sent = None, (None, 0)
+            while True:
+                changed.clear()
+                snapshot = job.snapshot(since=since)
+                for offset, message in enumerate(snapshot["messages"]):
+                    message = {k: v for k, v in message.items() if k != "segments"}
+                    writer.write(_sse("message", {"index": since + offset, **message}, since + offset))
+                since += len(snapshot["messages"])
+                if snapshot["status"] != status:
+                    status = snapshot["status"]
+                    writer.write(_sse("status", {"status": status, "message_count": snapshot["message_count"]}))
+                if tokens and snapshot["partial"]:
+                    speaker, text = snapshot["partial"]
+                    sent = partial_sent[1] if partial_sent[0] == speaker else 0
+                    if len(text) > sent:
+                        writer.write(_sse("token", {"speaker": speaker, "text": text[sent:]}))
+                        partial_sent = (speaker, len(text))
+                elif not snapshot["partial"]:
+                    partial_sent = (None, 0)
+                await writer.drain()
+                if job.done:
+                    writer.write(_sse("end", session_summary(job)))
+                    await writer.drain()
+                    return
+                try:
+                    await asyncio.wait_for(changed.wait(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    writer.write(b": keep-alive\n\n")
+        finally:
+            job.unsubscribe(listener)
+
+    # --- Artifacts ---
+    def _work_dir(self, job):
+        return os.path.join(self.work_root, job.id)
+
+    async def artifacts(self, job, rest, writer):
+        work_dir = self._work_dir(job)
+        loop = asyncio.get_running_loop()
+        if rest == ["artifacts"]:
+            # Hashing runs off the event loop, like every other file access here.
+            manifest = ArtifactManifest(work_dir)
+            await loop.run_in_executor(None, manifest.scan)
+            return await self._send_json(writer, 200, {"work_dir": work_dir, "files": manifest.files})
+        if rest == ["artifacts.zip"]:
+            data = await loop.run_in_executor(None, self._zip, work_dir)
+            return await self._send(writer, 200, data, "application/zip",
+                                    [f'Content-Disposition: attachment; filename="{job.id}.zip"'])
+        root = os.path.realpath(work_dir)
+        path = os.path.realpath(os.path.join(root, *rest[1:]))
+        if not path.startswith(root + os.sep) or not os.path.isfile(path):
+            raise HTTPError(404, f"No artifact '{'/'.join(rest[1:])}'.")
+        data = await loop.run_in_executor(None, self._read, path)
+        await self._send(writer, 200, data, "application/octet-stream",
+                         [f'Content-Disposition: attachment; filename="{os.path.basename(path)}"'])
+
+    @staticmethod
+    def _read(path):
+        with open(path, "rb") as f:
+            return f.read()
+
+    @staticmethod
+    def _zip(work_dir):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+            manifest = ArtifactManifest(work_dir)
+            for rel, path in manifest.walk() if os.path.isdir(work_dir) else ():
+                archive.write(path, rel)
+        return buffer.getvalue()
+
+
+async def serve(server, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    listener = await asyncio.start_server(server.handle, host, port)
+    print(f"Agent pipeline API listening on http://{host}:{port}/sessions", flush=True)
+    async with listener:
+        await listener.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the agent pipeline as a local HTTP API with SSE streaming.")
+    parser.add_argument("--host", default=os.getenv("API_HOST", DEFAULT_HOST))
+    parser.add_argument("--port", type=int, default=int(os.getenv("API_PORT", DEFAULT_PORT)))
+    parser.add_argument("--provider", default="auto", choices=["auto", "openai", "ollama"])
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    from agent_team import config_list_from_env
+
+    factory = job_team_factory(config_list_from_env(args.provider), cache=ResponseCache.from_env(),
+                               entry="api_server", work_root=WORK_ROOT)
+    runner = JobRunner.from_env(factory)
+    try:
+        asyncio.run(serve(APIServer(runner, token=os.getenv("API_TOKEN") or None), args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        runner.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
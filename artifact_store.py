@@ -0,0 +1,299 @@
+import difflib
+import hashlib
+import json
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
+
+from history_compaction import FILENAME_RE, VERSION_SUFFIX_RE
+from llm_hooks import add_llm_middleware
+from speaker_selection import CODE_BLOCK_RE
+
+# Smaller code blocks and outputs stay in the message; a reference would not be much shorter.
+DEFAULT_MIN_CHARS = 200
+# The end of an execution output stays in the message, so "Ran 3 tests ... OK" is still visible.
+OUTPUT_TAIL_CHARS = 160
+# Deltas are applied on top of each other; past this depth a version is stored whole again.
+MAX_DELTA_DEPTH = 8
+DEFAULT_CACHE_SIZE = 32
+CODE_REF = "# [artifact:{id} {label}, {lines} lines]\n"
+OUTPUT_REF = "[artifact:{id} output, {lines} lines]\n"
+REF_RE = re.compile(r"(?:# )?\[artifact:([0-9a-f]{16}) [^\]\n]*\]\n")
+
+
+def artifact_id(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _line_count(text):
+    return text.count("\n") + (0 if text.endswith("\n") else 1)
+
+
+def _delta(base, text):
+    """Line ops turning 'base' into 'text': [i1, i2] copies base lines i1..i2, a string is inserted."""
+    base_lines, lines = base.splitlines(keepends=True), text.splitlines(keepends=True)
+    ops = []
+    matcher = difflib.SequenceMatcher(None, base_lines, lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append("".join(lines[j1:j2]))
+    return ops
+
+
+def _patch(base, ops):
+    base_lines = base.splitlines(keepends=True)
+    return "".join(op if isinstance(op, str) else "".join(base_lines[op[0]:op[1]]) for op in ops)
+
+
+class ArtifactStore:
+    """
+    Content-addressed store for the large parts of chat messages.
+
+    Code blocks and execution outputs of at least 'min_chars' characters are written once
+    under 'root', named by the sha256 of their text, and replaced in the message by a
+    one-line reference such as '# [artifact:3f2a... calculator_v2.py, 48 lines]'. The
+    '# filename:' line of a code block, the 'exitcode:' line and the last lines of an
+    output stay in the message, so speaker selection, completion detection and history
+    compaction still see what they look for. A new version of a file (calculator_v1.py,
+    calculator_v2.py; or the next unnamed block of the same author, or the next output)
+    is stored as a line delta against the previous one when that is smaller.
+
+    materialize() expands references again; it is applied to LLM requests, to code
+    about to be executed and to what the views show. Recently materialized texts are
+    kept in a small LRU cache.
+    """
+
+    def __init__(self, root, min_chars=DEFAULT_MIN_CHARS, cache_size=DEFAULT_CACHE_SIZE):
+        self.root = root
+        self.min_chars = min_chars
+        self.cache_size = cache_size
+        self._latest = {}  # version identity -> id of its latest text
+        self._depths = {}  # id -> deltas applied to rebuild it
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"objects": 0, "deltas": 0, "dedup_hits": 0, "references": 0, "referenced_chars": 0,
+                         "stored_chars": 0, "disk_bytes": 0, "materialized": 0, "missing": 0}
+
+    # --- Objects ---
+    def _path(self, object_id):
+        return os.path.join(self.root, object_id[:2], object_id[2:])
+
+    def _write(self, object_id, record):
+        data = zlib.compress(json.dumps(record, ensure_ascii=False).encode("utf-8"))
+        path = self._path(object_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        return len(data)
+
+    def _read(self, object_id):
+        try:
+            with open(self._path(object_id), "rb") as f:
+                return json.loads(zlib.decompress(f.read()).decode("utf-8"))
+        except (OSError, ValueError, zlib.error):
+            return None
+
+    def put(self, text, identity=None):
+        """Store 'text' (once); a delta against the previous version of 'identity' when that is smaller."""
+        object_id = artifact_id(text)
+        with self._lock:
+            previous = self._latest.get(identity) if identity else None
+            if identity:
+                self._latest[identity] = object_id
+            if os.path.exists(self._path(object_id)):
+                self.counters["dedup_hits"] += 1
+                return object_id
+            # Objects written by an earlier process have an unknown depth; don't build on them.
+            base_depth = self._depths.get(previous, MAX_DELTA_DEPTH) if previous else MAX_DELTA_DEPTH
+        record, depth = {"text": text}, 0
+        if base_depth < MAX_DELTA_DEPTH:
+            base = self.text(previous)
+            if base is not None:
+                ops = _delta(base, text)
+                if len(json.dumps(ops)) < len(text) // 2:
+                    record, depth = {"base": previous, "delta": ops}, base_depth + 1
+        size = self._write(object_id, record)
+        with self._lock:
+            self._depths[object_id] = depth
+            self.counters["objects"] += 1
+            self.counters["deltas"] += 1 if depth else 0
+            self.counters["stored_chars"] += len(text)
+            self.counters["disk_bytes"] += size
+            self._remember(object_id, text)
+        return object_id
+
+    def text(self, object_id):
+        """The text of an artifact, or None when it is not in this store."""
+        with self._lock:
+            if object_id in self._cache:
+                self._cache.move_to_end(object_id)
+                return self._cache[object_id]
+        record = self._read(object_id)
+        if record is None:
+            return None
+        if "text" in record:
+            text = record["text"]
+        else:
+            base = self.text(record["base"])
+            if base is None:
+                return None
+            text = _patch(base, record["delta"])
+        with self._lock:
+            self._remember(object_id, text)
+        return text
+
+    def _remember(self, object_id, text):
+        self._cache[object_id] = text
+        self._cache.move_to_end(object_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    # --- Messages ---
+    def reference(self, content, author=None):
+        """'content' with its large code blocks and execution output replaced by references."""
+        if not isinstance(content, str) or len(content) < self.min_chars:
+            return content
+        if content.startswith("exitcode:") and "```" not in content:
+            return self._reference_output(content)
+
+        def replace(match):
+            body = match.group(2)
+            if len(body) < self.min_chars or REF_RE.search(body):
+                return match.group(0)
+            first, newline, rest = body.partition("\n")
+            filename = FILENAME_RE.match(first.strip())
+            if filename:
+                keep, stored, label = first + newline, rest, filename.group(1)
+                identity = VERSION_SUFFIX_RE.sub("", label)
+            else:
+                keep, stored, label = "", body, match.group(1) or "code"
+                identity = f"{author}:{label}"
+            if not stored:
+                return match.group(0)
+            ref = CODE_REF.format(id=self.put(stored, identity), label=label, lines=_line_count(stored))
+            self._count_reference(len(stored) - len(ref))
+            return content[match.start():match.start(2)] + keep + ref + "```"
+
+        return CODE_BLOCK_RE.sub(replace, content)
+
+    def _reference_output(self, content):
+        head_end = content.find("\n") + 1
+        tail_start = content.find("\n", max(head_end, len(content) - OUTPUT_TAIL_CHARS)) + 1 or len(content)
+        if head_end <= 0 or tail_start <= head_end or tail_start - head_end < self.min_chars:
+            return content
+        stored = content[head_end:tail_start]
+        ref = OUTPUT_REF.format(id=self.put(stored, "output"), lines=_line_count(stored))
+        self._count_reference(len(stored) - len(ref))
+        return content[:head_end] + ref + content[tail_start:]
+
+    def _count_reference(self, saved):
+        with self._lock:
+            self.counters["references"] += 1
+            self.counters["referenced_chars"] += saved
+
+    def materialize(self, content):
+        """'content' with every reference this store can resolve expanded to its text."""
+        if not isinstance(content, str) or "[artifact:" not in content:
+            return content
+
+        def expand(match):
+            text = self.text(match.group(1))
+            with self._lock:
+                self.counters["materialized" if text is not None else "missing"] += 1
+            return match.group(0) if text is None else text
+
+        return REF_RE.sub(expand, content)
+
+    def materialize_value(self, value):
+        """materialize() every string inside a JSON-like value (e.g. a runtime log record)."""
+        if isinstance(value, str):
+            return self.materialize(value)
+        if isinstance(value, dict):
+            return {k: self.materialize_value(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self.materialize_value(v) for v in value]
+        return value
+
+    def reference_messages(self, messages):
+        """Copies of chat messages with their string contents referenced."""
+        return [{**m, "content": self.reference(m.get("content"), m.get("name"))}
+                if isinstance(m, dict) and isinstance(m.get("content"), str) else m for m in messages]
+
+    # --- Team wiring ---
+    def attach(self, groupchat, agents, stream=None):
+        """
+        Reference the messages of 'groupchat' as they are appended (before they are
+        broadcast to the other agents), and materialize the LLM requests of 'agents' and
+        the messages shown by 'stream'. Attach after the model router and before token
+        accounting, so budgets count what is actually sent.
+        """
+        original_append = groupchat.append
+
+        def append(message, speaker):
+            result = original_append(message, speaker)
+            stored = groupchat.messages[-1] if groupchat.messages else None
+            if isinstance(stored, dict) and isinstance(stored.get("content"), str):
+                stored["content"] = self.reference(stored["content"], getattr(speaker, "name", None))
+            return result
+
+        groupchat.append = append
+        for agent in agents:
+            add_llm_middleware(agent, self._materialize_request)
+        if stream is not None:
+            stream.artifacts = self
+        return self
+
+    def _materialize_request(self, agent, params, call_next):
+        messages = params.get("messages")
+        if messages:
+            params = {**params, "messages": [
+                {**m, "content": self.materialize(m["content"])}
+                if isinstance(m, dict) and isinstance(m.get("content"), str) else m for m in messages]}
+        return call_next(params)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters)
+
+
+class MaterializingCodeExtractor:
+    """Code extractor that expands artifact references before extracting code blocks."""
+
+    def __init__(self, extractor, store):
+        self.extractor = extractor
+        self.store = store
+
+    def extract_code_blocks(self, message):
+        return self.extractor.extract_code_blocks(self.store.materialize(message))
+
+
+class MaterializingCodeExecutor:
+    """AutoGen CodeExecutor whose code extractor sees referenced code blocks in full."""
+
+    def __init__(self, executor, store):
+        self.executor = executor
+        self.store = store
+        self._extractor = MaterializingCodeExtractor(executor.code_extractor, store)
+
+    @property
+    def code_extractor(self):
+        return self._extractor
+
+    def execute_code_blocks(self, code_blocks):
+        return self.executor.execute_code_blocks(code_blocks)
+
+    def restart(self):
+        self.executor.restart()
+
+
+def artifact_store_from_env(root):
+    """An ArtifactStore under 'root' (ARTIFACT_MIN_CHARS sets the size threshold); None when ARTIFACT_STORE=0."""
+    if os.getenv("ARTIFACT_STORE", "1").lower() in ("0", "false", "no"):
+        return None
+    return ArtifactStore(root, min_chars=int(os.getenv("ARTIFACT_MIN_CHARS", DEFAULT_MIN_CHARS)))
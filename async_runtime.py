@@ -0,0 +1,241 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ollama_transport import DEFAULT_NUM_PARALLEL, host_from_entry
+
+DEFAULT_OPENAI_LIMIT = 16
+DEFAULT_CALLBACK_LIMIT = 4
+# Reply functions that wait on the network or a subprocess, by name, and the semaphore they take.
+# AutoGen's a_generate_oai_reply only hands generate_oai_reply to the loop's default executor,
+# with no bound, so it is replaced by the twin.
+BLOCKING_REPLIES = {
+    "a_generate_oai_reply": "llm",
+    "generate_oai_reply": "llm",
+    "_generate_code_execution_reply_using_executor": "code",
+    "generate_code_execution_reply": "code",
+}
+
+# True inside a conversation driven by AsyncRuntime; the blocking sync reply functions
+# and message hooks step aside there, since their async twins already ran (or run them).
+_in_async_chat = contextvars.ContextVar("in_async_chat", default=False)
+
+
+def in_async_chat():
+    return _in_async_chat.get()
+
+
+def provider_key(entry):
+    """Semaphore key of a config_list entry: one per Ollama server, one per OpenAI-compatible endpoint."""
+    if entry.get("api_type") == "ollama" or entry.get("model_client_cls") == "PooledOllamaClient":
+        return f"ollama:{host_from_entry(entry)}"
+    return f"{entry.get('api_type', 'openai')}:{entry.get('base_url') or 'default'}"
+
+
+def _parse_limits(value):
+    limits = {}
+    for part in (value or "").split(","):
+        if "=" in part:
+            name, limit = part.split("=", 1)
+            limits[name.strip()] = int(limit)
+    return limits
+
+
+class AsyncRuntime:
+    """
+    Runs many group chats as coroutines on one event loop.
+
+    AutoGen's async path (a_initiate_chat, GroupChatManager.a_run_chat,
+    a_generate_reply) keeps a conversation off any thread while it is idle, but it still
+    calls sync reply functions and message hooks inline, so an LLM request, a code
+    execution or one of this repo's reply functions would block the loop. adapt() puts
+    an async twin in front of each of them that waits for a slot on a semaphore
+    ('limits', keyed 'openai', 'ollama' or a full provider_key(), and 'callback' for
+    this repo's reply functions; 'code_limit' for code execution) and runs the original
+    on a thread pool sized to those limits. The twin of generate_oai_reply replaces
+    AutoGen's a_generate_oai_reply and also runs the agent's
+    process_all_messages_before_reply hooks (history compaction) on its thread. LLM
+    requests keep the synchronous middleware chain (cache, router, budgets), so threads
+    are held only while a request or a run is in flight, never by a waiting conversation.
+    """
+
+    def __init__(self, limits=None, code_limit=None):
+        ollama_default = int(os.getenv("OLLAMA_NUM_PARALLEL", DEFAULT_NUM_PARALLEL))
+        self.limits = {"openai": DEFAULT_OPENAI_LIMIT, "ollama": ollama_default, "callback": DEFAULT_CALLBACK_LIMIT,
+                       **(limits or {})}
+        self.code_limit = code_limit or os.cpu_count() or 2
+        self._executor = ThreadPoolExecutor(max_workers=sum(self.limits.values()) + self.code_limit,
+                                            thread_name_prefix="async-runtime")
+        self._semaphores = {}
+        self._lock = threading.Lock()
+        self.calls = {}
+        self.waited = {}
+        self.in_flight = {}
+        self.peak_in_flight = {}
+        self.conversations = 0
+
+    @classmethod
+    def from_env(cls):
+        """ASYNC_PROVIDER_LIMITS ('openai=16,ollama=4,callback=4') and ASYNC_CODE_LIMIT bound the concurrent calls."""
+        code_limit = os.getenv("ASYNC_CODE_LIMIT")
+        return cls(limits=_parse_limits(os.getenv("ASYNC_PROVIDER_LIMITS")),
+                   code_limit=int(code_limit) if code_limit else None)
+
+    # --- Semaphores ---
+    def limit_for(self, key):
+        if key in self.limits:
+            return self.limits[key]
+        return self.code_limit if key == "code" else self.limits.get(key.split(":", 1)[0], DEFAULT_OPENAI_LIMIT)
+
+    def _semaphore(self, key):
+        # Created on first use, inside the running loop; asyncio semaphores belong to one loop.
+        loop_key = (id(asyncio.get_running_loop()), key)
+        if loop_key not in self._semaphores:
+            self._semaphores[loop_key] = asyncio.Semaphore(self.limit_for(key))
+        return self._semaphores[loop_key]
+
+    async def _call(self, key, func, *args, **kwargs):
+        queued = time.perf_counter()
+        async with self._semaphore(key):
+            with self._lock:
+                self.waited[key] = self.waited.get(key, 0.0) + time.perf_counter() - queued
+                self.calls[key] = self.calls.get(key, 0) + 1
+                self.in_flight[key] = self.in_flight.get(key, 0) + 1
+                self.peak_in_flight[key] = max(self.peak_in_flight.get(key, 0), self.in_flight[key])
+            try:
+                # The copied context carries the conversation's IOStream into the worker thread.
+                context = contextvars.copy_context()
+                return await asyncio.get_running_loop().run_in_executor(
+                    self._executor, functools.partial(context.run, func, *args, **kwargs))
+            finally:
+                with self._lock:
+                    self.in_flight[key] -= 1
+
+    # --- Agents ---
+    def _key(self, agent, kind):
+        if kind in ("code", "callback"):
+            return kind
+        config = agent.llm_config if isinstance(agent.llm_config, dict) else agent.llm_config.model_dump()
+        config_list = config.get("config_list") or [{}]
+        return provider_key(config_list[0])
+
+    def _twin(self, agent, func, kind):
+        def reply(recipient, messages=None, sender=None, config=None):
+            if kind == "llm" and messages is not None:
+                for hook in getattr(agent, "_async_deferred_hooks", ()):
+                    messages = hook(messages)
+            return func(recipient, messages=messages, sender=sender, config=config)
+
+        async def twin(recipient, messages=None, sender=None, config=None):
+            return await self._call(self._key(agent, kind), reply, recipient, messages=messages,
+                                    sender=sender, config=config)
+
+        twin.__name__ = f"a_{getattr(func, '__name__', 'reply')}"
+        twin._async_twinned = True
+        ignored = getattr(agent, "_ignore_async_func_in_sync_chat_list", None)
+        if ignored is not None:
+            # Like AutoGen's own async replies, the twin is skipped in sync chats.
+            ignored.append(twin)
+        return twin
+
+    @staticmethod
+    def _step_aside(func):
+        @functools.wraps(func)
+        def reply(recipient, messages=None, sender=None, config=None):
+            if in_async_chat():
+                return False, None
+            return func(recipient, messages=messages, sender=sender, config=config)
+
+        reply._async_twinned = True
+        return reply
+
+    @staticmethod
+    def _kind(func):
+        """The semaphore a reply function blocks on, or None if it can run on the loop."""
+        if getattr(func, "_async_twinned", False):
+            return None
+        name = getattr(func, "__name__", "")
+        if name in BLOCKING_REPLIES:
+            return BLOCKING_REPLIES[name]
+        if asyncio.iscoroutinefunction(func) or getattr(func, "__module__", "").startswith("autogen"):
+            return None
+        return "callback"
+
+    @staticmethod
+    def _defer_hooks(agent):
+        """Move the agent's process_all_messages_before_reply hooks to its LLM twin's thread."""
+        hooks = getattr(agent, "hook_lists", {}).get("process_all_messages_before_reply")
+        if not hooks:
+            return
+        deferred = agent.__dict__.setdefault("_async_deferred_hooks", [])
+        for i, hook in enumerate(hooks):
+            if getattr(hook, "_async_twinned", False):
+                continue
+            deferred.append(hook)
+
+            @functools.wraps(hook)
+            def aside(messages, hook=hook):
+                return messages if in_async_chat() else hook(messages)
+
+            aside._async_twinned = True
+            hooks[i] = aside
+
+    def adapt(self, agent):
+        """Put an async twin in front of each blocking sync reply function of 'agent' (once)."""
+        entries = agent._reply_func_list
+        async_llm = any(getattr(e["reply_func"], "__name__", "") == "a_generate_oai_reply" for e in entries)
+        if agent.llm_config:
+            self._defer_hooks(agent)
+        i = 0
+        while i < len(entries):
+            func = entries[i]["reply_func"]
+            kind = self._kind(func)
+            if kind is None or (kind == "llm" and not agent.llm_config):
+                i += 1
+                continue
+            if asyncio.iscoroutinefunction(func):
+                entries[i] = {**entries[i], "reply_func": self._twin(agent, type(agent).generate_oai_reply, kind)}
+                i += 1
+                continue
+            entries[i] = {**entries[i], "reply_func": self._step_aside(func)}
+            if kind != "llm" or not async_llm:
+                entries.insert(i, {**entries[i], "reply_func": self._twin(agent, func, kind)})
+                i += 1
+            i += 1
+        return agent
+
+    def adapt_team(self, team):
+        for agent in team.agents:
+            self.adapt(agent)
+        return team
+
+    # --- Conversations ---
+    async def run(self, team, prompt=None, state=None):
+        """Run (or, with a checkpoint 'state', resume) one team's conversation on the current loop."""
+        self.adapt_team(team)
+        token = _in_async_chat.set(True)
+        with self._lock:
+            self.conversations += 1
+        try:
+            return await (team.a_resume(state) if state is not None else team.a_run(prompt))
+        finally:
+            _in_async_chat.reset(token)
+
+    async def run_many(self, runs):
+        """Run (team, prompt) pairs concurrently; returns their ChatResults (or exceptions) in order."""
+        return await asyncio.gather(*(self.run(team, prompt) for team, prompt in runs), return_exceptions=True)
+
+    def stats(self):
+        with self._lock:
+            return {"conversations": self.conversations,
+                    "limits": {key: self.limit_for(key) for key in self.calls},
+                    "calls": dict(self.calls),
+                    "queue_wait": {key: round(value, 4) for key, value in self.waited.items()},
+                    "peak_in_flight": dict(self.peak_in_flight)}
+
+    def close(self):
+        self._executor.shutdown(wait=False)
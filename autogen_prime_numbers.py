@@ -1,3 +1,4 @@
+import argparse
 import tempfile
 
 import autogen
@@ -6,99 +7,86 @@ from autogen_ext.models.ollama import OllamaChatCompletionClient
 from dotenv import load_dotenv
 import os
 
+import agent_team
+from checkpoint import CheckpointWriter, checkpoint_path, checkpoints_enabled, find_checkpoint, report_resume
+from llm_cache import ResponseCache
+from model_router import shared_router
+from structured_log import StructuredRuntimeLogger
+from tracing import Tracer, instrument_team, tracing_enabled
+
 # --- Load environment variables ---
 load_dotenv()
 
-# --- Configuration ---
-openai_api_key = os.getenv("OPENAI_API_KEY")
-
-openai_config_list = [
-    {
-        "model": "gpt-4",
-        "api_key": openai_api_key,
-    },
-    {
-        "model": "gpt-3.5-turbo",
-        "api_key": openai_api_key
-    }
-]
-
-if openai_api_key:
-    config_list = openai_config_list
 
 # --- Configuration ---
-ollama_api_key = os.getenv("OLLAMA_API_KEY")
-
-if not ollama_api_key:
-    raise ValueError(
-        "OLLAMA_API_KEY not found in environment variables. Please set it in your .env file or as an environment variable.")
-
-
-# --- Ollama AutoGen Configuration ---
-ollama_config_list = [
-    {
-        "model": "llama2:13b",
-        "api_key": ollama_api_key,
-    },
-    {
-        "model": "llama3.1:latest",
-        "api_key": ollama_api_key,
-    },
-    {
-        "model": "llama3.2:latest",
-        "api_key": ollama_api_key,
-    }
-]
-
-if ollama_api_key:
-    config_list = ollama_config_list
-
-# Create a temporary directory to store the code files.
-temp_dir = tempfile.TemporaryDirectory()
-
-print(os.listdir(temp_dir.name))
-
-# --- Start AutoGen Runtime Logging to a .log file ---
-logging_session_id = autogen.runtime_logging.start(
-    logger_type="file", config={"filename": "conversation_log.log"})
-print(f"AutoGen logging started. Session ID: {logging_session_id}")
-print("Logs will be saved to 'conversation_log.log'.")
+def load_config_list():
+    """Pick the model config list from the environment (Ollama wins when OLLAMA_API_KEY is set)."""
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+
+    openai_config_list = [
+        {
+            "model": "gpt-4",
+            "api_key": openai_api_key,
+        },
+        {
+            "model": "gpt-3.5-turbo",
+            "api_key": openai_api_key
+        }
+    ]
+
+    if openai_api_key:
+        config_list = openai_config_list
+
+    ollama_api_key = os.getenv("OLLAMA_API_KEY")
+
+    if not ollama_api_key:
+        raise ValueError(
+            "OLLAMA_API_KEY not found in environment variables. Please set it in your .env file or as an environment variable.")
+
+    # --- Ollama AutoGen Configuration ---
+    ollama_config_list = [
+        {
+            "model": "llama2:13b",
+            "api_key": ollama_api_key,
+        },
+        {
+            "model": "llama3.1:latest",
+            "api_key": ollama_api_key,
+        },
+        {
+            "model": "llama3.2:latest",
+            "api_key": ollama_api_key,
+        }
+    ]
+
+    if ollama_api_key:
+        config_list = ollama_config_list
+    return config_list
+
+
+TASK_MESSAGE = """
+    Write a Python class for performing basic arthemetic operations and also implement main program to test these arthemetic operations.
+    The script should print these numbers to the console.
+    Ensure the code is reviewed for correctness, efficiency, and proper documentation (docstrings and comments).
+    **After the application code is reviewed, a Test Engineer should generate unit tests for it. 
+    The Test Engineer's code should then also be reviewed by the Code Reviewer for quality before I execute those tests to ensure correctness.**
+    Once tests pass and the application code is finalized, I will the provide final approval to run the main script.
+    """
+
 
 # --- Agent Definitions ---
-user_proxy = autogen.UserProxyAgent(
-    name="Admin",
-    system_message="A human administrator who will review the code and provide final approval for execution. You will also execute tests and report results.",
-    llm_config={"config_list": config_list},
-    human_input_mode="ALWAYS",
-    code_execution_config={
-        "work_dir": "coding",
-        "use_docker": False,
-    },
-    is_termination_msg=lambda x: x.get(
-        "content", "").rstrip().endswith("TERMINATE"),
-)
-
-assistant = autogen.AssistantAgent(
-    name="Coder",
-    llm_config={"config_list": config_list},
-    system_message="""You are a helpful AI assistant specialized in Python programming.
+ADMIN_SYSTEM_MESSAGE = "A human administrator who will review the code and provide final approval for execution. You will also execute tests and report results."
+
+CODER_SYSTEM_MESSAGE = """You are a helpful AI assistant specialized in Python programming.
 You can write Python code, explain concepts, and debug issues.
 When you provide code, ensure it is complete, runnable, and follows good practices including robust error handling, clear documentation, modularity, and reusability.
 Also save your code into a 'coding' sub-folder within the current project directory with appropriate version numbering.
 If you need to run code or tests, suggest it and wait for approval.
 If the requirements are unclear or ambiguous, ask clarifying questions to ensure a precise understanding.
 When providing solutions for complex problems, break them down into smaller, manageable sub-tasks and explain your approach.
-Once the task is complete, reply with 'TERMINATE' to end the conversation.""",
-    code_execution_config={
-        "work_dir": "coding",
-        "use_docker": False,
-    }
-)
-
-reviewer = autogen.AssistantAgent(
-    name="Reviewer",
-    llm_config={"config_list": config_list},
-    system_message="""You are a meticulous Code Reviewer.
+Once the task is complete, reply with 'TERMINATE' to end the conversation."""
+
+REVIEWER_SYSTEM_MESSAGE = """You are a meticulous Code Reviewer.
     Your sole role is to provide feedback, suggestions, and critique on **any Python code presented in the conversation, including application code and test code.**
     **NEVER write or rewrite any code yourself.**
     **NEVER suggest specific code implementations.** Instead, describe *what* needs to be changed or improved conceptually.
@@ -116,13 +104,8 @@ reviewer = autogen.AssistantAgent(
     If changes are needed, clearly explain the areas for improvement.
     Once the code is approved or deemed perfect, you are done.
     """
-)
 
-# --- UPDATED Test Engineer Agent ---
-test_engineer = autogen.AssistantAgent(
-    name="Test_Engineer",
-    llm_config={"config_list": config_list},
-    system_message="""You are a skilled Test Engineer specialized in Python.
+TEST_ENGINEER_SYSTEM_MESSAGE = """You are a skilled Test Engineer specialized in Python.
 Your primary role is to create comprehensive unit tests for the Python code provided by the Coder.
 Your tests should:
 - Be written using Python's `unittest` framework unless `pytest` is explicitly requested or already in use within the project.
@@ -135,44 +118,106 @@ Also save your code into a 'coding' sub-folder within the current project direct
 Once the test code is complete, **ensure it is runnable and passes locally (if possible) before presenting it to the Reviewer** for their feedback.
 After the test code has been reviewed and approved, then you can request the Admin to execute the tests.
 If tests look good and no more test cases are needed, signal approval for the main script to proceed.
-    """,
-    code_execution_config={
-        "work_dir": "coding",
-        "use_docker": False,
-    }
-)
-
-# --- Group Chat Setup ---
-groupchat = autogen.GroupChat(
-    agents=[user_proxy, assistant, reviewer, test_engineer],
-    messages=[],
-    max_round=30,  # Increased max_round again to accommodate more review iterations
-    speaker_selection_method="auto",
-)
-
-manager = autogen.GroupChatManager(groupchat=groupchat, llm_config={
-                                   "config_list": config_list})
-
-# --- Initiate the chat ---
-print("\n--- Starting the AutoGen Conversation ---")
-print("Admin will initiate the conversation with the GroupChatManager.")
-print("Type 'exit' to terminate the human input at any point.")
-
-user_proxy.initiate_chat(
-    manager,
-    message="""
-    Write a Python class for performing basic arthemetic operations and also implement main program to test these arthemetic operations.
-    The script should print these numbers to the console.
-    Ensure the code is reviewed for correctness, efficiency, and proper documentation (docstrings and comments).
-    **After the application code is reviewed, a Test Engineer should generate unit tests for it. 
-    The Test Engineer's code should then also be reviewed by the Code Reviewer for quality before I execute those tests to ensure correctness.**
-    Once tests pass and the application code is finalized, I will the provide final approval to run the main script.
     """
-)
-
-print("\n--- Conversation Ended ---")
-print("Check the 'coding' directory for any generated files.")
 
-# --- Stop AutoGen Runtime Logging ---
-autogen.runtime_logging.stop()
-print("AutoGen logging stopped. You can now review 'conversation_log.log'.")
+SYSTEM_MESSAGES = {
+    "Admin": ADMIN_SYSTEM_MESSAGE,
+    "Coder": CODER_SYSTEM_MESSAGE,
+    "Reviewer": REVIEWER_SYSTEM_MESSAGE,
+    "Test_Engineer": TEST_ENGINEER_SYSTEM_MESSAGE,
+}
+
+
+def build_team(config_list, human_input_mode="ALWAYS", work_dir="coding", cache=None):
+    """Build this script's Admin/Coder/Reviewer/Test_Engineer group chat as an AgentTeam."""
+    # The agents are wired in agent_team; this script only brings its prompts, lets the
+    # Coder and the Test_Engineer run code too and keeps AutoGen's console for human input.
+    return agent_team.build_team(config_list, work_dir=work_dir, cache=cache, human_input_mode=human_input_mode,
+                                 system_messages=SYSTEM_MESSAGES, code_executors=("Admin", "Coder", "Test_Engineer"),
+                                 console=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Admin/Coder/Reviewer/Test_Engineer group chat.")
+    parser.add_argument("--resume", nargs="?", const="latest", metavar="CHECKPOINT",
+                        help="continue an interrupted conversation from its checkpoint (default: the latest one)")
+    args = parser.parse_args(argv)
+    script_name = os.path.splitext(os.path.basename(__file__))[0]
+    # Raises before anything starts when there is nothing to resume.
+    resume_state = find_checkpoint(args.resume, f"{script_name}-*") if args.resume else None
+
+    config_list = load_config_list()
+    response_cache = ResponseCache.from_env()
+
+    # Create a temporary directory to store the code files.
+    temp_dir = tempfile.TemporaryDirectory()
+
+    print(os.listdir(temp_dir.name))
+
+    # --- Start AutoGen Runtime Logging to the structured, rotated log ---
+    runtime_logger = StructuredRuntimeLogger.from_env()
+    logging_session_id = autogen.runtime_logging.start(logger=runtime_logger)
+    print(f"AutoGen logging started. Session ID: {logging_session_id}")
+    print(f"Logs will be saved to '{runtime_logger.log.log_dir}'.")
+
+    team = build_team(config_list, cache=response_cache)
+    if tracing_enabled():
+        instrument_team(team, Tracer(f"{script_name}-{logging_session_id}"))
+    # Every round is appended to a checkpoint, so a crashed run can be continued with --resume.
+    if resume_state is not None or checkpoints_enabled():
+        path = resume_state.path if resume_state else checkpoint_path(f"{script_name}-{logging_session_id}")
+        CheckpointWriter(path, work_dir="coding", meta={"entry": script_name}, state=resume_state).attach(team)
+
+    # --- Initiate the chat ---
+    print("\n--- Starting the AutoGen Conversation ---")
+    print("Admin will initiate the conversation with the GroupChatManager.")
+    print("Type 'exit' to terminate the human input at any point.")
+
+    if resume_state is not None:
+        print(report_resume(resume_state))
+        team.resume(resume_state)
+    else:
+        team.run(TASK_MESSAGE)
+
+    print("\n--- Conversation Ended ---")
+    print("Check the 'coding' directory for any generated files.")
+    if team.checkpoint is not None:
+        print(f"Checkpoint: '{team.checkpoint.path}' ({team.checkpoint.rounds} rounds).")
+    print(f"Speaker selection: {team.speaker_selector.stats()}")
+    compaction_report = team.compaction.report()
+    print(f"History compaction: {compaction_report['tokens_saved']} tokens saved over "
+          f"{compaction_report['calls']} LLM calls; per round: {team.compaction.savings_by_round()}")
+    if team.execution_cache is not None:
+        print(f"Execution cache: {team.execution_cache.stats()}")
+    if team.fan_out is not None:
+        print(f"Review/test fan-out: {team.fan_out.stats()}")
+    if team.speculation is not None:
+        print(f"Speculative execution: {team.speculation.stats()}")
+    if team.artifacts is not None:
+        artifacts = team.artifacts.stats()
+        print(f"Artifact store: {artifacts['references']} code blocks/outputs referenced, "
+              f"{artifacts['referenced_chars']} characters kept out of messages; {artifacts}")
+    if team.completion is not None:
+        print(f"Early termination: {team.completion.stats(team.groupchat.max_round)}")
+    if team.tokens is not None:
+        tokens = team.tokens.stats()
+        print(f"Token accounting: {tokens['total_tokens']} tokens ({tokens['prompt_tokens']} prompt, "
+              f"{tokens['completion_tokens']} completion) over {tokens['calls']} LLM calls; "
+              f"per agent: { {name: a['total_tokens'] for name, a in tokens['agents'].items()} }")
+        if tokens["actions"]:
+            print(f"Token budget actions: {tokens['actions']}")
+    if shared_router() is not None:
+        print(f"Model routing: {shared_router().stats()}")
+    if team.tracer is not None:
+        print(f"Trace: {team.tracer.totals()} written to '{team.tracer.write()}'.")
+    if response_cache is not None:
+        print(f"LLM response cache: {response_cache.stats()}")
+        response_cache.close()
+
+    # --- Stop AutoGen Runtime Logging ---
+    autogen.runtime_logging.stop()
+    print(f"AutoGen logging stopped. Query it with: python structured_log.py query --session {logging_session_id}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+
+from speaker_selection import execution_exit_code, message_text
+
+DEFAULT_BATCH_DIR = os.path.join("coding", "batch")
+
+
+# --- Task Loading ---
+def load_tasks(path):
+    """
+    Read development requests from a JSONL file. Each line needs a prompt, given either
+    as "prompt"/"task" or as "title" plus "body"; the id comes from "request_id", "id" or
+    "task_id" and defaults to the line number.
+    """
+    tasks = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            prompt = record.get("prompt") or record.get("task")
+            if not prompt:
+                prompt = "\n\n".join(part for part in (record.get("title"), record.get("body")) if part)
+            if not prompt:
+                raise ValueError(f"{path}:{line_no}: task has no prompt, task, title or body")
+            task_id = str(record.get("request_id") or record.get("id") or record.get("task_id") or f"task-{line_no:04d}")
+            tasks.append({"id": task_id, "prompt": prompt})
+    return tasks
+
+
+# --- Result Evaluation ---
+def evaluate_transcript(messages, completion=None):
+    """
+    Decide pass/fail from a finished group chat: the conversation must end with
+    TERMINATE, or be ended by 'completion' (an early_termination.CompletionDetector)
+    with every milestone met, and the last code execution in it must have exited with
+    code 0.
+    """
+    last_exit_code = None
+    executions = 0
+    for message in messages:
+        exit_code = execution_exit_code(message_text(message))
+        if exit_code is not None:
+            executions += 1
+            last_exit_code = exit_code
+    terminated = bool(messages) and message_text(messages[-1]).rstrip().endswith("TERMINATE")
+    terminated = terminated or (completion is not None and completion.reason == "complete")
+    return {
+        "terminated": terminated,
+        "executions": executions,
+        "last_exit_code": last_exit_code,
+        "passed": terminated and last_exit_code == 0,
+    }
+
+
+def token_totals(usage_summary):
+    """Sum prompt/completion tokens and cost over all models in an AutoGen usage summary."""
+    totals = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cost": 0.0}
+    usage = (usage_summary or {}).get("usage_including_cached_inference") or {}
+    for model, model_usage in usage.items():
+        if model == "total_cost":
+            totals["cost"] = model_usage
+            continue
+        for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+            totals[key] += model_usage.get(key, 0)
+    return totals
+
+
+# --- Worker ---
+def _build_task_team(task, options, result, cache):
+    """The task's team, checkpointed, and the checkpoint state to resume (None for a fresh run)."""
+    from agent_team import build_team, config_list_from_env
+    from checkpoint import CheckpointWriter, checkpoint_path, checkpoints_enabled, load_checkpoint
+    from tracing import Tracer, tracing_enabled
+
+    tracer = Tracer(f"batch-{task['id']}") if tracing_enabled() else None
+    team = build_team(config_list_from_env(options["provider"]), work_dir=result["work_dir"], cache=cache,
+                      stream_tokens=False, max_round=options["max_round"], echo=options["verbose"],
+                      tracer=tracer)
+    path = checkpoint_path(f"batch-{task['id']}")
+    state = load_checkpoint(path) if options.get("resume") and os.path.exists(path) else None
+    if state is not None and (state.finished is not None or not state.messages):
+        state = None
+    if state is not None or checkpoints_enabled():
+        CheckpointWriter(path, work_dir=result["work_dir"], meta={"entry": "batch_runner", "task_id": task["id"]},
+                         state=state).attach(team)
+    if state is not None:
+        result["resumed_from_round"] = state.rounds
+    return team, state
+
+
+def _collect_results(team, options, result):
+    import autogen
+
+    from incremental_tests import get_runner
+    from model_router import shared_router
+    from ollama_transport import transport_stats
+
+    messages = team.groupchat.messages
+    result.update(evaluate_transcript(messages, team.completion))
+    result["status"] = "pass" if result["passed"] else "fail"
+    result["rounds"] = len(messages)
+    result["speaker_selection"] = team.speaker_selector.stats()
+    if team.fan_out is not None:
+        result["fan_out"] = team.fan_out.stats()
+    if team.speculation is not None:
+        result["speculative_execution"] = team.speculation.stats()
+    if team.artifacts is not None:
+        result["artifacts"] = team.artifacts.stats()
+    if team.completion is not None:
+        result["early_termination"] = team.completion.stats(options["max_round"])
+    if team.tokens is not None:
+        result["token_accounting"] = team.tokens.stats()
+    compaction = team.compaction.report()
+    result["history_compaction"] = {"tokens_saved": compaction["tokens_saved"], "calls": compaction["calls"]}
+    if team.execution_cache is not None:
+        result["execution_cache"] = team.execution_cache.stats()
+    result["incremental_tests"] = get_runner(result["work_dir"]).stats()
+    if shared_router() is not None:
+        result["model_routing"] = shared_router().stats()
+    if transport_stats():
+        result["ollama_transport"] = transport_stats()
+    if team.tracer is not None:
+        result["trace"] = {**team.tracer.totals(), "file": team.tracer.write()}
+    result["tokens"] = token_totals(autogen.gather_usage_summary(team.agents + [team.manager]))
+
+
+def _fail(result, e):
+    result["status"] = "error"
+    result["passed"] = False
+    result["error"] = f"{type(e).__name__}: {e}"
+    result["traceback"] = traceback.format_exc(limit=5)
+
+
+def _close(result, start, cache):
+    result["wall_time"] = round(time.perf_counter() - start, 3)
+    if cache is not None:
+        result["cache"] = cache.stats()
+        cache.close()
+
+
+def _open_task(task, options):
+    from llm_cache import ResponseCache
+
+    load_dotenv()
+    work_dir = os.path.join(options["batch_dir"], task["id"])
+    os.makedirs(work_dir, exist_ok=True)
+    cache = None if options["no_cache"] else ResponseCache.from_env()
+    return {"id": task["id"], "work_dir": work_dir}, cache
+
+
+def run_task(task, options):
+    """
+    Run one task in a worker process with its own agent team and work dir.
+    Always returns a result record; failures are reported, not raised.
+    """
+    start = time.perf_counter()
+    result, cache = {"id": task["id"]}, None
+    try:
+        result, cache = _open_task(task, options)
+        team, state = _build_task_team(task, options, result, cache)
+        if state is not None:
+            team.resume(state)
+        else:
+            team.run(task["prompt"])
+        _collect_results(team, options, result)
+    except Exception as e:
+        _fail(result, e)
+    finally:
+        _close(result, start, cache)
+    return result
+
+
+async def a_run_task(task, options, runtime):
+    """run_task() as a coroutine on 'runtime' (an async_runtime.AsyncRuntime) in this process."""
+    start = time.perf_counter()
+    result, cache = {"id": task["id"]}, None
+    try:
+        result, cache = _open_task(task, options)
+        team, state = _build_task_team(task, options, result, cache)
+        await runtime.run(team, task["prompt"], state)
+        _collect_results(team, options, result)
+    except Exception as e:
+        _fail(result, e)
+    finally:
+        _close(result, start, cache)
+    return result
+
+
+# --- Batch Driver ---
+def summarize(results):
+    finished = [r for r in results if "rounds" in r]
+    return {
+        "tasks": len(results),
+        "passed": sum(1 for r in results if r.get("passed")),
+        "failed": sum(1 for r in results if r.get("status") == "fail"),
+        "errors": sum(1 for r in results if r.get("status") == "error"),
+        "avg_rounds": sum(r["rounds"] for r in finished) / len(finished) if finished else 0.0,
+        # Rounds the early-termination controller cut off, against running to --max-round.
+        "avg_rounds_saved": (sum(r.get("early_termination", {}).get("rounds_saved", 0) for r in finished)
+                             / len(finished) if finished else 0.0),
+        "ended_early": {reason: sum(1 for r in finished if r.get("early_termination", {}).get("reason") == reason)
+                        for reason in ("complete", "loop")},
+        "total_tokens": sum(r.get("tokens", {}).get("total_tokens", 0) for r in results),
+        # Tasks a token budget stopped before they finished.
+        "budget_stops": sum(1 for r in finished if r.get("token_accounting", {}).get("stopped")),
+        "total_wall_time": round(sum(r.get("wall_time", 0.0) for r in results), 3),
+    }
+
+
+def _report(result, results, total, out):
+    results.append(result)
+    out.write(json.dumps(result) + "\n")
+    out.flush()
+    print(f"[{len(results)}/{total}] {result['id']}: {result['status']} "
+          f"({result.get('rounds', '-')} rounds, {result['wall_time']:.1f}s)", flush=True)
+
+
+def run_batch(tasks, output_path, options, workers):
+    """Run tasks on a process pool and append each result to 'output_path' as it finishes."""
+    results = []
+    with open(output_path, "w", encoding="utf-8") as out, ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_task, task, options): task for task in tasks}
+        for future in as_completed(futures):
+            _report(future.result(), results, len(tasks), out)
+    return results
+
+
+async def run_batch_async(tasks, output_path, options, concurrency):
+    """
+    Run tasks as coroutines on one event loop in this process, at most 'concurrency'
+    conversations at a time; LLM and code execution calls are bounded per provider by
+    async_runtime.AsyncRuntime.
+    """
+    from async_runtime import AsyncRuntime
+
+    runtime = AsyncRuntime.from_env()
+    slots = asyncio.Semaphore(concurrency)
+    results = []
+
+    async def run(task):
+        async with slots:
+            return await a_run_task(task, options, runtime)
+
+    try:
+        with open(output_path, "w", encoding="utf-8") as out:
+            for finished in asyncio.as_completed([run(task) for task in tasks]):
+                _report(await finished, results, len(tasks), out)
+    finally:
+        runtime.close()
+    print(f"Async runtime: {json.dumps(runtime.stats())}")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a JSONL file of development requests through the agent group chat.")
+    parser.add_argument("tasks", help="JSONL file with one development request per line")
+    parser.add_argument("-o", "--output", default="batch_results.jsonl", help="JSONL file to write results to")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 2, help="number of worker processes")
+    parser.add_argument("--provider", default="auto", choices=["auto", "openai", "ollama"])
+    parser.add_argument("--max-round", type=int, default=30)
+    parser.add_argument("--batch-dir", default=DEFAULT_BATCH_DIR, help="parent of the per-task work dirs")
+    parser.add_argument("--limit", type=int, help="only run the first N tasks")
+    parser.add_argument("--no-cache", action="store_true", help="bypass the LLM response cache")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue tasks whose previous run was interrupted from their checkpoints")
+    parser.add_argument("--async-conversations", type=int, metavar="N",
+                        help="run up to N conversations on one event loop in this process instead of --workers processes")
+    parser.add_argument("-v", "--verbose", action="store_true", help="echo AutoGen's console output")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    tasks = load_tasks(args.tasks)[:args.limit]
+    if not tasks:
+        print(f"No tasks found in '{args.tasks}'.")
+        return 1
+    options = {
+        "provider": args.provider,
+        "max_round": args.max_round,
+        "batch_dir": args.batch_dir,
+        "no_cache": args.no_cache,
+        "resume": args.resume,
+        "verbose": args.verbose,
+    }
+    if args.async_conversations:
+        print(f"Running {len(tasks)} tasks, {args.async_conversations} at a time on one event loop...", flush=True)
+        results = asyncio.run(run_batch_async(tasks, args.output, options, max(1, args.async_conversations)))
+    else:
+        print(f"Running {len(tasks)} tasks with {args.workers} workers...", flush=True)
+        results = run_batch(tasks, args.output, options, max(1, args.workers))
+    print(f"Summary: {json.dumps(summarize(results))}")
+    print(f"Results written to '{args.output}'.")
+    return 0 if all(r.get("status") != "error" for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,403 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from incremental_tests import get_runner
+from mock_llm_server import MockLLMServer
+from ollama_transport import transport_stats
+from structured_log import StructuredRuntimeLogger
+
+SETUPS = ("autogen_prime_numbers", "ollama_autogen_prime_numbers", "agentic_ai_ux")
+DEFAULT_RESULTS_DIR = "bench_results"
+# Metrics where a higher value in the new run is a regression.
+REGRESSION_METRICS = ("wall_time_mean", "round_latency_p95", "manager_time_mean", "callback_time_mean")
+
+UX_TASK = "Write a Python script that prints 'Hello, World!' to the console."
+
+
+# --- Setups ---
+def build_setup(name, server, work_dir):
+    """Build one of the entry points' group chats against the mock server, headless."""
+    config_list = [{"model": "gpt-4", "api_key": "mock", "base_url": server.openai_base_url}]
+    if name == "autogen_prime_numbers":
+        import autogen_prime_numbers
+        team = autogen_prime_numbers.build_team(config_list, human_input_mode="NEVER", work_dir=work_dir)
+        return team, autogen_prime_numbers.TASK_MESSAGE
+    if name == "ollama_autogen_prime_numbers":
+        import ollama_autogen_prime_numbers
+        llm_config = ollama_autogen_prime_numbers.make_manager_llm_config(base_url=f"{server.url}/api")
+        # AutoGen's Ollama client connects to 'client_host' rather than 'base_url'.
+        for entry in llm_config["config_list"]:
+            entry["client_host"] = server.url
+        team = ollama_autogen_prime_numbers.build_team(llm_config, human_input_mode="NEVER", work_dir=work_dir)
+        return team, ollama_autogen_prime_numbers.TASK_MESSAGE
+    if name == "agentic_ai_ux":
+        from agent_team import build_team
+        return build_team(config_list, work_dir=work_dir, stream_tokens=True), UX_TASK
+    raise ValueError(f"Unknown setup '{name}'. Expected one of {', '.join(SETUPS)}.")
+
+
+# --- Instrumentation ---
+class RunProbe:
+    """
+    Times the phases of one group chat by wrapping, on the instances only:
+    GroupChat.append (round boundaries), GroupChat.select_speaker (manager overhead)
+    and every non-AutoGen reply function registered on the agents (callback overhead).
+    """
+
+    def __init__(self, team):
+        self.round_marks = []
+        self.manager_time = 0.0
+        self.callback_time = 0.0
+        self.callback_calls = 0
+        groupchat = team.groupchat
+
+        original_append = groupchat.append
+        original_select = groupchat.select_speaker
+
+        def append(message, speaker):
+            self.round_marks.append(time.perf_counter())
+            return original_append(message, speaker)
+
+        def select_speaker(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original_select(*args, **kwargs)
+            finally:
+                self.manager_time += time.perf_counter() - start
+
+        groupchat.append = append
+        groupchat.select_speaker = select_speaker
+        for agent in team.agents:
+            for entry in agent._reply_func_list:
+                func = entry["reply_func"]
+                if not getattr(func, "__module__", "").startswith("autogen"):
+                    entry["reply_func"] = self._timed(func)
+
+    def _timed(self, func):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.callback_time += time.perf_counter() - start
+                self.callback_calls += 1
+        timed.__name__ = getattr(func, "__name__", "reply_func")
+        return timed
+
+    def round_latencies(self, start):
+        marks = [start] + self.round_marks
+        return [b - a for a, b in zip(marks, marks[1:])]
+
+
+def max_rss_mb():
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    return usage / (1024 * 1024) if sys.platform == "darwin" else usage / 1024
+
+
+def run_once(name, server, trace_memory=False):
+    with tempfile.TemporaryDirectory(prefix="bench-") as work_dir:
+        team, task = build_setup(name, server, work_dir)
+        probe = RunProbe(team)
+        requests_before = server.stats()["requests"]
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        team.run(task)
+        wall_time = time.perf_counter() - start
+        peak = None
+        if trace_memory:
+            peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            tracemalloc.stop()
+        latencies = probe.round_latencies(start)
+        return {
+            "wall_time": wall_time,
+            "rounds": len(team.groupchat.messages),
+            "round_latencies": latencies,
+            "manager_time": probe.manager_time,
+            "callback_time": probe.callback_time,
+            "callback_calls": probe.callback_calls,
+            "llm_requests": server.stats()["requests"] - requests_before,
+            "speaker_selection": team.speaker_selector.stats(),
+            "fan_out": team.fan_out.stats() if team.fan_out else None,
+            "speculative_execution": team.speculation.stats() if team.speculation else None,
+            "artifacts": team.artifacts.stats() if team.artifacts else None,
+            "early_termination": team.completion.stats(team.groupchat.max_round) if team.completion else None,
+            "tokens_saved_by_round": team.compaction.savings_by_round() if team.compaction else {},
+            "token_accounting": team.tokens.stats() if team.tokens else None,
+            "code_execution": team.code_execution,
+            "incremental_tests": get_runner(work_dir).stats(),
+            "execution_cache": team.execution_cache.stats() if team.execution_cache else None,
+            "ollama_transport": transport_stats(),
+            "tracemalloc_peak_mb": peak,
+        }
+
+
+def _message_chars(messages):
+    return sum(len(m["content"]) for m in messages if isinstance(m, dict) and isinstance(m.get("content"), str))
+
+
+def _dir_bytes(path):
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def run_artifact_report(name, server):
+    """
+    Run one setup with ARTIFACT_STORE=0 and =1 and compare what the conversation keeps:
+    characters held in the group chat and every agent's chat_messages, the tracemalloc
+    peak and what is still allocated at the end, and the size of the runtime log
+    (including its artifact store).
+    """
+    import autogen
+
+    report = {}
+    previous = {key: os.environ.get(key) for key in ("ARTIFACT_STORE", "RUNTIME_LOG_DIR")}
+    try:
+        for mode in ("off", "on"):
+            with tempfile.TemporaryDirectory(prefix="bench-") as work_dir, \
+                    tempfile.TemporaryDirectory(prefix="bench-log-") as log_dir:
+                os.environ["ARTIFACT_STORE"] = "1" if mode == "on" else "0"
+                os.environ["RUNTIME_LOG_DIR"] = log_dir
+                runtime_logger = StructuredRuntimeLogger.from_env()
+                autogen.runtime_logging.start(logger=runtime_logger)
+                tracemalloc.start()
+                try:
+                    team, task = build_setup(name, server, work_dir)
+                    start = time.perf_counter()
+                    team.run(task)
+                    wall_time = time.perf_counter() - start
+                    retained, peak = tracemalloc.get_traced_memory()
+                finally:
+                    tracemalloc.stop()
+                    autogen.runtime_logging.stop()
+                report[mode] = {
+                    "wall_time": wall_time,
+                    "rounds": len(team.groupchat.messages),
+                    "message_chars": _message_chars(team.groupchat.messages) + sum(
+                        _message_chars(messages) for agent in team.agents
+                        for messages in agent.chat_messages.values()),
+                    "tracemalloc_peak_mb": peak / (1024 * 1024),
+                    "tracemalloc_retained_mb": retained / (1024 * 1024),
+                    "runtime_log_bytes": _dir_bytes(log_dir),
+                    "artifacts": team.artifacts.stats() if team.artifacts else None,
+                }
+    finally:
+        for key, value in previous.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+    off, on = report["off"], report["on"]
+    report["reduction"] = {key: round(1 - on[key] / off[key], 3) if off[key] else 0.0
+                           for key in ("message_chars", "tracemalloc_peak_mb", "tracemalloc_retained_mb",
+                                       "runtime_log_bytes")}
+    return report
+
+
+def run_concurrent(name, server, conversations, mode):
+    """
+    Run 'conversations' chats of one setup at once, 'threaded' (one thread each, as the
+    job runner does) or 'async' (all on one event loop with async_runtime.AsyncRuntime).
+    CPU time covers every thread of the process, so conversations per CPU-second is the
+    throughput one core sustains.
+    """
+    from async_runtime import AsyncRuntime
+
+    with tempfile.TemporaryDirectory(prefix="bench-") as root:
+        runs = []
+        for i in range(conversations):
+            work_dir = os.path.join(root, f"conversation-{i}")
+            os.makedirs(work_dir)
+            runs.append(build_setup(name, server, work_dir))
+        peak_threads, done = [threading.active_count()], threading.Event()
+
+        def sample_threads():
+            while not done.wait(0.01):
+                peak_threads.append(threading.active_count())
+
+        sampler = threading.Thread(target=sample_threads, daemon=True)
+        sampler.start()
+        cpu_start, start = time.process_time(), time.perf_counter()
+        errors = 0
+        if mode == "threaded":
+            with ThreadPoolExecutor(max_workers=conversations) as pool:
+                for future in [pool.submit(team.run, task) for team, task in runs]:
+                    errors += future.exception() is not None
+        else:
+            runtime = AsyncRuntime.from_env()
+            try:
+                errors = sum(isinstance(r, BaseException) for r in asyncio.run(runtime.run_many(runs)))
+            finally:
+                runtime.close()
+        wall_time, cpu_time = time.perf_counter() - start, time.process_time() - cpu_start
+        done.set()
+        sampler.join()
+        return {
+            "mode": mode,
+            "conversations": conversations,
+            "errors": errors,
+            "wall_time": wall_time,
+            "cpu_time": cpu_time,
+            "rounds_mean": statistics.mean(len(team.groupchat.messages) for team, _ in runs),
+            "conversations_per_second": conversations / wall_time if wall_time else 0.0,
+            "conversations_per_cpu_second": conversations / cpu_time if cpu_time else 0.0,
+            "peak_threads": max(peak_threads),
+        }
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def aggregate(runs):
+    latencies = [lat for run in runs for lat in run["round_latencies"]]
+    total_time = sum(run["wall_time"] for run in runs)
+    total_rounds = sum(run["rounds"] for run in runs)
+    return {
+        "iterations": len(runs),
+        "wall_time_mean": statistics.mean(run["wall_time"] for run in runs),
+        "rounds_mean": total_rounds / len(runs),
+        "round_latency_mean": statistics.mean(latencies) if latencies else 0.0,
+        "round_latency_p50": percentile(latencies, 50),
+        "round_latency_p95": percentile(latencies, 95),
+        "manager_time_mean": statistics.mean(run["manager_time"] for run in runs),
+        "callback_time_mean": statistics.mean(run["callback_time"] for run in runs),
+        "llm_requests_mean": statistics.mean(run["llm_requests"] for run in runs),
+        "rounds_per_second": total_rounds / total_time if total_time else 0.0,
+        "conversations_per_second": len(runs) / total_time if total_time else 0.0,
+        "tracemalloc_peak_mb": max((run["tracemalloc_peak_mb"] or 0.0) for run in runs) or None,
+    }
+
+
+# --- Results ---
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(current, baseline, threshold):
+    """Print per-metric changes against a baseline result file; return the regressions."""
+    regressions = []
+    for name, result in current["setups"].items():
+        base = baseline.get("setups", {}).get(name)
+        if not base:
+            continue
+        print(f"\n{name} vs {baseline['meta'].get('commit', '?')}:")
+        for metric in REGRESSION_METRICS:
+            old, new = base["summary"].get(metric), result["summary"].get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            flag = " REGRESSION" if change > threshold else ""
+            print(f"  {metric:<22} {old:10.4f} -> {new:10.4f} ({change:+.1%}){flag}")
+            if flag:
+                regressions.append((name, metric, change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the group-chat setups against a local mock LLM server.")
+    parser.add_argument("--setups", nargs="+", default=list(SETUPS), choices=SETUPS)
+    parser.add_argument("-n", "--iterations", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.05, help="mock seconds per LLM request")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="mock seconds per streamed chunk")
+    parser.add_argument("--review-rounds", type=int, default=1, help="change requests before the mock Reviewer approves")
+    parser.add_argument("--trace-memory", action="store_true", help="also record the tracemalloc peak (slows runs down)")
+    parser.add_argument("--results-dir", default=DEFAULT_RESULTS_DIR)
+    parser.add_argument("--concurrency", type=int, metavar="N",
+                        help="also run N conversations at once, threaded and on one event loop, and compare them")
+    parser.add_argument("--artifact-report", action="store_true",
+                        help="also run each setup with the artifact store off and on, and compare memory and log size")
+    parser.add_argument("--compare", help="earlier result JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative slowdown reported as a regression")
+    args = parser.parse_args(argv)
+
+    # Benchmarks must measure orchestration, not cache hits.
+    os.environ["LLM_CACHE_DISABLED"] = "1"
+    rss_before = max_rss_mb()
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "latency": args.latency,
+            "token_latency": args.token_latency,
+            "review_rounds": args.review_rounds,
+        },
+        "setups": {},
+    }
+    with MockLLMServer(latency=args.latency, token_latency=args.token_latency,
+                       review_rounds=args.review_rounds) as server:
+        for name in args.setups:
+            runs = [run_once(name, server, args.trace_memory) for _ in range(args.iterations)]
+            summary = aggregate(runs)
+            results["setups"][name] = {"summary": summary, "runs": runs}
+            print(f"{name}: {summary['wall_time_mean']:.3f}s/conversation, {summary['rounds_mean']:.1f} rounds, "
+                  f"p95 round {summary['round_latency_p95'] * 1000:.1f}ms, "
+                  f"manager {summary['manager_time_mean'] * 1000:.1f}ms, "
+                  f"callbacks {summary['callback_time_mean'] * 1000:.2f}ms, "
+                  f"{summary['rounds_per_second']:.1f} rounds/s")
+            if args.concurrency:
+                modes = {mode: run_concurrent(name, server, args.concurrency, mode) for mode in ("threaded", "async")}
+                results["setups"][name]["concurrency"] = modes
+                for mode, run in modes.items():
+                    print(f"  {args.concurrency} concurrent, {mode:>8}: {run['wall_time']:.2f}s wall, "
+                          f"{run['conversations_per_cpu_second']:.1f} conversations/CPU-s, "
+                          f"{run['peak_threads']} threads, {run['errors']} errors")
+            if args.artifact_report:
+                report = run_artifact_report(name, server)
+                results["setups"][name]["artifact_report"] = report
+                for mode in ("off", "on"):
+                    run = report[mode]
+                    print(f"  artifacts {mode:>3}: {run['rounds']} rounds, {run['message_chars']} chars in messages, "
+                          f"peak {run['tracemalloc_peak_mb']:.1f}MB, retained {run['tracemalloc_retained_mb']:.1f}MB, "
+                          f"log {run['runtime_log_bytes'] / 1024:.1f}KB")
+                print("  artifact store saves " + ", ".join(
+                    f"{key} {value:.0%}" for key, value in report["reduction"].items()))
+        results["meta"]["server"] = server.stats()
+    results["meta"]["max_rss_mb"] = max_rss_mb()
+    results["meta"]["max_rss_before_mb"] = rss_before
+
+    os.makedirs(args.results_dir, exist_ok=True)
+    path = os.path.join(args.results_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{results['meta']['commit']}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to '{path}'.")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}.")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,270 @@
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from async_runtime import in_async_chat
+
+DEFAULT_CHECKPOINT_DIR = "checkpoints"
+# Work dir entries that are caches of this repo's executors, not conversation artifacts.
+IGNORED_NAMES = ("__pycache__",)
+
+
+def checkpoints_enabled():
+    return os.getenv("CHECKPOINT", "1").lower() not in ("0", "false", "no")
+
+
+def checkpoint_path(name, directory=None):
+    return os.path.join(directory or os.getenv("CHECKPOINT_DIR", DEFAULT_CHECKPOINT_DIR), f"{name}.jsonl")
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ArtifactManifest:
+    """
+    Size, mtime and sha256 of every file under a work dir. scan() returns only what
+    changed since the previous scan; unchanged files (same size and mtime) are not
+    re-hashed.
+    """
+
+    def __init__(self, work_dir, files=None):
+        self.work_dir = work_dir
+        self.files = dict(files or {})
+        self._stat = {}
+
+    def walk(self):
+        """(relative path, path) of every artifact file under the work dir."""
+        for root, dirs, files in os.walk(self.work_dir):
+            dirs[:] = [d for d in dirs if not d.startswith(".") and d not in IGNORED_NAMES]
+            for name in files:
+                if not name.startswith("."):
+                    path = os.path.join(root, name)
+                    yield os.path.relpath(path, self.work_dir).replace(os.sep, "/"), path
+
+    def scan(self):
+        """{relative path: {"size", "sha256"} or None when deleted} for files changed since the last scan."""
+        delta, seen = {}, set()
+        if self.work_dir and os.path.isdir(self.work_dir):
+            for rel, path in self.walk():
+                seen.add(rel)
+                try:
+                    st = os.stat(path)
+                    stat = (st.st_size, st.st_mtime_ns)
+                    if self._stat.get(rel) == stat:
+                        continue
+                    entry = {"size": st.st_size, "sha256": _file_digest(path)}
+                except OSError:
+                    continue
+                self._stat[rel] = stat
+                if self.files.get(rel) != entry:
+                    self.files[rel] = delta[rel] = entry
+        for rel in set(self.files) - seen:
+            del self.files[rel]
+            self._stat.pop(rel, None)
+            delta[rel] = None
+        return delta
+
+    def verify(self):
+        """Files whose content differs from the manifest, or that are missing."""
+        problems = {}
+        for rel, entry in self.files.items():
+            path = os.path.join(self.work_dir, rel)
+            if not os.path.exists(path):
+                problems[rel] = "missing"
+            elif _file_digest(path) != entry["sha256"]:
+                problems[rel] = "changed"
+        return problems
+
+
+def _drop_torn_tail(path):
+    """Cut a last line left incomplete by a crash, so appended records start on a line of their own."""
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+
+class CheckpointWriter:
+    """
+    Appends a group chat's progress to a JSONL checkpoint: a 'start' record with the
+    task, then one 'round' record per message posted to the GroupChat (the message,
+    its speaker, the round and the work dir files that changed since the previous
+    round) and an 'end' record when the chat finishes normally. Nothing is ever
+    rewritten; a checkpoint without an 'end' record belongs to an interrupted chat and
+    can be resumed with AgentTeam.resume().
+
+    In conversations run by async_runtime.AsyncRuntime, rounds are written (and the
+    work dir hashed) by a writer thread, in order, so the event loop never waits on
+    the disk; flush() waits for them.
+    """
+
+    def __init__(self, path, work_dir=None, meta=None, state=None):
+        self.path = path
+        self.work_dir = work_dir
+        self.meta = dict(meta or {})
+        self.rounds = state.rounds if state else 0
+        self.manifest = ArtifactManifest(work_dir, state.manifest if state else None)
+        self.bytes_written = 0
+        self._lock = threading.Lock()
+        self._writer = None
+        self._queued = []
+        # Work dir changes made while the chat was down go into the first resumed round.
+        self._pending = self.manifest.scan() if state is not None else {}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if state is not None:
+            _drop_torn_tail(path)
+
+    def _append(self, record):
+        line = json.dumps(record, default=str, ensure_ascii=False) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+            f.flush()
+            self.bytes_written += len(line)
+
+    def attach(self, team):
+        """Record every message appended to the team's GroupChat. Sets team.checkpoint."""
+        groupchat = team.groupchat
+        original_append = groupchat.append
+
+        def append(message, speaker):
+            result = original_append(message, speaker)
+            # Messages re-loaded by GroupChatManager.resume() are already in the checkpoint.
+            if len(groupchat.messages) > self.rounds:
+                message, name = groupchat.messages[-1], getattr(speaker, "name", str(speaker))
+                if in_async_chat():
+                    self.rounds += 1
+                    self._queue(self._write_round, self.rounds, dict(message), name)
+                else:
+                    self.record_round(message, name)
+            return result
+
+        groupchat.append = append
+        team.checkpoint = self
+        return self
+
+    def start(self, task):
+        # A fresh run replaces an old checkpoint of the same name.
+        with open(self.path, "w", encoding="utf-8"):
+            pass
+        self.rounds = 0
+        self.manifest = ArtifactManifest(self.work_dir)
+        self._pending = {}
+        self._append({"type": "start", "ts": time.time(), "task": task, "work_dir": self.work_dir, **self.meta})
+
+    def record_round(self, message, speaker):
+        self.rounds += 1
+        self._write_round(self.rounds, message, speaker)
+
+    def _write_round(self, round, message, speaker):
+        artifacts, self._pending = {**self._pending, **self.manifest.scan()}, {}
+        self._append({"type": "round", "ts": time.time(), "round": round, "speaker": speaker,
+                      "message": message, "artifacts": artifacts})
+
+    def _queue(self, func, *args):
+        if self._writer is None:
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint-writer")
+        self._queued.append(self._writer.submit(func, *args))
+
+    def flush(self):
+        """Wait for the rounds queued by an async conversation; re-raises a failed write."""
+        writer, queued, self._writer, self._queued = self._writer, self._queued, None, []
+        if writer is not None:
+            writer.shutdown(wait=True)
+        for future in queued:
+            future.result()
+
+    def finish(self, reason="completed"):
+        self.flush()
+        self._append({"type": "end", "ts": time.time(), "round": self.rounds, "reason": reason})
+
+
+class CheckpointState:
+    """A checkpoint replayed from disk: the task, the messages, their speakers and the artifact manifest."""
+
+    def __init__(self, path):
+        self.path = path
+        self.meta = {}
+        self.task = None
+        self.work_dir = None
+        self.messages = []
+        self.speakers = []
+        self.manifest = {}
+        self.finished = None
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # A torn last line from a crash mid-write.
+                self._apply(record)
+
+    def _apply(self, record):
+        kind = record.get("type")
+        if kind == "start":
+            self.meta = {k: v for k, v in record.items() if k not in ("type", "ts")}
+            self.task = record.get("task")
+            self.work_dir = record.get("work_dir")
+        elif kind == "round":
+            self.messages.append(record["message"])
+            self.speakers.append(record.get("speaker"))
+            for rel, entry in (record.get("artifacts") or {}).items():
+                if entry is None:
+                    self.manifest.pop(rel, None)
+                else:
+                    self.manifest[rel] = entry
+        elif kind == "end":
+            self.finished = record.get("reason") or "completed"
+
+    @property
+    def rounds(self):
+        return len(self.messages)
+
+    @property
+    def last_speaker(self):
+        return self.speakers[-1] if self.speakers else None
+
+    def verify_artifacts(self):
+        return ArtifactManifest(self.work_dir, self.manifest).verify() if self.work_dir else {}
+
+
+def load_checkpoint(path):
+    return CheckpointState(path)
+
+
+def unfinished_checkpoints(pattern="*", directory=None):
+    """Interrupted checkpoints matching 'pattern' (a file name glob without .jsonl), newest first."""
+    paths = glob.glob(checkpoint_path(pattern, directory))
+    states = []
+    for path in sorted(paths, key=os.path.getmtime, reverse=True):
+        state = CheckpointState(path)
+        if state.finished is None and state.messages:
+            states.append(state)
+    return states
+
+
+def find_checkpoint(value, pattern="*", directory=None):
+    """A checkpoint to resume: 'latest' picks the newest interrupted one matching 'pattern', anything else is a path."""
+    if value != "latest":
+        return load_checkpoint(value)
+    states = unfinished_checkpoints(pattern, directory)
+    if not states:
+        raise FileNotFoundError(f"No interrupted conversation found in '{checkpoint_path(pattern, directory)}'.")
+    return states[0]
+
+
+def report_resume(state):
+    """One line for the console about what is being resumed (and artifacts that changed since)."""
+    problems = state.verify_artifacts()
+    line = f"Resuming '{state.path}' after round {state.rounds} (last speaker: {state.last_speaker})."
+    if problems:
+        line += " Work dir differs from the checkpoint: " + ", ".join(f"{rel} {why}" for rel, why in sorted(problems.items()))
+    return line
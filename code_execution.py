@@ -0,0 +1,736 @@
+import atexit
+import hashlib
+import json
+import os
+import queue
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import resource
+except ImportError:  # Windows: only the wall-time limit applies.
+    resource = None
+
+DEFAULT_POOL_SIZE = 2
+DEFAULT_MAX_RUNS = 20
+DEFAULT_TIMEOUT = 60
+DEFAULT_MAX_POOLS = 4
+DEFAULT_MEMORY_MB = 2048
+DEFAULT_OUTPUT_BUDGET = 8192
+DEFAULT_ADAPTIVE_FLOOR = 10
+ADAPTIVE_FACTOR = 4
+TIMEOUT_EXIT_CODE = 124
+# What a shell reports for a process killed by SIGXCPU (128 + 24).
+CPU_LIMIT_EXIT_CODE = 152
+OUTPUT_MARKER = "\n... [{omitted} bytes of output omitted; full output in {name}] ...\n"
+# Imported once per worker so test runs don't pay for them.
+PRELOAD_MODULES = ("unittest", "unittest.mock", "doctest", "json", "re", "math", "collections", "decimal")
+PYTHON_LANGUAGES = ("python", "py", "python3", "")
+FILENAME_LINE_RE = re.compile(r"^\s*#\s*(?:filename:)?\s*(\S+\.py)\s*$")
+
+
+# --- Resource Limits ---
+class ResourceLimits:
+    """
+    Caps of one script run: wall time (always), CPU time and memory (where the 'resource'
+    module exists, so not on Windows) and the bytes of output kept in the chat message.
+    """
+
+    def __init__(self, wall_seconds=DEFAULT_TIMEOUT, cpu_seconds=None, memory_mb=None,
+                 output_bytes=DEFAULT_OUTPUT_BUDGET):
+        self.wall_seconds = wall_seconds
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.output_bytes = output_bytes
+
+    @classmethod
+    def from_env(cls, timeout=None):
+        """
+        CODE_EXEC_TIMEOUT (wall seconds), CODE_CPU_LIMIT (CPU seconds, default the wall
+        time), CODE_MEMORY_LIMIT_MB and CODE_OUTPUT_BUDGET (bytes); 0 turns a cap off.
+        """
+        wall = timeout or int(os.getenv("CODE_EXEC_TIMEOUT", DEFAULT_TIMEOUT))
+        return cls(wall_seconds=wall,
+                   cpu_seconds=int(os.getenv("CODE_CPU_LIMIT", wall)) or None,
+                   memory_mb=int(os.getenv("CODE_MEMORY_LIMIT_MB", DEFAULT_MEMORY_MB)) or None,
+                   output_bytes=int(os.getenv("CODE_OUTPUT_BUDGET", DEFAULT_OUTPUT_BUDGET)) or None)
+
+    def tightened(self, wall_seconds, cpu_seconds):
+        return ResourceLimits(min(self.wall_seconds, wall_seconds),
+                              min(self.cpu_seconds, cpu_seconds) if self.cpu_seconds else None,
+                              self.memory_mb, self.output_bytes)
+
+
+class AdaptiveLimits:
+    """
+    Tightens the wall and CPU time limits of a script to 'factor' times what its slowest
+    earlier run took, never below 'floor' seconds and never above the configured limits.
+    Versions of one file (prime_v1.py, prime_v2.py) share their history, so a revision
+    that loops forever is stopped after seconds instead of after the full timeout.
+    """
+
+    def __init__(self, factor=ADAPTIVE_FACTOR, floor=DEFAULT_ADAPTIVE_FLOOR):
+        self.factor = factor
+        self.floor = floor
+        self._observed = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """None when CODE_ADAPTIVE_LIMITS=0; CODE_ADAPTIVE_FLOOR sets the floor in seconds."""
+        if os.getenv("CODE_ADAPTIVE_LIMITS", "1").lower() in ("0", "false", "no"):
+            return None
+        return cls(floor=float(os.getenv("CODE_ADAPTIVE_FLOOR", DEFAULT_ADAPTIVE_FLOOR)))
+
+    @staticmethod
+    def _key(path):
+        from incremental_tests import VERSION_SUFFIX_RE
+
+        name = os.path.splitext(os.path.basename(path))[0]
+        # Unnamed blocks are saved under their hash; they have no history worth keeping.
+        return None if name.startswith("tmp_code_") else VERSION_SUFFIX_RE.sub("", name)
+
+    def limits_for(self, path, limits):
+        with self._lock:
+            observed = self._observed.get(self._key(path))
+        if observed is None:
+            return limits
+        wall, cpu = observed
+        return limits.tightened(max(self.floor, self.factor * wall), max(self.floor, self.factor * cpu))
+
+    def record(self, path, wall, cpu):
+        key = self._key(path)
+        if key is None:
+            return
+        with self._lock:
+            previous = self._observed.get(key, (0.0, 0.0))
+            self._observed[key] = (max(previous[0], wall), max(previous[1], cpu or 0.0))
+
+
+def _bounded(head, tail, size, name):
+    """Join an output's first and last bytes, cut at line ends, around an omission marker."""
+    head = head[:head.rfind(b"\n") + 1] or head
+    tail = tail[tail.find(b"\n") + 1:] or tail
+    marker = OUTPUT_MARKER.format(omitted=size - len(head) - len(tail), name=name)
+    return head.decode("utf-8", "replace") + marker + tail.decode("utf-8", "replace")
+
+
+def bound_output(text, budget, spill_path, work_dir):
+    """'text' if it fits in 'budget' bytes; else its head and tail, with all of it written to 'spill_path'."""
+    data = (text or "").encode("utf-8")
+    if not budget or len(data) <= budget:
+        return text
+    with open(spill_path, "wb") as f:
+        f.write(data)
+    half = budget // 2
+    return _bounded(data[:half], data[len(data) - (budget - half):], len(data), os.path.relpath(spill_path, work_dir))
+
+
+# --- Worker Side ---
+# This module doubles as the worker program: `python code_execution.py --worker` keeps one
+# warm interpreter that runs scripts with runpy and answers on a JSON-lines channel.
+class CPULimitExceeded(BaseException):
+    pass
+
+
+def _set_soft_limit(kind, value):
+    soft, hard = resource.getrlimit(kind)
+    if hard != resource.RLIM_INFINITY:
+        value = min(value, hard)
+    try:
+        resource.setrlimit(kind, (value, hard))
+    except (ValueError, OSError):
+        return None
+    return kind, soft, hard
+
+
+def _address_space():
+    """This process's virtual memory size (Linux only, else 0)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def _limit_resources(cpu_seconds, memory_mb):
+    """
+    Lower the soft CPU-time and address-space limits of this worker for one run, on top
+    of what it has used so far; returns what _restore_limits() needs. Only soft limits
+    change, since an unprivileged process cannot raise a hard limit again.
+    """
+    saved = []
+    if resource is None:
+        return saved
+    if cpu_seconds:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        saved.append(_set_soft_limit(resource.RLIMIT_CPU, int(usage.ru_utime + usage.ru_stime + cpu_seconds) + 1))
+    baseline = _address_space() if memory_mb and hasattr(resource, "RLIMIT_AS") else 0
+    if baseline:
+        saved.append(_set_soft_limit(resource.RLIMIT_AS, baseline + memory_mb * 1024 * 1024))
+    return [limit for limit in saved if limit]
+
+
+def _restore_limits(saved):
+    for kind, soft, hard in saved:
+        resource.setrlimit(kind, (soft, hard))
+
+
+def _cpu_time():
+    if resource is None:
+        return 0.0
+    own, children = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def _worker_main():
+    import builtins
+    import contextlib
+    import importlib
+    import runpy
+    import traceback
+
+    channel = os.fdopen(os.dup(sys.stdout.fileno()), "w", encoding="utf-8", buffering=1)
+    # Requests arrive on a private copy of the pipe; scripts (and their child processes)
+    # read stdin from /dev/null, so input() raises EOFError instead of blocking.
+    requests = os.fdopen(os.dup(sys.stdin.fileno()), "r", encoding="utf-8")
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.close(devnull)
+    stdin = open(os.devnull, encoding="utf-8")
+    if hasattr(signal, "SIGXCPU"):
+        def on_cpu_limit(signum, frame):
+            raise CPULimitExceeded()
+
+        signal.signal(signal.SIGXCPU, on_cpu_limit)
+    for name in PRELOAD_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+    channel.write(json.dumps({"ready": True, "pid": os.getpid()}) + "\n")
+
+    skip_files = {os.path.abspath(runpy.__file__), os.path.abspath(__file__)}
+
+    def print_traceback(exc, stream):
+        # runpy is a frozen module ("<frozen runpy>") on Python 3.11+.
+        frames = [f for f in traceback.extract_tb(exc.__traceback__)
+                  if not f.filename.startswith("<frozen") and os.path.abspath(f.filename) not in skip_files]
+        if frames:
+            stream.write("Traceback (most recent call last):\n")
+            stream.write("".join(traceback.format_list(frames)))
+        stream.write("".join(traceback.format_exception_only(type(exc), exc)))
+
+    for line in requests:
+        request = json.loads(line)
+        path, cwd = request["file"], request["cwd"]
+        modules_before = dict(sys.modules)
+        builtins_before = dict(vars(builtins))
+        environ_before = dict(os.environ)
+        threads_before = {t.ident for t in threading.enumerate()}
+        saved = (list(sys.argv), list(sys.path), os.getcwd())
+        saved_fds = (os.dup(1), os.dup(2))
+        exit_code, polluted = 0, False
+        cpu_before = _cpu_time()
+
+        with open(request["output"], "w", encoding="utf-8", buffering=1) as out:
+            # Point fds 1/2 at the output file as well, so child processes are captured too.
+            os.dup2(out.fileno(), 1)
+            os.dup2(out.fileno(), 2)
+            try:
+                os.chdir(cwd)
+                sys.stdin = stdin
+                sys.argv = [path]
+                sys.path[0:0] = [os.path.dirname(path)]
+                with contextlib.redirect_stdout(out), contextlib.redirect_stderr(out):
+                    limits = _limit_resources(request.get("cpu"), request.get("memory"))
+                    try:
+                        runpy.run_path(path, run_name="__main__")
+                    except SystemExit as e:
+                        if e.code is None:
+                            exit_code = 0
+                        elif isinstance(e.code, int):  # includes unittest's sys.exit(True)
+                            exit_code = int(e.code)
+                        else:
+                            print(e.code, file=out)
+                            exit_code = 1
+                    except MemoryError as e:
+                        print_traceback(e, out)
+                        print(f"Memory limit of {request.get('memory')} MB exceeded.", file=out)
+                        exit_code, polluted = 1, True
+                    except Exception as e:
+                        print_traceback(e, out)
+                        exit_code = 1
+                    except CPULimitExceeded:
+                        print(f"CPU time limit of {request.get('cpu')} seconds exceeded.", file=out)
+                        exit_code, polluted = CPU_LIMIT_EXIT_CODE, True
+                    except BaseException as e:  # KeyboardInterrupt and friends leave the worker unusable.
+                        print_traceback(e, out)
+                        exit_code, polluted = 1, True
+                    finally:
+                        _restore_limits(limits)
+            finally:
+                out.flush()
+                os.dup2(saved_fds[0], 1)
+                os.dup2(saved_fds[1], 2)
+                for fd in saved_fds:
+                    os.close(fd)
+                sys.argv, sys.path[:] = saved[0], saved[1]
+                os.chdir(saved[2])
+
+        # Forget the modules the script imported from its work dir, so the next run sees new versions.
+        for name, module in list(sys.modules.items()):
+            if name not in modules_before:
+                module_file = os.path.abspath(getattr(module, "__file__", None) or os.devnull)
+                if module_file.startswith(os.path.abspath(cwd) + os.sep):
+                    del sys.modules[name]
+            elif module is not modules_before[name]:
+                polluted = True
+        polluted = (polluted
+                    or any(vars(builtins).get(k) is not v for k, v in builtins_before.items())
+                    or dict(os.environ) != environ_before
+                    or any(t.ident not in threads_before and not t.daemon for t in threading.enumerate()))
+        channel.write(json.dumps({"exit_code": exit_code, "polluted": polluted,
+                                  "cpu": round(_cpu_time() - cpu_before, 4)}) + "\n")
+
+
+# --- Pool Side ---
+class WorkerCrashed(RuntimeError):
+    pass
+
+
+class WarmWorker:
+    """One warm interpreter process plus a reader thread for its answers."""
+
+    def __init__(self, python=None):
+        self.process = subprocess.Popen(
+            [python or sys.executable, "-u", os.path.abspath(__file__), "--worker"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            text=True, encoding="utf-8", bufsize=1,
+        )
+        self.runs = 0
+        self._answers = queue.Queue()
+        threading.Thread(target=self._read, name=f"warm-worker-{self.process.pid}", daemon=True).start()
+
+    def _read(self):
+        for line in self.process.stdout:
+            try:
+                self._answers.put(json.loads(line))
+            except ValueError:
+                continue
+        self._answers.put(None)
+
+    def wait_ready(self, timeout):
+        answer = self._next(timeout)
+        if not answer or not answer.get("ready"):
+            raise WorkerCrashed("Worker interpreter failed to start.")
+
+    def _next(self, timeout):
+        try:
+            return self._answers.get(timeout=timeout)
+        except queue.Empty:
+            return "timeout"
+
+    def run(self, path, cwd, output, limits):
+        """Run 'path' with 'cwd' as working directory within ResourceLimits; return the worker's answer or 'timeout'."""
+        self.runs += 1
+        request = {"file": path, "cwd": cwd, "output": output, "cpu": limits.cpu_seconds, "memory": limits.memory_mb}
+        try:
+            self.process.stdin.write(json.dumps(request) + "\n")
+            self.process.stdin.flush()
+        except OSError as e:
+            raise WorkerCrashed(str(e))
+        answer = self._next(limits.wall_seconds)
+        if answer is None:
+            raise WorkerCrashed(f"Worker interpreter exited with code {self.process.wait()}.")
+        return answer
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def stop(self):
+        if self.alive():
+            self.process.kill()
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            pass
+
+
+class WarmInterpreterPool:
+    """
+    Keeps up to 'size' warm worker interpreters for one work dir.
+
+    Workers are spawned in the background when the pool is created, recycled after
+    'max_runs' scripts or as soon as a script pollutes interpreter state (changed
+    builtins, os.environ or already-imported modules, leftover non-daemon threads),
+    and killed and replaced when a script exceeds its timeout. With 'adaptive' (an
+    AdaptiveLimits) the time limits of a script follow how long it took before.
+    """
+
+    def __init__(self, size=DEFAULT_POOL_SIZE, max_runs=DEFAULT_MAX_RUNS, startup_timeout=30, adaptive=None,
+                 acquire_timeout=None):
+        self.size = size
+        self.max_runs = max_runs
+        self.startup_timeout = startup_timeout
+        self.acquire_timeout = acquire_timeout or startup_timeout
+        self.adaptive = adaptive
+        self._idle = queue.Queue()
+        self._live = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        self.counters = {"runs": 0, "spawned": 0, "recycled": 0, "timeouts": 0, "adaptive_timeouts": 0,
+                         "cpu_limited": 0, "crashes": 0, "truncated": 0, "overhead": 0.0}
+        threading.Thread(target=self._prewarm, name="warm-pool-prewarm", daemon=True).start()
+
+    def _prewarm(self):
+        for _ in range(self.size):
+            with self._lock:
+                if self._closed or self._live >= self.size:
+                    return
+                self._live += 1
+            try:
+                worker = self._spawn()
+            except WorkerCrashed:
+                with self._lock:
+                    self._live -= 1
+                return
+            if self._closed:
+                worker.stop()
+                return
+            self._idle.put(worker)
+
+    def _spawn(self):
+        worker = WarmWorker()
+        try:
+            worker.wait_ready(self.startup_timeout)
+        except WorkerCrashed:
+            worker.stop()
+            raise
+        with self._lock:
+            self.counters["spawned"] += 1
+        return worker
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            spawn = self._live < self.size
+            if spawn:
+                self._live += 1
+        if not spawn:
+            try:
+                return self._idle.get(timeout=self.acquire_timeout)
+            except queue.Empty:
+                # A background respawn may have failed without ever handing a worker over.
+                with self._lock:
+                    self._live += 1
+        try:
+            return self._spawn()
+        except WorkerCrashed:
+            with self._lock:
+                self._live -= 1
+            raise
+
+    def _release(self, worker, recycle):
+        if recycle or self._closed or not worker.alive() or worker.runs >= self.max_runs:
+            worker.stop()
+            with self._lock:
+                self._live -= 1
+                self.counters["recycled"] += 1
+            if not self._closed:
+                threading.Thread(target=self._prewarm, name="warm-pool-respawn", daemon=True).start()
+        else:
+            self._idle.put(worker)
+
+    def run(self, path, cwd, timeout=DEFAULT_TIMEOUT, limits=None):
+        """
+        Run a Python file in a warm worker within 'limits' (a ResourceLimits, else just
+        'timeout'); return (exit_code, output). The script's output is streamed to
+        '<path>.out'; when it is above the output budget only its head and tail are
+        returned and the file is kept with all of it.
+        """
+        start = time.perf_counter()
+        configured = limits or ResourceLimits(wall_seconds=timeout, output_bytes=None)
+        limits = self.adaptive.limits_for(path, configured) if self.adaptive else configured
+        worker = self._acquire()
+        output_path = f"{path}.out"
+        recycle = False
+        try:
+            dispatched = time.perf_counter()
+            answer = worker.run(path, cwd, output_path, limits)
+            if answer == "timeout":
+                recycle = True
+                adaptive = limits.wall_seconds < configured.wall_seconds
+                with self._lock:
+                    self.counters["timeouts"] += 1
+                    self.counters["adaptive_timeouts"] += 1 if adaptive else 0
+                exit_code = TIMEOUT_EXIT_CODE
+                note = f"\nTimeout: script did not finish within {limits.wall_seconds:g} seconds."
+                if adaptive:
+                    note += " (The limit follows earlier runs of this script, which were much faster.)"
+            else:
+                recycle = answer.get("polluted", False)
+                exit_code, note = answer["exit_code"], ""
+                if exit_code == CPU_LIMIT_EXIT_CODE:
+                    with self._lock:
+                        self.counters["cpu_limited"] += 1
+                elif self.adaptive is not None:
+                    self.adaptive.record(path, time.perf_counter() - dispatched, answer.get("cpu"))
+        except WorkerCrashed as e:
+            recycle = True
+            with self._lock:
+                self.counters["crashes"] += 1
+            exit_code, note = 1, f"\n{e}"
+        finally:
+            self._release(worker, recycle)
+        output, truncated = _collect_output(output_path, limits.output_bytes, cwd)
+        output += note
+        with self._lock:
+            self.counters["truncated"] += 1 if truncated else 0
+            self.counters["runs"] += 1
+            # Time spent outside the script itself: waiting for a worker and dispatching to it.
+            self.counters["overhead"] += dispatched - start
+        return exit_code, output
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats["live_workers"] = self._live
+        stats["overhead_mean_ms"] = round(stats.pop("overhead") / stats["runs"] * 1000, 2) if stats["runs"] else 0.0
+        return stats
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except queue.Empty:
+                break
+
+
+def _collect_output(path, budget, work_dir):
+    """(output of a run, truncated?): all of it within 'budget' bytes, else head and tail with the file kept."""
+    try:
+        size = os.path.getsize(path)
+        if budget and size > budget:
+            half = budget // 2
+            with open(path, "rb") as f:
+                head = f.read(half)
+                f.seek(size - (budget - half))
+                tail = f.read()
+            return _bounded(head, tail, size, os.path.relpath(path, work_dir)), True
+    except OSError:
+        pass
+    return _read_and_remove(path), False
+
+
+def _read_and_remove(path):
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return f.read()
+    except OSError:
+        return ""
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+_pools = OrderedDict()
+_pools_lock = threading.Lock()
+
+
+def get_pool(work_dir, size=None, max_runs=None):
+    """
+    The shared pool for 'work_dir'. At most CODE_POOL_MAX_POOLS pools are kept; the least
+    recently used one is closed when another work dir needs a pool.
+    """
+    key = os.path.realpath(work_dir)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is not None:
+            _pools.move_to_end(key)
+            return pool
+        pool = WarmInterpreterPool(
+            size=size or int(os.getenv("CODE_POOL_SIZE", DEFAULT_POOL_SIZE)),
+            max_runs=max_runs or int(os.getenv("CODE_POOL_MAX_RUNS", DEFAULT_MAX_RUNS)),
+            adaptive=AdaptiveLimits.from_env(),
+        )
+        _pools[key] = pool
+        while len(_pools) > int(os.getenv("CODE_POOL_MAX_POOLS", DEFAULT_MAX_POOLS)):
+            _pools.popitem(last=False)[1].close()
+        return pool
+
+
+def close_pool(work_dir):
+    """Close the pool of 'work_dir' (e.g. when its conversation ends) and return it, or None."""
+    with _pools_lock:
+        pool = _pools.pop(os.path.realpath(work_dir), None)
+    if pool is not None:
+        pool.close()
+    return pool
+
+
+@atexit.register
+def shutdown_pools():
+    with _pools_lock:
+        while _pools:
+            _pools.popitem()[1].close()
+
+
+# --- AutoGen Executor ---
+def code_file_path(work_dir, code, language="python"):
+    """Where a code block is saved: its '# filename:' first line, else tmp_code_<md5>.py."""
+    if (language or "").lower() not in PYTHON_LANGUAGES:
+        return None
+    work_dir = os.path.abspath(work_dir)
+    first_line = code.lstrip().splitlines()[0] if code.strip() else ""
+    match = FILENAME_LINE_RE.match(first_line)
+    if match:
+        filename = match.group(1)
+    else:
+        filename = f"tmp_code_{hashlib.md5(code.encode('utf-8')).hexdigest()}.py"
+    path = os.path.abspath(os.path.join(work_dir, filename))
+    if not path.startswith(work_dir + os.sep):
+        raise ValueError(f"Filename '{filename}' is outside of the work dir.")
+    return path
+
+
+class WarmPoolCodeExecutor:
+    """
+    AutoGen CodeExecutor that runs Python code blocks in a WarmInterpreterPool.
+
+    Code blocks are saved in 'work_dir' exactly like LocalCommandLineCodeExecutor does
+    (honouring a '# filename: name.py' first line) and run there, so the Coder and
+    Test_Engineer see the same files. Shell and other languages are delegated to a
+    LocalCommandLineCodeExecutor. 'limits' (a ResourceLimits) caps each Python run and
+    the output of every block. Use it through code_execution_config={"executor": ...}.
+    """
+
+    def __init__(self, work_dir="coding", timeout=DEFAULT_TIMEOUT, pool=None, limits=None):
+        from autogen.coding import LocalCommandLineCodeExecutor, MarkdownCodeExtractor
+
+        os.makedirs(work_dir, exist_ok=True)
+        self.work_dir = os.path.abspath(work_dir)
+        self.timeout = timeout
+        self.limits = limits or ResourceLimits(wall_seconds=timeout)
+        self._pool = pool
+        get_pool(self.work_dir)  # starts the shared pool's workers while the team is being built
+        self._extractor = MarkdownCodeExtractor()
+        self._fallback = LocalCommandLineCodeExecutor(timeout=timeout, work_dir=self.work_dir)
+
+    @property
+    def code_extractor(self):
+        return self._extractor
+
+    @property
+    def pool(self):
+        # Looked up per run: the team closes its pool when it finishes, and a resumed
+        # conversation gets a fresh one.
+        return self._pool or get_pool(self.work_dir)
+
+    def execute_code_blocks(self, code_blocks):
+        from autogen.coding.base import CommandLineCodeResult
+
+        outputs, exit_code, code_file = [], 0, None
+        for block in code_blocks:
+            language = (block.language or "").lower()
+            if language not in PYTHON_LANGUAGES:
+                result = self._fallback.execute_code_blocks([block])
+                exit_code, code_file = result.exit_code, result.code_file
+                outputs.append(bound_output(result.output, self.limits.output_bytes,
+                                            f"{code_file or os.path.join(self.work_dir, 'shell')}.out", self.work_dir))
+            else:
+                code_file = self._save(block.code)
+                exit_code, output = self.pool.run(code_file, self.work_dir, limits=self.limits)
+                outputs.append(output)
+            if exit_code != 0:
+                break
+        return CommandLineCodeResult(exit_code=exit_code, output="".join(outputs), code_file=code_file)
+
+    def restart(self):
+        """Nothing to restart: every run already starts from a clean worker state."""
+
+    def _save(self, code):
+        path = code_file_path(self.work_dir, code)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(code)
+        return path
+
+
+class BoundedOutputExecutor:
+    """AutoGen CodeExecutor that keeps the head and tail of long outputs (see bound_output)."""
+
+    def __init__(self, executor, work_dir, output_bytes):
+        self.executor = executor
+        self.work_dir = os.path.abspath(work_dir)
+        self.output_bytes = output_bytes
+
+    @property
+    def code_extractor(self):
+        return self.executor.code_extractor
+
+    def execute_code_blocks(self, code_blocks):
+        result = self.executor.execute_code_blocks(code_blocks)
+        spill = f"{result.code_file or os.path.join(self.work_dir, 'output')}.out"
+        result.output = bound_output(result.output, self.output_bytes, spill, self.work_dir)
+        return result
+
+    def restart(self):
+        self.executor.restart()
+
+
+def build_code_execution_config(work_dir="coding", timeout=None, cache=None, speculation=None, artifacts=None):
+    """
+    code_execution_config for the executing agents. CODE_EXECUTOR=local keeps AutoGen's
+    one-process-per-block execution; the default runs blocks in warm interpreters.
+    'cache' is an optional execution_cache.ExecutionCache shared by the team's executors,
+    'speculation' an optional speculative_execution.SpeculativeExecution whose finished
+    runs are used instead of running the same code again, and 'artifacts' an optional
+    artifact_store.ArtifactStore whose references in messages are expanded before execution.
+    Unittest files (test_*.py) run incrementally unless INCREMENTAL_TESTS=0.
+    Runs, test shards included, are capped by ResourceLimits.from_env(); outside test
+    shards, CPU and memory caps need the warm pool.
+    """
+    limits = ResourceLimits.from_env(timeout)
+    timeout = limits.wall_seconds
+    if os.getenv("CODE_EXECUTOR", "pool").lower() == "local":
+        from autogen.coding import LocalCommandLineCodeExecutor
+
+        os.makedirs(work_dir, exist_ok=True)
+        executor = BoundedOutputExecutor(LocalCommandLineCodeExecutor(timeout=timeout, work_dir=work_dir),
+                                         work_dir, limits.output_bytes)
+    else:
+        executor = WarmPoolCodeExecutor(work_dir=work_dir, timeout=timeout, limits=limits)
+    if os.getenv("INCREMENTAL_TESTS", "1").lower() not in ("0", "false", "no"):
+        from incremental_tests import IncrementalTestExecutor, get_runner
+
+        runner = get_runner(work_dir, timeout=timeout, warm_pool=isinstance(executor, WarmPoolCodeExecutor),
+                            limits=limits)
+        executor = IncrementalTestExecutor(executor, work_dir, runner=runner)
+    if artifacts is not None:
+        from artifact_store import MaterializingCodeExecutor
+
+        executor = MaterializingCodeExecutor(executor, artifacts)
+    if speculation is not None:
+        executor = speculation.wrap(executor)
+    if cache is not None:
+        from execution_cache import MemoizingCodeExecutor
+
+        executor = MemoizingCodeExecutor(
+            executor, cache, target_file=lambda block: code_file_path(work_dir, block.code, block.language))
+    return {"executor": executor}
+
+
+if __name__ == "__main__" and "--worker" in sys.argv:
+    _worker_main()
@@ -0,0 +1,2 @@
+# test_autogen_execution.py is a live smoke script (it needs OPENAI_API_KEY and a model), not a unit test.
+collect_ignore = ["test_autogen_execution.py"]
@@ -0,0 +1,173 @@
+import difflib
+import os
+import re
+
+from speaker_selection import CODE_BLOCK_RE, execution_exit_code, has_code_block, is_approval, message_text
+
+MILESTONES = ("code_approved", "tests_approved", "tests_passed", "main_run")
+# unittest's summary, a pytest-style count or incremental_tests' summary (which runs
+# nothing when no test is affected).
+TEST_RUN_RE = re.compile(r"\bRan \d+ tests?\b|\b\d+ passed\b|\bIncremental test run of\b")
+DEFAULT_LOOP_REPEATS = 2
+DEFAULT_LOOP_SIMILARITY = 0.9
+DEFAULT_LOOP_WINDOW = 8
+# Only the start of long messages is compared; enough to tell a repeat from new content.
+COMPARE_CHARS = 2000
+
+
+def _normalize(text):
+    return " ".join(text.lower().split())[:COMPARE_CHARS]
+
+
+def code_of(content):
+    """The code blocks of a message, whitespace-normalized, so a re-posted block compares equal."""
+    return "\n".join(" ".join(body.split()) for _, body in CODE_BLOCK_RE.findall(content or ""))
+
+
+def near_duplicate(a, b, threshold=DEFAULT_LOOP_SIMILARITY):
+    if a == b:
+        return True
+    matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+    return (matcher.real_quick_ratio() >= threshold and matcher.quick_ratio() >= threshold
+            and matcher.ratio() >= threshold)
+
+
+class CompletionDetector:
+    """
+    Ends a group chat as soon as the pipeline is done; pass it to
+    GroupChatManager(is_termination_msg=...), which calls it with every message posted
+    to the chat.
+
+    It tracks the milestones of the Coder/Reviewer/Test_Engineer/Admin pipeline (see
+    MILESTONES): the latest application code approved by the Reviewer, the latest tests
+    approved, a test run that exited with code 0 and a successful run of the main
+    script. New application code resets all of them, new test code the test ones.
+    Once every milestone in 'required' is reached the chat stops, instead of running
+    on while the agents re-confirm. It also stops a loop: an agent posting its
+    'loop_repeats'-th near-identical message (difflib ratio >= 'loop_similarity' over the
+    last 'loop_window' messages) with no new code in between. A message ending with
+    'keyword' still ends the chat, as before.
+
+    'checks' are extra callables(messages) that return a reason string to stop early.
+    """
+
+    def __init__(self, required=MILESTONES, keyword="TERMINATE", loop_repeats=DEFAULT_LOOP_REPEATS,
+                 loop_similarity=DEFAULT_LOOP_SIMILARITY, loop_window=DEFAULT_LOOP_WINDOW, checks=(),
+                 admin="Admin", coder="Coder", reviewer="Reviewer", test_engineer="Test_Engineer"):
+        self.required = tuple(required)
+        self.keyword = keyword
+        self.loop_repeats = loop_repeats
+        self.loop_similarity = loop_similarity
+        self.loop_window = loop_window
+        self.checks = list(checks)
+        self.admin, self.coder, self.reviewer, self.test_engineer = admin, coder, reviewer, test_engineer
+        self.messages = []
+        self.milestones = dict.fromkeys(MILESTONES)
+        self.reason = None
+        self.loops = 0
+        self._streaks = {}
+        self._last_code_author = None
+        self._last_code = {}
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        """
+        EARLY_TERMINATION_MILESTONES picks the required milestones (comma separated) and
+        LOOP_REPEATS / LOOP_SIMILARITY tune loop detection. Returns None when
+        EARLY_TERMINATION=0.
+        """
+        if os.getenv("EARLY_TERMINATION", "1").lower() in ("0", "false", "no"):
+            return None
+        required = os.getenv("EARLY_TERMINATION_MILESTONES")
+        if required:
+            kwargs.setdefault("required", [m.strip() for m in required.split(",") if m.strip() in MILESTONES])
+        kwargs.setdefault("loop_repeats", int(os.getenv("LOOP_REPEATS", DEFAULT_LOOP_REPEATS)))
+        kwargs.setdefault("loop_similarity", float(os.getenv("LOOP_SIMILARITY", DEFAULT_LOOP_SIMILARITY)))
+        return cls(**kwargs)
+
+    def __call__(self, message):
+        if self.reason is not None:
+            return True
+        self.messages.append(message)
+        content = message_text(message)
+        if self.keyword and content.rstrip().endswith(self.keyword):
+            self.reason = "keyword"
+        elif self._update_milestones(message, content) and all(self.milestones[m] is not None for m in self.required):
+            self.reason = "complete"
+        elif self._is_loop(message.get("name"), content):
+            self.loops += 1
+            self.reason = "loop"
+        else:
+            for check in self.checks:
+                reason = check(self.messages)
+                if reason:
+                    self.reason = reason
+                    break
+        return self.reason is not None
+
+    # --- Milestones ---
+    def _reach(self, milestone):
+        if self.milestones[milestone] is None:
+            self.milestones[milestone] = len(self.messages)
+
+    def _update_milestones(self, message, content):
+        """Apply one message; True when it reached a milestone."""
+        before = dict(self.milestones)
+        name = message.get("name")
+        exit_code = execution_exit_code(content)
+        if exit_code is not None:
+            if exit_code == 0:
+                if TEST_RUN_RE.search(content):
+                    self._reach("tests_passed")
+                if self._last_code_author == self.coder:
+                    self._reach("main_run")
+        elif name in (self.coder, self.test_engineer) and has_code_block(content):
+            code = code_of(content)
+            # Re-posting the same code (e.g. to ask for a run) is not a revision.
+            if code != self._last_code.get(name):
+                reset = MILESTONES if name == self.coder else ("tests_approved", "tests_passed")
+                self.milestones.update(dict.fromkeys(reset))
+                self._last_code[name] = code
+            self._last_code_author = name
+        elif name == self.reviewer and is_approval(content):
+            if self._last_code_author == self.coder:
+                self._reach("code_approved")
+            elif self._last_code_author == self.test_engineer:
+                self._reach("tests_approved")
+        return any(before[m] is None and self.milestones[m] is not None for m in MILESTONES)
+
+    # --- Loop Detection ---
+    def _is_loop(self, name, content):
+        if execution_exit_code(content) is not None or not content.strip():
+            return False
+        if has_code_block(content) and name in (self.coder, self.test_engineer):
+            # New code is progress and ends every streak; re-posted code is still a repeat.
+            previous = [message_text(m) for m in self.messages[:-1]
+                        if m.get("name") == name and has_code_block(message_text(m))]
+            if not previous or code_of(previous[-1]) != code_of(content):
+                self._streaks.clear()
+                return False
+        text = _normalize(content)
+        recent = self.messages[-self.loop_window - 1:-1]
+        if any(m.get("name") == name and near_duplicate(_normalize(message_text(m)), text, self.loop_similarity)
+               for m in recent):
+            self._streaks[name] = self._streaks.get(name, 0) + 1
+        else:
+            self._streaks[name] = 0
+        return self._streaks[name] >= self.loop_repeats
+
+    # --- Reporting ---
+    @property
+    def rounds(self):
+        return len(self.messages)
+
+    def rounds_saved(self, max_round):
+        """Rounds left unused because the detector (not the keyword or max_round) ended the chat."""
+        return max(0, max_round - self.rounds) if self.reason not in (None, "keyword") else 0
+
+    def stats(self, max_round=None):
+        stats = {"reason": self.reason, "rounds": self.rounds, "milestones": dict(self.milestones),
+                 "required": list(self.required), "loops": self.loops}
+        if max_round is not None:
+            stats["rounds_saved"] = self.rounds_saved(max_round)
+        return stats
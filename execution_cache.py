@@ -0,0 +1,218 @@
+import hashlib
+import os
+import threading
+import time
+
+from speaker_selection import CODE_BLOCK_RE, has_code_block, message_text
+
+SKIPPED_DIRS = ("__pycache__", ".pytest_cache")
+SKIPPED_SUFFIXES = (".pyc", ".out")
+
+
+class WorkDirFingerprint:
+    """
+    Content fingerprint of the files under some directories. File hashes are reused while
+    a file's size and mtime are unchanged, so re-saving identical code costs one stat.
+    """
+
+    def __init__(self, dirs):
+        self.dirs = [os.path.abspath(d) for d in dirs]
+        self._hashes = {}
+
+    def compute(self, exclude=()):
+        exclude = {os.path.abspath(p) for p in exclude}
+        digest = hashlib.sha256()
+        for root_dir in self.dirs:
+            for root, dirs, files in os.walk(root_dir):
+                dirs[:] = sorted(d for d in dirs if d not in SKIPPED_DIRS and not d.startswith("."))
+                for name in sorted(files):
+                    path = os.path.join(root, name)
+                    if name.endswith(SKIPPED_SUFFIXES) or path in exclude:
+                        continue
+                    file_hash = self._file_hash(path)
+                    if file_hash:
+                        digest.update(f"{os.path.relpath(path, root_dir)}\0{file_hash}\n".encode("utf-8"))
+        return digest.hexdigest()
+
+    def _file_hash(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        cached = self._hashes.get(path)
+        if cached and cached[0] == (stat.st_size, stat.st_mtime_ns):
+            return cached[1]
+        try:
+            with open(path, "rb") as f:
+                file_hash = hashlib.sha256(f.read()).hexdigest()
+        except OSError:
+            return None
+        self._hashes[path] = ((stat.st_size, stat.st_mtime_ns), file_hash)
+        return file_hash
+
+
+class ExecutionCache:
+    """
+    Per-conversation memo of code execution results.
+
+    Entries are keyed on the hash of the code blocks plus a fingerprint of the files in
+    'watch_dirs' (the executor's work dir, and e.g. a separate test dir) excluding the
+    files the blocks themselves are saved to. A hit returns the stored exit code and
+    output without running anything. invalidate() drops every entry; it is called when
+    a code author posts a new version (see invalidate_on_new_code).
+    """
+
+    def __init__(self, watch_dirs, max_entries=256):
+        self.fingerprint = WorkDirFingerprint(watch_dirs)
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.time_saved = 0.0
+        self._versions = set()
+
+    def key(self, code_blocks, target_files=()):
+        code = "\0".join(f"{b.language}\n{b.code}" for b in code_blocks)
+        state = self.fingerprint.compute(exclude=target_files)
+        return hashlib.sha256(f"{code}\0{state}".encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.time_saved += entry[1]
+            return entry[0]
+
+    def set(self, key, result, duration):
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (result, duration)
+
+    def note_code(self, code):
+        """Record a code block posted by a code author; True if this version is new."""
+        version = hashlib.sha256(code.strip().encode("utf-8")).hexdigest()
+        with self._lock:
+            new = version not in self._versions
+            self._versions.add(version)
+        return new
+
+    def invalidate(self):
+        with self._lock:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "time_saved": round(self.time_saved, 3),
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+            }
+
+
+class MemoizingCodeExecutor:
+    """AutoGen CodeExecutor that answers repeated executions from an ExecutionCache."""
+
+    def __init__(self, executor, cache, target_file=None):
+        self.executor = executor
+        self.cache = cache
+        # Maps a code block to the file the inner executor saves it to (see code_execution).
+        self.target_file = target_file
+
+    @property
+    def code_extractor(self):
+        return self.executor.code_extractor
+
+    def execute_code_blocks(self, code_blocks):
+        targets = [self.target_file(b) for b in code_blocks] if self.target_file else []
+        key = self.cache.key(code_blocks, [t for t in targets if t])
+        result = self.cache.get(key)
+        if result is not None:
+            # The skipped run would have saved the blocks; later code may import them.
+            for block, path in zip(code_blocks, targets):
+                if path:
+                    _write_if_changed(path, block.code)
+            return result
+        start = time.perf_counter()
+        result = self.executor.execute_code_blocks(code_blocks)
+        self.cache.set(key, result, time.perf_counter() - start)
+        return result
+
+    def restart(self):
+        self.cache.invalidate()
+        self.executor.restart()
+
+
+def _write_if_changed(path, code):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            if f.read() == code:
+                return
+    except OSError:
+        pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(code)
+
+
+def _message_digest(message):
+    return hashlib.sha256(f"{message.get('name')}\0{message_text(message)}".encode("utf-8")).hexdigest()
+
+
+def new_code_check(cache, authors=("Coder",)):
+    """
+    A reply function that invalidates 'cache' when one of 'authors' has posted a code
+    version not seen before since it last ran. It remembers the last message it saw by
+    content, not by position, since history compaction rewrites the message list.
+    """
+    last_seen = {"digest": None}
+
+    def check_for_new_code(recipient, messages, sender, config):
+        messages = messages or []
+        start = 0
+        for index in range(len(messages) - 1, -1, -1):
+            if _message_digest(messages[index]) == last_seen["digest"]:
+                start = index + 1
+                break
+        if messages:
+            last_seen["digest"] = _message_digest(messages[-1])
+        changed = False
+        for message in messages[start:]:
+            content = message_text(message)
+            if message.get("name") in authors and has_code_block(content):
+                for _, code in CODE_BLOCK_RE.findall(content):
+                    changed = cache.note_code(code) or changed
+        if changed:
+            cache.invalidate()
+        return False, None
+
+    return check_for_new_code
+
+
+def invalidate_on_new_code(agents, cache, authors=("Coder",)):
+    """
+    Register new_code_check() on each executing agent. Re-posting an unchanged block
+    keeps the memoized results.
+    """
+    import autogen
+
+    for agent in agents:
+        agent.register_reply([autogen.Agent, None], reply_func=new_code_check(cache, authors))
+
+
+def execution_cache_from_env(work_dir, extra_dirs=()):
+    """An ExecutionCache watching 'work_dir' (and 'extra_dirs'), or None if EXEC_CACHE=0."""
+    if os.getenv("EXEC_CACHE", "1").lower() in ("0", "false", "no"):
+        return None
+    return ExecutionCache([work_dir, *extra_dirs])
@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from early_termination import code_of
+from llm_hooks import add_llm_middleware
+from speaker_selection import has_code_block, is_approval, message_text
+
+DEFAULT_WORKERS = 4
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=int(os.getenv("FAN_OUT_WORKERS", DEFAULT_WORKERS)),
+                                       thread_name_prefix="review-fan-out")
+        return _pool
+
+
+class ReviewFanOut:
+    """
+    Fan-out/join of the Reviewer and the Test_Engineer on each Coder revision.
+
+    Given the Coder's code, the review and the unit tests are independent, but the group
+    chat asks for them one after the other. When the Reviewer starts on new Coder code
+    that has no approved tests yet, the Test_Engineer's LLM request is sent at the same
+    time on a worker thread, from the Test_Engineer's own view of the chat. When the
+    Reviewer approves and the Test_Engineer is selected next, its LLM call returns the
+    already finished response (waiting for it if needed) instead of starting a new one,
+    so the tests land in the transcript one LLM latency earlier. If the Reviewer asks
+    for changes, the speculative tests are dropped.
+    """
+
+    def __init__(self, groupchat, manager, coder, reviewer, test_engineer):
+        self.groupchat = groupchat
+        self.manager = manager
+        self.coder = coder
+        self.reviewer = reviewer
+        self.test_engineer = test_engineer
+        self._pending = None  # (code of the revision, future, start time)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.launched = 0
+        self.joined = 0
+        self.discarded = 0
+        self.failed = 0
+        self.time_saved = 0.0
+
+    def attach(self):
+        import autogen
+
+        self.reviewer.register_reply([autogen.Agent, None], reply_func=self._fan_out)
+        add_llm_middleware(self.test_engineer, self._join)
+        return self
+
+    # --- Fan-out ---
+    def _latest_coder_code(self):
+        for message in reversed(self.groupchat.messages):
+            if message.get("name") == self.coder.name and has_code_block(message_text(message)):
+                return code_of(message_text(message))
+        return None
+
+    def _tests_approved(self):
+        """The Reviewer approved the Test_Engineer's latest code and no new Coder code came since."""
+        approved = False
+        for message in reversed(self.groupchat.messages):
+            name, content = message.get("name"), message_text(message)
+            if name == self.coder.name and has_code_block(content):
+                return False
+            if name == self.test_engineer.name and has_code_block(content):
+                return approved
+            if name == self.reviewer.name and is_approval(content):
+                approved = True
+        return False
+
+    def _fan_out(self, recipient, messages, sender, config):
+        last = self.groupchat.messages[-1] if self.groupchat.messages else {}
+        if last.get("name") != self.coder.name or not has_code_block(message_text(last)) or self._tests_approved():
+            return False, None
+        code = code_of(message_text(last))
+        with self._lock:
+            if self._pending is not None and self._pending[0] == code:
+                return False, None
+            self._discard()
+            history = list(self.test_engineer.chat_messages.get(self.manager, []))
+            self._pending = (code, _executor().submit(self._speculate, history), time.perf_counter())
+            self.launched += 1
+        return False, None
+
+    def _speculate(self, messages):
+        agent = self.test_engineer
+        process = getattr(agent, "process_all_messages_before_reply", None) or \
+            getattr(agent, "_process_all_messages_before_reply", None)
+        if process is not None:
+            messages = process(messages)
+        self._local.speculating, self._local.response = True, None
+        try:
+            agent.generate_oai_reply(messages=messages, sender=self.manager)
+            return self._local.response, time.perf_counter()
+        finally:
+            self._local.speculating = False
+
+    def _discard(self):
+        if self._pending is not None:
+            self._pending[1].cancel()
+            self.discarded += 1
+            self._pending = None
+
+    # --- Join ---
+    def _join(self, agent, params, call_next):
+        if getattr(self._local, "speculating", False):
+            # The speculative request itself; it is joined as a whole message, not streamed.
+            self._local.response = call_next({**params, "stream": False})
+            return self._local.response
+        with self._lock:
+            pending, self._pending = self._pending, None
+        if pending is None:
+            return call_next(params)
+        code, future, started = pending
+        last = self.groupchat.messages[-1] if self.groupchat.messages else {}
+        if code != self._latest_coder_code() or last.get("name") != self.reviewer.name \
+                or not is_approval(message_text(last)):
+            future.cancel()
+            with self._lock:
+                self.discarded += 1
+            return call_next(params)
+        wait_start = time.perf_counter()
+        try:
+            response, finished = future.result()
+        except Exception:
+            response = None
+        if response is None:
+            with self._lock:
+                self.failed += 1
+            return call_next(params)
+        with self._lock:
+            self.joined += 1
+            # What a sequential request started now would have taken, minus the wait.
+            self.time_saved += max(0.0, (finished - started) - (time.perf_counter() - wait_start))
+        return response
+
+    def stats(self):
+        with self._lock:
+            return {"launched": self.launched, "joined": self.joined, "discarded": self.discarded,
+                    "failed": self.failed, "time_saved": round(self.time_saved, 4)}
+
+
+def attach_review_fan_out(groupchat, manager, coder, reviewer, test_engineer):
+    """Fan the Coder's revisions out to the Reviewer and Test_Engineer; None when REVIEW_FAN_OUT=0."""
+    if os.getenv("REVIEW_FAN_OUT", "1").lower() in ("0", "false", "no"):
+        return None
+    return ReviewFanOut(groupchat, manager, coder, reviewer, test_engineer).attach()
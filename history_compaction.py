@@ -0,0 +1,231 @@
+import hashlib
+import os
+import re
+import threading
+
+from speaker_selection import CODE_BLOCK_RE, execution_exit_code, message_text
+
+DEFAULT_CONTEXT_BUDGET = 6000
+FILENAME_RE = re.compile(r"#\s*filename:\s*(\S+)")
+VERSION_SUFFIX_RE = re.compile(r"_v\d+(?=\.\w+$)")
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def count_tokens(text):
+    """Token count with tiktoken's cl100k encoding when available, else ~4 characters per token."""
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding("cl100k_base")
+                except Exception:
+                    _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def message_tokens(messages):
+    return sum(count_tokens(message_text(m)) for m in messages)
+
+
+def _code_identity(block):
+    """Identify a code block by its '# filename:' with the _vN suffix removed, so v1 and v2 match."""
+    match = FILENAME_RE.search(block)
+    return VERSION_SUFFIX_RE.sub("", match.group(1)) if match else None
+
+
+def _code_reference(lang, code):
+    match = FILENAME_RE.search(code)
+    name = match.group(1) if match else f"{lang or 'code'} block"
+    digest = hashlib.sha256(code.encode("utf-8")).hexdigest()[:10]
+    return f"[superseded {name}: {code.count(chr(10)) + 1} lines, sha256 {digest}; a newer version follows]"
+
+
+def _condense(text, limit):
+    if len(text) <= limit:
+        return text
+    return text[:limit].rstrip() + f" ... [condensed, {len(text) - limit} more characters]"
+
+
+class HistoryCompactor:
+    """
+    Message transform that keeps an agent's prompt from growing with every round.
+
+    * The task (first message) and the latest ``keep_recent`` messages stay verbatim.
+    * Code blocks superseded by a later version from the same author (same file, or any
+      later code when no '# filename:' is given) become one-line references.
+    * Reviews older than the latest one and execution outputs older than the latest one
+      are condensed to ``summary_chars`` characters.
+    * If the history is still above ``max_tokens``, the remaining middle messages are
+      condensed, then dropped (superseded and condensed ones first, oldest first) and
+      replaced by a single note. The latest version of each code file and the latest
+      review are never condensed or dropped.
+
+    It follows AutoGen's MessageTransform protocol (``apply_transform``/``get_logs``), so
+    it is attached with ``TransformMessages`` and runs right before each LLM call without
+    changing the stored chat history. Every call is recorded in ``rounds`` for reporting.
+    """
+
+    def __init__(self, agent_name, max_tokens=DEFAULT_CONTEXT_BUDGET, keep_recent=4, summary_chars=400,
+                 code_authors=("Coder", "Test_Engineer"), reviewer="Reviewer"):
+        self.agent_name = agent_name
+        self.max_tokens = max_tokens
+        self.keep_recent = keep_recent
+        self.summary_chars = summary_chars
+        self.code_authors = code_authors
+        self.reviewer = reviewer
+        self.rounds = []
+
+    # --- MessageTransform protocol ---
+    def apply_transform(self, messages):
+        before = message_tokens(messages)
+        compacted = self._compact(messages)
+        after = message_tokens(compacted)
+        self.rounds.append({"agent": self.agent_name, "round": len(messages), "tokens_before": before,
+                            "tokens_after": after, "tokens_saved": before - after})
+        return compacted
+
+    def get_logs(self, pre_transform_messages, post_transform_messages):
+        before = message_tokens(pre_transform_messages)
+        after = message_tokens(post_transform_messages)
+        if after < before:
+            return f"{self.agent_name}: history compacted from {before} to {after} tokens.", True
+        return "", False
+
+    def add_to_agent(self, agent):
+        from autogen.agentchat.contrib.capabilities.transform_messages import TransformMessages
+
+        TransformMessages(transforms=[self], verbose=False).add_to_agent(agent)
+        return self
+
+    # --- Compaction ---
+    def _compact(self, messages):
+        messages = [dict(m) for m in messages]
+        if len(messages) <= self.keep_recent + 1:
+            return messages
+        protected_from = len(messages) - self.keep_recent
+
+        latest_code = {}
+        latest_review = latest_execution = None
+        for i, message in enumerate(messages):
+            name = message.get("name")
+            content = message_text(message)
+            if name in self.code_authors:
+                for lang, code in CODE_BLOCK_RE.findall(content):
+                    latest_code[(name, _code_identity(code))] = i
+            elif name == self.reviewer:
+                latest_review = i
+            if execution_exit_code(content) is not None:
+                latest_execution = i
+
+        compacted = set()
+        for i in range(1, protected_from):
+            message = messages[i]
+            name = message.get("name")
+            content = message_text(message)
+            if name in self.code_authors and "```" in content:
+                content = self._replace_superseded(content, name, i, latest_code)
+            elif name == self.reviewer and latest_review is not None and i < latest_review:
+                content = _condense(content, self.summary_chars)
+            elif execution_exit_code(content) is not None and latest_execution is not None and i < latest_execution:
+                content = _condense(content, self.summary_chars)
+            if isinstance(message.get("content"), str):
+                if content != message["content"]:
+                    compacted.add(i)
+                message["content"] = content
+
+        # The latest version of every file and the latest review stay verbatim whatever the budget.
+        keep = set(latest_code.values()) | ({latest_review} if latest_review is not None else set())
+        return self._enforce_budget(messages, protected_from, keep, compacted)
+
+    def _replace_superseded(self, content, name, index, latest_code):
+        def replace(match):
+            lang, code = match.group(1), match.group(2)
+            identity = _code_identity(code)
+            newest = latest_code.get((name, identity), index)
+            if identity is None:
+                # Without a filename any later code block from the same author supersedes this one.
+                newest = max((i for (author, _), i in latest_code.items() if author == name), default=index)
+            return _code_reference(lang, code) if newest > index else match.group(0)
+
+        return CODE_BLOCK_RE.sub(replace, content)
+
+    def _enforce_budget(self, messages, protected_from, keep=(), compacted=()):
+        total = message_tokens(messages)
+        if not self.max_tokens or total <= self.max_tokens:
+            return messages
+        candidates = [i for i in range(1, protected_from) if i not in keep]
+        # Outputs and other messages are condensed before any whole message is dropped.
+        for i in candidates:
+            content = messages[i].get("content")
+            if isinstance(content, str) and i not in compacted and len(content) > self.summary_chars:
+                messages[i]["content"] = _condense(content, self.summary_chars)
+                total += count_tokens(messages[i]["content"]) - count_tokens(content)
+                compacted = set(compacted) | {i}
+        dropped = set()
+        # Superseded and condensed messages go first, oldest first.
+        for i in sorted(candidates, key=lambda i: (i not in compacted, i)):
+            if total <= self.max_tokens:
+                break
+            total -= count_tokens(message_text(messages[i]))
+            dropped.add(i)
+        kept = [m for i, m in enumerate(messages) if i not in dropped]
+        if dropped:
+            note = {"role": "user", "name": "chat_manager",
+                    "content": f"[{len(dropped)} earlier messages omitted to stay within the context budget]"}
+            kept.insert(1, note)
+        return kept
+
+    def tokens_saved(self):
+        return sum(r["tokens_saved"] for r in self.rounds)
+
+
+class HistoryCompaction:
+    """One HistoryCompactor per agent, each with its own context budget, plus reporting."""
+
+    def __init__(self, compactors):
+        self.compactors = compactors
+
+    def report(self):
+        rounds = sorted((r for c in self.compactors.values() for r in c.rounds), key=lambda r: r["round"])
+        return {
+            "calls": len(rounds),
+            "tokens_before": sum(r["tokens_before"] for r in rounds),
+            "tokens_after": sum(r["tokens_after"] for r in rounds),
+            "tokens_saved": sum(r["tokens_saved"] for r in rounds),
+            "per_agent": {name: c.tokens_saved() for name, c in self.compactors.items()},
+            "per_round": rounds,
+        }
+
+    def savings_by_round(self):
+        """Tokens saved per group chat round (summed over the agents that replied in it)."""
+        savings = {}
+        for compactor in self.compactors.values():
+            for r in compactor.rounds:
+                savings[r["round"]] = savings.get(r["round"], 0) + r["tokens_saved"]
+        return dict(sorted(savings.items()))
+
+
+def attach_history_compaction(agents, budgets=None, default_budget=None, **options):
+    """
+    Attach a HistoryCompactor to every LLM agent in 'agents'. 'budgets' maps agent names
+    to token budgets; others use 'default_budget' (CONTEXT_BUDGET_TOKENS, default 6000).
+    Set CONTEXT_COMPACTION=0 to turn compaction off.
+    """
+    if os.getenv("CONTEXT_COMPACTION", "1").lower() in ("0", "false", "no"):
+        return HistoryCompaction({})
+    if default_budget is None:
+        default_budget = int(os.getenv("CONTEXT_BUDGET_TOKENS", DEFAULT_CONTEXT_BUDGET))
+    budgets = budgets or {}
+    compactors = {}
+    for agent in agents:
+        if not getattr(agent, "llm_config", None):
+            continue
+        compactor = HistoryCompactor(agent.name, max_tokens=budgets.get(agent.name, default_budget), **options)
+        compactors[agent.name] = compactor.add_to_agent(agent)
+    return HistoryCompaction(compactors)
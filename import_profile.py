@@ -0,0 +1,100 @@
+import argparse
+import ast
+import subprocess
+import sys
+
+DEFAULT_APP = "agentic_ai_ux.py"
+
+
+def top_level_imports(path):
+    """Modules a script imports at module level, i.e. on every Streamlit rerun's first load."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+
+def deferred_imports(path):
+    """Modules a script imports inside functions, so they load only when the function runs."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+    eager = set(top_level_imports(path))
+    modules = []
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            for inner in ast.walk(node):
+                if isinstance(inner, ast.Import):
+                    modules.extend(alias.name for alias in inner.names)
+                elif isinstance(inner, ast.ImportFrom) and inner.module and not inner.level:
+                    modules.append(inner.module)
+    return [m for m in dict.fromkeys(modules) if m not in eager]
+
+
+def _importtime(code):
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True)
+    entries, output = [], []
+    for line in proc.stderr.splitlines():
+        parts = line[len("import time:"):].split("|") if line.startswith("import time:") else []
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            output.append(line)
+            continue
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((name.strip(), int(parts[0]) / 1000, int(parts[1]) / 1000, depth))
+    return entries, output
+
+
+def profile_imports(modules):
+    """
+    Import 'modules' in a fresh interpreter under '-X importtime'. Returns (total_ms,
+    entries, missing) where entries are (module, self_ms, cumulative_ms, depth) in import
+    order, without what the interpreter imports on its own at startup, and 'missing'
+    lists the modules that failed to import. Modules already imported by an earlier
+    entry cost nothing later.
+    """
+    baseline = {name for name, _, _, _ in _importtime("pass")[0]}
+    code = "".join(f"try:\n    import {m}\nexcept Exception as e:\n    print('{m}:', repr(e), file=sys.stderr)\n"
+                   for m in modules)
+    entries, output = _importtime("import sys\n" + code)
+    entries = [e for e in entries if e[0] not in baseline]
+    total = sum(cumulative for _, _, cumulative, depth in entries if depth == 0)
+    return total, entries, [line for line in output if line.split(":", 1)[0] in modules]
+
+
+def report(modules, top=10):
+    total, entries, missing = profile_imports(modules)
+    lines = [f"  total {total:8.1f} ms"]
+    lines.extend(f"  import failed: {line}" for line in missing)
+    for name, self_ms, cumulative, depth in entries:
+        if depth == 0 and name in modules:
+            lines.append(f"  {name:<40} {cumulative:8.1f} ms")
+    slowest = sorted(entries, key=lambda e: e[1], reverse=True)[:top]
+    if slowest:
+        lines.append("  slowest modules (self time):")
+        lines.extend(f"    {name:<38} {self_ms:8.1f} ms" for name, self_ms, _, _ in slowest)
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Report the import cost of a Streamlit script: what loads on startup and what is deferred.")
+    parser.add_argument("script", nargs="?", default=DEFAULT_APP)
+    parser.add_argument("--top", type=int, default=10, help="number of slowest modules to list")
+    args = parser.parse_args(argv)
+
+    eager, deferred = top_level_imports(args.script), deferred_imports(args.script)
+    print(f"Startup imports of {args.script}: {', '.join(eager)}")
+    print(report(eager, args.top))
+    if deferred:
+        print(f"Deferred until first use: {', '.join(deferred)}")
+        print(report(deferred, args.top))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,382 @@
+import ast
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+MIN_TESTS_PER_SHARD = 4
+MAX_FAILURE_CHARS = 1500
+TEST_FILE_RE = re.compile(r"(^|[\\/])test_\w*\.py$")
+VERSION_SUFFIX_RE = re.compile(r"_v\d+$")
+# What a warm worker runs for one shard (see code_execution.WarmInterpreterPool).
+SHARD_SCRIPT = "from incremental_tests import _run_shard_main\n_run_shard_main({test_ids!r})\n"
+# CPU and memory caps handed to a shard process, as JSON.
+SHARD_LIMITS_ENV = "INCREMENTAL_SHARD_LIMITS"
+SETUP_METHODS = ("setUp", "tearDown", "setUpClass", "tearDownClass", "asyncSetUp", "asyncTearDown")
+
+
+def _digest(*parts):
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def _base_name(module):
+    """'test_calculator_v3' -> 'test_calculator', so versions of one file share history."""
+    return VERSION_SUFFIX_RE.sub("", module)
+
+
+# --- Static Analysis ---
+class ModuleGraph:
+    """
+    The work dir's Python modules and the work-dir modules each of them imports.
+
+    A test depends on the whole source of every module its file imports from the work
+    dir, and on everything those modules import in turn: a helper or a method of
+    another class can be called from anywhere, so nothing smaller is safe to track.
+    """
+
+    def __init__(self, work_dir):
+        self.work_dir = work_dir
+        self._imports = {}
+
+    def resolve(self, name, base_dir=None):
+        """Path of module 'name' (a file or a package) in 'base_dir' or the work dir, else None."""
+        for root in ([base_dir] if base_dir else []) + [self.work_dir]:
+            stem = os.path.join(root, *name.split("."))
+            for path in (stem + ".py", os.path.join(stem, "__init__.py")):
+                if os.path.isfile(path):
+                    return os.path.abspath(path)
+        return None
+
+    def imports_in(self, tree, path):
+        """Work-dir modules imported anywhere in the parsed module 'tree' stored at 'path'."""
+        found = set()
+        here = os.path.dirname(path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                for alias in node.names:
+                    parts = alias.name.split(".")
+                    # 'import pkg.mod' imports pkg too.
+                    found.update(self.resolve(".".join(parts[:i])) for i in range(1, len(parts) + 1))
+            elif isinstance(node, ast.ImportFrom):
+                # Relative imports start from the importing file's package.
+                base = here if node.level else None
+                for _ in range(max(node.level - 1, 0)):
+                    base = os.path.dirname(base)
+                if node.module:
+                    found.add(self.resolve(node.module, base))
+                # 'from pkg import mod' may name a submodule.
+                found.update(self.resolve(f"{node.module}.{alias.name}" if node.module else alias.name, base)
+                             for alias in node.names)
+        found.discard(None)
+        found.discard(os.path.abspath(path))
+        return found
+
+    def _module_imports(self, path):
+        if path not in self._imports:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    tree = ast.parse(f.read())
+                self._imports[path] = self.imports_in(tree, path)
+            except (OSError, UnicodeDecodeError, SyntaxError, ValueError):
+                # The source hash still covers it; its imports are unknown.
+                self._imports[path] = set()
+        return self._imports[path]
+
+    def closure(self, paths):
+        """'paths' plus every work-dir module they import, directly or not."""
+        seen, pending = set(), list(paths)
+        while pending:
+            path = pending.pop()
+            if path not in seen:
+                seen.add(path)
+                pending.extend(self._module_imports(path))
+        return seen
+
+    def digest(self, paths):
+        parts = []
+        for path in sorted(self.closure(paths)):
+            try:
+                with open(path, "rb") as f:
+                    source = hashlib.sha256(f.read()).hexdigest()
+            except OSError:
+                source = "missing"
+            parts += [os.path.relpath(path, self.work_dir), source]
+        return _digest(*parts)
+
+
+class TestFileAnalysis:
+    """
+    The unittest test methods of one test file, each with a fingerprint covering its own
+    source, its class's setUp/tearDown, the module-level helpers it calls and the whole
+    source of every work-dir module the file imports (with what those import in turn).
+    """
+
+    def __init__(self, path, work_dir):
+        self.path = path
+        self.module = os.path.splitext(os.path.basename(path))[0]
+        with open(path, "r", encoding="utf-8") as f:
+            self.tree = ast.parse(f.read())
+        self.work_dir = work_dir
+        graph = ModuleGraph(work_dir)
+        self.imports = graph.imports_in(self.tree, os.path.abspath(path))
+        self.dependencies = graph.digest(self.imports)
+        self.tests = self._collect_tests()
+
+    def _collect_tests(self):
+        helpers = {n.name: n for n in self.tree.body if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))}
+        tests = {}
+        for node in self.tree.body:
+            if not isinstance(node, ast.ClassDef) or not any("TestCase" in ast.dump(b) for b in node.bases):
+                continue
+            fixtures = [n for n in node.body if isinstance(n, ast.FunctionDef) and n.name in SETUP_METHODS]
+            for item in node.body:
+                if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)) and item.name.startswith("test"):
+                    used = [item, *fixtures]
+                    # Module-level helper functions called by the test count as part of it.
+                    used += [helpers[n.id] for part in list(used) for n in ast.walk(part)
+                             if isinstance(n, ast.Name) and n.id in helpers]
+                    tests[f"{self.module}.{node.name}.{item.name}"] = _digest(
+                        node.name, self.dependencies, *[ast.dump(n) for n in used])
+        return tests
+
+
+# --- Incremental Runner ---
+class IncrementalTestRunner:
+    """
+    Re-runs only the tests affected by the latest revision and shards them across cores.
+
+    Outcomes are remembered per test under a version-independent id (test_calc_v2 and
+    test_calc_v3 share history), so a test whose own code and the application modules
+    its file imports are unchanged, and which passed last time, is not run again.
+
+    With 'warm_pool' the shards run in the work dir's code_execution warm interpreters,
+    like every other script of the conversation (so at most the pool's size at once);
+    otherwise each shard is a new Python process. Either way a shard is capped by
+    'limits' (a code_execution.ResourceLimits; by default just 'timeout').
+    """
+
+    def __init__(self, work_dir, max_shards=None, timeout=60, warm_pool=False, limits=None):
+        from code_execution import ResourceLimits
+
+        self.work_dir = os.path.abspath(work_dir)
+        self.max_shards = max_shards or os.cpu_count() or 1
+        self.timeout = timeout
+        self.warm_pool = warm_pool
+        # The report is parsed, never shown; it must not be cut to the output budget.
+        self.limits = ResourceLimits(wall_seconds=timeout, cpu_seconds=limits.cpu_seconds if limits else None,
+                                     memory_mb=limits.memory_mb if limits else None, output_bytes=None)
+        self._history = {}
+        self._lock = threading.Lock()
+        self.counters = {"runs": 0, "tests_run": 0, "tests_skipped": 0, "shards": 0}
+
+    def analyse(self, path):
+        try:
+            analysis = TestFileAnalysis(path, self.work_dir)
+        except (SyntaxError, OSError, UnicodeDecodeError):
+            return None
+        return analysis if analysis.tests else None
+
+    def run(self, analysis):
+        """Run the affected tests of a TestFileAnalysis; return (exit_code, summary)."""
+        selected, skipped = [], []
+        with self._lock:
+            for test_id, fingerprint in analysis.tests.items():
+                previous = self._history.get(self._history_key(test_id))
+                if previous and previous == (fingerprint, "passed"):
+                    skipped.append(test_id)
+                else:
+                    selected.append(test_id)
+
+        outcomes, details = self._run_shards(selected) if selected else ({}, [])
+        with self._lock:
+            for test_id in selected:
+                outcome = outcomes.get(test_id, "errored")
+                self._history[self._history_key(test_id)] = (analysis.tests[test_id], outcome)
+            self.counters["runs"] += 1
+            self.counters["tests_run"] += len(selected)
+            self.counters["tests_skipped"] += len(skipped)
+        return self._summary(analysis, selected, skipped, outcomes, details)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters)
+
+    def _history_key(self, test_id):
+        module, rest = test_id.split(".", 1)
+        return f"{_base_name(module)}.{rest}"
+
+    def _run_shards(self, test_ids):
+        max_shards = self.max_shards
+        if self.warm_pool:
+            from code_execution import get_pool
+
+            max_shards = min(max_shards, get_pool(self.work_dir).size)
+        shard_count = max(1, min(max_shards, -(-len(test_ids) // MIN_TESTS_PER_SHARD)))
+        shards = [test_ids[i::shard_count] for i in range(shard_count)]
+        with self._lock:
+            self.counters["shards"] += shard_count
+        outcomes, details = {}, []
+        with ThreadPoolExecutor(max_workers=shard_count) as pool:
+            for shard_outcomes, shard_details in pool.map(self._run_shard, shards):
+                outcomes.update(shard_outcomes)
+                details.extend(shard_details)
+        return outcomes, details
+
+    def _run_shard(self, test_ids):
+        if self.warm_pool:
+            output, failure = self._run_in_pool(test_ids)
+        else:
+            command = [sys.executable, os.path.abspath(__file__), "--shard", *test_ids]
+            env = {**os.environ, SHARD_LIMITS_ENV: json.dumps({"cpu": self.limits.cpu_seconds,
+                                                                "memory": self.limits.memory_mb})}
+            try:
+                completed = subprocess.run(command, cwd=self.work_dir, capture_output=True, text=True, env=env,
+                                           encoding="utf-8", errors="replace", timeout=self.timeout)
+            except subprocess.TimeoutExpired:
+                return {t: "errored" for t in test_ids}, [f"Timeout: shard with {len(test_ids)} tests exceeded {self.timeout} seconds."]
+            output = completed.stdout
+            failure = completed.stderr or f"Shard process exited with code {completed.returncode}."
+        report = _shard_report(output)
+        if report is None:
+            return {t: "errored" for t in test_ids}, [failure[-MAX_FAILURE_CHARS:]]
+        return report["outcomes"], report["details"]
+
+    def _run_in_pool(self, test_ids):
+        from code_execution import get_pool
+
+        # Named after the test module, so code_execution.AdaptiveLimits keeps one history per test file.
+        shard_dir = tempfile.mkdtemp(prefix="incremental-shard-")
+        path = os.path.join(shard_dir, f"shard_{test_ids[0].split('.', 1)[0]}.py")
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(SHARD_SCRIPT.format(test_ids=list(test_ids)))
+            _, output = get_pool(self.work_dir).run(path, self.work_dir, limits=self.limits)
+        finally:
+            shutil.rmtree(shard_dir, ignore_errors=True)
+        return output, output
+
+    def _summary(self, analysis, selected, skipped, outcomes, details):
+        counts = {}
+        for test_id in selected:
+            outcome = outcomes.get(test_id, "errored")
+            counts[outcome] = counts.get(outcome, 0) + 1
+        total = len(analysis.tests)
+        lines = [f"Incremental test run of {os.path.basename(analysis.path)}: "
+                 f"{len(selected)} of {total} tests affected by the latest changes."]
+        if skipped:
+            lines.append(f"{len(skipped)} unaffected tests passed before and were not re-run.")
+        if selected:
+            summary = ", ".join(f"{n} {outcome}" for outcome, n in sorted(counts.items()))
+            lines.append(f"Ran {len(selected)} tests: {summary}.")
+        for detail in details:
+            lines.append("")
+            lines.append(detail[:MAX_FAILURE_CHARS])
+        failed = sum(n for outcome, n in counts.items() if outcome not in ("passed", "skipped"))
+        lines.append("")
+        lines.append(f"FAILED ({failed} of {len(selected)} tests)" if failed else "OK")
+        return (1 if failed else 0), "\n".join(lines) + "\n"
+
+
+_runners = {}
+_runners_lock = threading.Lock()
+
+
+def get_runner(work_dir, timeout=60, warm_pool=False, limits=None):
+    """The shared IncrementalTestRunner of 'work_dir', so all of a team's executors share history."""
+    key = os.path.realpath(work_dir)
+    with _runners_lock:
+        if key not in _runners:
+            _runners[key] = IncrementalTestRunner(work_dir, timeout=timeout, warm_pool=warm_pool, limits=limits)
+        return _runners[key]
+
+
+# --- AutoGen Executor ---
+class IncrementalTestExecutor:
+    """
+    AutoGen CodeExecutor that runs unittest test files through an IncrementalTestRunner
+    and hands every other code block to the wrapped executor.
+    """
+
+    def __init__(self, executor, work_dir, runner=None):
+        self.executor = executor
+        self.work_dir = os.path.abspath(work_dir)
+        self.runner = runner or get_runner(work_dir)
+
+    @property
+    def code_extractor(self):
+        return self.executor.code_extractor
+
+    def execute_code_blocks(self, code_blocks):
+        from autogen.coding.base import CommandLineCodeResult
+
+        from code_execution import code_file_path
+
+        if len(code_blocks) == 1:
+            block = code_blocks[0]
+            path = code_file_path(self.work_dir, block.code, block.language)
+            if path and TEST_FILE_RE.search(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(block.code)
+                analysis = self.runner.analyse(path)
+                if analysis is not None:
+                    exit_code, output = self.runner.run(analysis)
+                    return CommandLineCodeResult(exit_code=exit_code, output=output, code_file=path)
+        return self.executor.execute_code_blocks(code_blocks)
+
+    def restart(self):
+        self.executor.restart()
+
+
+# --- Shard Process ---
+def _shard_report(output):
+    """The JSON line _run_shard_main() printed last, or None when the shard did not get that far."""
+    for line in reversed((output or "").splitlines()):
+        if line.startswith('{"outcomes"'):
+            try:
+                return json.loads(line)
+            except ValueError:
+                return None
+    return None
+
+
+def _run_shard_main(test_ids):
+    """Run unittest ids in this process; print the per-test outcomes as one JSON line."""
+    import io
+    import unittest
+
+    limits = json.loads(os.environ.pop(SHARD_LIMITS_ENV, "null"))
+    if limits:
+        from code_execution import _limit_resources
+
+        _limit_resources(limits.get("cpu"), limits.get("memory"))
+    sys.path.insert(0, os.getcwd())
+    suite = unittest.TestSuite()
+    outcomes, details = {}, []
+    for test_id in test_ids:
+        try:
+            suite.addTest(unittest.defaultTestLoader.loadTestsFromName(test_id))
+        except Exception as e:
+            outcomes[test_id] = "errored"
+            details.append(f"ERROR: {test_id}\n{type(e).__name__}: {e}")
+    stream = io.StringIO()
+    result = unittest.TextTestRunner(stream=stream, verbosity=0).run(suite)
+    for outcome, entries in (("failed", result.failures), ("errored", result.errors)):
+        for test, trace in entries:
+            outcomes[test.id()] = outcome
+            details.append(f"{'FAIL' if outcome == 'failed' else 'ERROR'}: {test.id()}\n{trace.strip()}")
+    for test, _ in result.skipped:
+        outcomes[test.id()] = "skipped"
+    for test_id in test_ids:
+        outcomes.setdefault(test_id, "passed")
+    print(json.dumps({"outcomes": outcomes, "details": details}))
+
+
+if __name__ == "__main__" and "--shard" in sys.argv:
+    _run_shard_main(sys.argv[sys.argv.index("--shard") + 1:])
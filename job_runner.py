@@ -0,0 +1,271 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from checkpoint import CheckpointWriter, checkpoint_path, checkpoints_enabled
+from message_store import MessageStore
+from speaker_selection import message_text
+
+# --- Job States ---
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+DEFAULT_WORKERS = 2
+
+
+def job_team_factory(config_list, cache=None, entry="agentic_ai_ux", work_root="coding"):
+    """
+    team_factory for a JobRunner: a fresh team per job, working in '<work_root>/<job id>'
+    and checkpointed per round as 'job-<job id>'. It runs on the job's worker thread,
+    where the first call pays the AutoGen import.
+    """
+
+    def team_factory(job):
+        from agent_team import build_team
+        from tracing import Tracer
+
+        tracer = Tracer(f"job-{job.id}") if job.trace else None
+        work_dir = os.path.join(work_root, job.id)
+        team = build_team(config_list, work_dir=work_dir, view=job,
+                          cache=cache, max_round=job.max_round, tracer=tracer)
+        # Checkpointed per round, so a job lost with the server can be resumed.
+        if job.resume_from is not None or checkpoints_enabled():
+            CheckpointWriter(checkpoint_path(f"job-{job.id}"), work_dir=work_dir, meta={"entry": entry},
+                             state=job.resume_from).attach(team)
+        return team
+
+    return team_factory
+
+
+class JobCancelled(Exception):
+    """Raised inside a cancelled job's conversation at its next message or token, which ends the chat."""
+
+
+class Job:
+    """
+    A single conversation submitted to the JobRunner.
+
+    The job is also the view of its team's ConversationStream: finished messages (in a
+    compact message_store.MessageStore) and the tokens of the message being generated
+    are recorded here under a lock, and the UI reads consistent copies through
+    snapshot() from any thread. Listeners added with subscribe() are called (on the
+    worker thread) whenever the job changes.
+    """
+
+    def __init__(self, prompt, max_round=30, trace=False, job_id=None, resume_from=None):
+        self.id = job_id or uuid.uuid4().hex[:12]
+        self.prompt = prompt
+        # A checkpoint.CheckpointState to continue instead of starting from 'prompt'.
+        self.resume_from = resume_from
+        self.max_round = max_round
+        self.trace = trace
+        self.tracer = None
+        self.trace_file = None
+        self.status = QUEUED
+        self.error = None
+        self.stats = {}
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.messages = MessageStore()
+        self._partial_speaker = None
+        self._partial_text = ""
+        self._lock = threading.Lock()
+        self._listeners = []
+        self.cancelled = False
+        if resume_from is not None:
+            # Show the recorded part of the conversation right away; the last recorded message
+            # is posted again on resume and reported by the stream then.
+            for message in resume_from.messages[:-1]:
+                self.messages.append(message.get("name", ""), "chat_manager", message_text(message))
+
+    # --- ConversationStream view ---
+    def on_start(self, speaker):
+        self._check_cancelled()
+        with self._lock:
+            self._partial_speaker = speaker
+            self._partial_text = ""
+        self.notify()
+
+    def on_tokens(self, text):
+        self._check_cancelled()
+        with self._lock:
+            self._partial_text += text
+        self.notify()
+
+    def on_message(self, sender, recipient, content):
+        with self._lock:
+            self.messages.append(sender, recipient, content)
+            self._partial_speaker = None
+            self._partial_text = ""
+        self.notify()
+        self._check_cancelled()
+
+    # --- Cancellation and listeners ---
+    def cancel(self):
+        """Stop the job: a queued job never starts, a running one stops at its next message or token."""
+        self.cancelled = True
+        self.notify()
+
+    def _check_cancelled(self):
+        if self.cancelled:
+            raise JobCancelled(f"Job {self.id} was cancelled.")
+
+    def subscribe(self, listener):
+        with self._lock:
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def notify(self):
+        with self._lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener()
+
+    # --- Read side ---
+    @property
+    def done(self):
+        return self.status in (COMPLETED, FAILED, CANCELLED)
+
+    def snapshot(self, since=0, until=None):
+        """
+        Copy of the job state for rendering. Only messages [since:until] are copied, so a
+        poller that remembers how many it has drawn gets just the new ones, and a paged
+        view just the page it shows.
+        """
+        with self._lock:
+            messages = self.messages.page(since, until)
+            total = len(self.messages)
+            partial = (self._partial_speaker, self._partial_text) if self._partial_speaker else None
+        elapsed_end = self.finished or time.time()
+        return {
+            "id": self.id,
+            "status": self.status,
+            "error": self.error,
+            "stats": dict(self.stats),
+            "messages": messages,
+            "message_count": total,
+            "partial": partial,
+            "progress": min(total / self.max_round, 1.0) if self.max_round else 0.0,
+            "elapsed": elapsed_end - self.started if self.started else 0.0,
+            "trace": self.tracer.summary() if self.tracer else None,
+            "trace_file": self.trace_file,
+        }
+
+
+class JobRunner:
+    """
+    Runs conversations on a bounded pool of worker threads.
+
+    'team_factory(job)' must return a fresh agent_team.AgentTeam whose stream reports to
+    the job, so concurrent jobs never share agents or chat state. Finished jobs are kept
+    (up to 'max_jobs_kept') so their transcripts survive page reruns and reloads.
+    """
+
+    def __init__(self, team_factory, max_workers=DEFAULT_WORKERS, max_jobs_kept=100):
+        self.team_factory = team_factory
+        self.max_jobs_kept = max_jobs_kept
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="autogen-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, team_factory):
+        return cls(team_factory, max_workers=int(os.getenv("JOB_WORKERS", DEFAULT_WORKERS)))
+
+    def submit(self, prompt, max_round=30, trace=False):
+        return self._start(Job(prompt, max_round=max_round, trace=trace))
+
+    def resume(self, state, job_id, max_round=30, trace=False):
+        """Continue an interrupted job from its checkpoint under its old id (and so its old work dir)."""
+        return self._start(Job(state.task, max_round=max_round, trace=trace, job_id=job_id, resume_from=state))
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None and not job.done:
+            job.cancel()
+        return job
+
+    def _start(self, job):
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def queue_position(self, job):
+        """Number of queued jobs submitted before 'job' (0 once it is running)."""
+        if job.status != QUEUED:
+            return 0
+        with self._lock:
+            return sum(1 for other in self._jobs.values() if other.status == QUEUED and other.created < job.created)
+
+    def shutdown(self, wait=False):
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, job):
+        if job.cancelled:
+            job.status = CANCELLED
+            job.finished = time.time()
+            job.notify()
+            return
+        job.status = RUNNING
+        job.started = time.time()
+        job.notify()
+        try:
+            team = self.team_factory(job)
+            job.tracer = team.tracer
+            if job.resume_from is not None:
+                team.resume(job.resume_from)
+            else:
+                team.run(job.prompt)
+            job.stats["speaker_selection"] = team.speaker_selector.stats()
+            if team.compaction:
+                job.stats["tokens_saved"] = team.compaction.report()["tokens_saved"]
+            if team.execution_cache is not None:
+                job.stats["execution_cache"] = team.execution_cache.stats()
+            if team.fan_out is not None:
+                job.stats["fan_out"] = team.fan_out.stats()
+            if team.speculation is not None:
+                job.stats["speculative_execution"] = team.speculation.stats()
+            if team.artifacts is not None:
+                job.stats["artifacts"] = team.artifacts.stats()
+            if team.completion is not None:
+                job.stats["early_termination"] = team.completion.stats(team.groupchat.max_round)
+            if team.tokens is not None:
+                job.stats["tokens"] = team.tokens.stats()
+            job.status = COMPLETED
+        except JobCancelled:
+            # The checkpoint has no end record, so a cancelled job can still be resumed.
+            job.status = CANCELLED
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished = time.time()
+            if job.tracer is not None:
+                job.trace_file = job.tracer.write()
+            job.notify()
+
+    def _prune(self):
+        """Forget the oldest finished jobs once more than max_jobs_kept are stored."""
+        finished = sorted((j for j in self._jobs.values() if j.done), key=lambda j: j.created)
+        while len(self._jobs) > self.max_jobs_kept and finished:
+            self._jobs.pop(finished.pop(0).id, None)
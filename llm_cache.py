@@ -0,0 +1,223 @@
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+# --- Defaults (overridable through .env / environment variables) ---
+DEFAULT_CACHE_DIR = os.path.join(".cache", "llm")
+DEFAULT_MAX_MB = 256
+DEFAULT_TTL_HOURS = 24 * 7
+
+# Request parameters that never change the completion text and therefore must not
+# split the cache (e.g. a streamed and a non-streamed call for the same prompt).
+NON_SEMANTIC_KEYS = {"stream", "user", "timeout", "api_key", "base_url", "api_type", "api_version", "price"}
+
+
+def _normalize_content(content):
+    """
+    Normalize message content so cosmetic whitespace differences (CRLF line endings,
+    trailing spaces, leading/trailing blank lines) do not produce different cache keys.
+    Indentation inside a line is preserved because it is significant for Python code.
+    """
+    if isinstance(content, str):
+        lines = content.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+        return "\n".join(line.rstrip() for line in lines).strip()
+    if isinstance(content, list):
+        return [_normalize_content(part) for part in content]
+    if isinstance(content, dict):
+        return {k: _normalize_content(v) for k, v in content.items()}
+    return content
+
+
+def _normalize_message(message):
+    """Keep only the parts of a chat message that influence the model output."""
+    if not isinstance(message, dict):
+        return message
+    normalized = {"role": message.get("role"), "content": _normalize_content(message.get("content"))}
+    for key in ("name", "tool_calls", "tool_call_id", "function_call"):
+        if message.get(key) is not None:
+            normalized[key] = message[key]
+    return normalized
+
+
+def make_cache_key(raw_key):
+    """
+    Turn the request key produced by AutoGen's OpenAIWrapper (a JSON dump of the
+    request parameters) into a content address: the model, the normalized messages
+    and the sampling parameters are re-serialized canonically and hashed.
+    """
+    try:
+        params = json.loads(raw_key)
+    except (TypeError, ValueError):
+        return hashlib.sha256(str(raw_key).encode("utf-8")).hexdigest()
+    if not isinstance(params, dict):
+        return hashlib.sha256(raw_key.encode("utf-8")).hexdigest()
+
+    canonical = {k: v for k, v in params.items() if k not in NON_SEMANTIC_KEYS and k != "messages"}
+    canonical["messages"] = [_normalize_message(m) for m in params.get("messages", [])]
+    payload = json.dumps(canonical, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Disk-backed, content-addressed cache for LLM completions.
+
+    Implements the small cache protocol AutoGen expects (``get``/``set``/``close`` and
+    the context manager methods), so a single instance can be passed as
+    ``initiate_chat(..., cache=cache)``. The GroupChatManager then hands it to every
+    agent in the group chat. Entries are stored in a SQLite file, evicted in
+    least-recently-used order once ``max_bytes`` is exceeded and expire after ``ttl``
+    seconds. Hit/miss counters are kept for the lifetime of the instance.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_MB * 1024 * 1024,
+                 ttl=DEFAULT_TTL_HOURS * 3600):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self._lock = threading.RLock()
+        os.makedirs(cache_dir, exist_ok=True)
+        # A generous timeout lets several batch worker processes share one cache file.
+        self._conn = sqlite3.connect(os.path.join(cache_dir, "completions.sqlite"), timeout=30,
+                                     check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL,"
+            " created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+        self._conn.commit()
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build a cache from environment variables, or return None when caching is
+        disabled with ``LLM_CACHE_DISABLED=1``.
+        """
+        if os.getenv("LLM_CACHE_DISABLED", "").lower() in ("1", "true", "yes"):
+            return None
+        return cls(
+            cache_dir=os.getenv("LLM_CACHE_DIR", DEFAULT_CACHE_DIR),
+            max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024),
+            ttl=float(os.getenv("LLM_CACHE_TTL_HOURS", DEFAULT_TTL_HOURS)) * 3600,
+        )
+
+    # --- AutoGen cache protocol ---
+    def get(self, key, default=None):
+        digest = make_cache_key(key)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created FROM entries WHERE key = ?", (digest,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return default
+            value, created = row
+            if self.ttl and now - created > self.ttl:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (digest,))
+                self._conn.commit()
+                self.expired += 1
+                self.misses += 1
+                return default
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, digest))
+            self._conn.commit()
+        try:
+            response = pickle.loads(value)
+        except Exception:
+            # A corrupt or incompatible entry (e.g. after an AutoGen upgrade) is a miss.
+            with self._lock:
+                self.misses += 1
+            return default
+        with self._lock:
+            self.hits += 1
+        return response
+
+    def set(self, key, value):
+        digest = make_cache_key(key)
+        try:
+            blob = pickle.dumps(value)
+        except Exception:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (digest, blob, len(blob), now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # AutoGen enters/exits the cache around every single request, so leaving the
+        # context must not close the connection; call close() explicitly instead.
+        return None
+
+    # --- Maintenance ---
+    def _evict(self):
+        """Drop expired entries, then least-recently-used ones until under max_bytes."""
+        if self.ttl:
+            cursor = self._conn.execute("DELETE FROM entries WHERE created < ?", (time.time() - self.ttl,))
+            self.expired += max(cursor.rowcount, 0)
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY accessed ASC").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+
+    def stats(self):
+        """Return the hit/miss counters together with the current on-disk footprint."""
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    # --- Per-agent opt-out ---
+    def exclude(self, agent):
+        """
+        Opt an agent out of the shared cache.
+
+        The GroupChatManager pushes its cache onto every agent when a group chat
+        starts, so the opt-out is applied lazily: a reply function registered on the
+        agent clears ``client_cache`` right before the agent generates its LLM reply.
+        Agents should also be built with ``"cache_seed": None`` in their llm_config so
+        AutoGen's legacy per-seed disk cache does not kick in instead.
+        """
+        import autogen
+
+        def _disable_cache(recipient, messages, sender, config):
+            recipient.client_cache = None
+            return False, None
+
+        agent.register_reply([autogen.Agent, None], reply_func=_disable_cache)
+        return agent
@@ -0,0 +1,120 @@
+import threading
+
+_usage_lock = threading.Lock()
+
+
+def add_llm_middleware(agent, middleware):
+    """
+    Run 'middleware(agent, params, call_next)' around every LLM request 'agent' makes.
+
+    'params' are the keyword arguments of OpenAIWrapper.create(); 'call_next(params)'
+    continues with the next middleware and finally the agent's real client, or the
+    client given as params["llm_client"] (how model_router picks a model), whose usage
+    is then moved onto the agent's client. Middleware run in the order they were added. Only the agent's own client instance is wrapped,
+    so other agents (and other conversations) are unaffected. Returns False for agents
+    without an LLM client.
+    """
+    client = getattr(agent, "client", None)
+    if client is None:
+        return False
+    chain = getattr(client, "_llm_middleware", None)
+    if chain is None:
+        chain = client._llm_middleware = []
+        original_create = client.create
+
+        def create(**params):
+            def call(index, params):
+                if index == len(chain):
+                    params = dict(params)
+                    routed = params.pop("llm_client", None)
+                    if routed is None:
+                        return original_create(**params)
+                    try:
+                        return routed.create(**params)
+                    finally:
+                        fold_usage(routed, client)
+                return chain[index](agent, params, lambda next_params: call(index + 1, next_params))
+
+            return call(0, params)
+
+        client.create = create
+    chain.append(middleware)
+    return True
+
+
+def _merge_usage(summary, usage):
+    """Add an OpenAIWrapper usage summary ({"total_cost", model: {...}}) to another."""
+    if not usage:
+        return summary
+    summary = dict(summary or {"total_cost": 0})
+    for key, value in usage.items():
+        if isinstance(value, dict):
+            merged = dict(summary.get(key) or {})
+            for name, count in value.items():
+                merged[name] = merged.get(name, 0) + count
+            summary[key] = merged
+        else:
+            summary[key] = summary.get(key, 0) + value
+    return summary
+
+
+def fold_usage(source, target):
+    """
+    Move the usage 'source' (a routed OpenAIWrapper) recorded onto 'target', the agent's
+    own client, which is what gather_usage_summary() and ChatResult.cost read.
+    """
+    with _usage_lock:
+        actual = getattr(source, "actual_usage_summary", None)
+        total = getattr(source, "total_usage_summary", None)
+        if not (actual or total):
+            return
+        source.actual_usage_summary = source.total_usage_summary = None
+        target.actual_usage_summary = _merge_usage(getattr(target, "actual_usage_summary", None), actual)
+        target.total_usage_summary = _merge_usage(getattr(target, "total_usage_summary", None), total)
+
+
+def add_client_hook(agent, hook):
+    """
+    Call 'hook(client)' on every per-config client (OpenAIWrapper._clients) behind
+    'agent': those of its own client and of its entry_client() wrappers, including the
+    wrappers created later.
+    """
+    agent.__dict__.setdefault("_client_hooks", []).append(hook)
+    for wrapper in [agent.client, *agent.__dict__.get("_routed_clients", {}).values()]:
+        for client in getattr(wrapper, "_clients", []):
+            hook(client)
+
+
+def model_key(entry):
+    return f"{entry.get('api_type', 'openai')}:{entry.get('model')}"
+
+
+def entry_client(agent, entry):
+    """
+    An OpenAIWrapper for one config_list entry of 'agent', created once per agent and
+    model; pass it as params["llm_client"] to send a request to that model only.
+    """
+    clients = agent.__dict__.setdefault("_routed_clients", {})
+    key = model_key(entry)
+    if key not in clients:
+        from autogen import OpenAIWrapper
+
+        from ollama_transport import register_pooled_clients
+
+        llm_config = agent.llm_config if isinstance(agent.llm_config, dict) else agent.llm_config.model_dump()
+        base = {k: v for k, v in llm_config.items() if k != "config_list"}
+        clients[key] = OpenAIWrapper(config_list=[entry], **base)
+        register_pooled_clients([clients[key]])
+        for hook in agent.__dict__.get("_client_hooks", []):
+            for client in clients[key]._clients:
+                hook(client)
+    return clients[key]
+
+
+def response_usage(response):
+    """(prompt_tokens, completion_tokens, model) of an OpenAIWrapper response, when reported."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return 0, 0, getattr(response, "model", None)
+    return (getattr(usage, "prompt_tokens", 0) or 0, getattr(usage, "completion_tokens", 0) or 0,
+            getattr(response, "model", None))
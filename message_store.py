@@ -0,0 +1,122 @@
+import hashlib
+import sys
+import threading
+
+from speaker_selection import CODE_BLOCK_RE
+
+# Code blocks shorter than this stay inline; hashing them would cost more than it saves.
+MIN_BLOB_CHARS = 200
+
+
+class CodeBlock:
+    """A fenced code block of a message; its body lives once in the MessageStore's blobs."""
+
+    __slots__ = ("fence", "language", "digest", "lines")
+
+    def __init__(self, fence, language, digest, lines):
+        self.fence = fence
+        self.language = language
+        self.digest = digest
+        self.lines = lines
+
+
+class MessageRecord:
+    """One finished message: interned sender/recipient ids and its parts (text or CodeBlock)."""
+
+    __slots__ = ("sender", "recipient", "parts")
+
+    def __init__(self, sender, recipient, parts):
+        self.sender = sender
+        self.recipient = recipient
+        self.parts = parts
+
+
+class MessageStore:
+    """
+    Compact, append-only store of a conversation's finished messages.
+
+    Agent names are interned to small ids, records use __slots__, and code blocks of at
+    least MIN_BLOB_CHARS characters are stored once by sha256, so a listing that is
+    re-posted for review, testing and execution takes memory once. Messages are read
+    back by index range (page()) so a view only materializes what it shows.
+    """
+
+    def __init__(self):
+        self._names = []
+        self._ids = {}
+        self._records = []
+        self._blobs = {}
+        self._raw_chars = 0
+        self._lock = threading.Lock()
+
+    def _intern(self, name):
+        agent_id = self._ids.get(name)
+        if agent_id is None:
+            agent_id = self._ids[name] = len(self._names)
+            self._names.append(sys.intern(name))
+        return agent_id
+
+    def _split(self, content):
+        parts, pos = [], 0
+        for match in CODE_BLOCK_RE.finditer(content):
+            body = match.group(2)
+            if len(body) < MIN_BLOB_CHARS:
+                continue
+            if match.start() > pos:
+                parts.append(content[pos:match.start()])
+            digest = hashlib.sha256(body.encode("utf-8")).hexdigest()
+            self._blobs.setdefault(digest, body)
+            fence = content[match.start():match.start(2)]
+            parts.append(CodeBlock(fence, match.group(1) or "text", digest, body.count("\n") + 1))
+            pos = match.end()
+        if pos < len(content):
+            parts.append(content[pos:])
+        return tuple(parts)
+
+    def append(self, sender, recipient, content):
+        content = content or ""
+        with self._lock:
+            self._records.append(MessageRecord(self._intern(sender or ""), self._intern(recipient or ""),
+                                               self._split(content)))
+            self._raw_chars += len(content)
+            return len(self._records) - 1
+
+    def __len__(self):
+        return len(self._records)
+
+    # --- Read side ---
+    def text(self, record):
+        return "".join(part if isinstance(part, str) else f"{part.fence}{self._blobs[part.digest]}```"
+                       for part in record.parts)
+
+    def segments(self, record):
+        """[("text", str) | ("code", language, body)] of a record, for views that render code separately."""
+        segments = []
+        for part in record.parts:
+            if isinstance(part, str):
+                # Small code blocks stay in the text; split them out too.
+                pos = 0
+                for match in CODE_BLOCK_RE.finditer(part):
+                    if part[pos:match.start()].strip():
+                        segments.append(("text", part[pos:match.start()]))
+                    segments.append(("code", match.group(1) or "text", match.group(2)))
+                    pos = match.end()
+                if part[pos:].strip():
+                    segments.append(("text", part[pos:]))
+            else:
+                segments.append(("code", part.language, self._blobs[part.digest]))
+        return segments
+
+    def page(self, start=0, stop=None):
+        """Messages [start:stop] as dicts with 'sender', 'recipient', 'message' and 'segments'."""
+        with self._lock:
+            records = self._records[start:stop]
+            return [{"sender": self._names[r.sender], "recipient": self._names[r.recipient],
+                     "message": self.text(r), "segments": self.segments(r)} for r in records]
+
+    def stats(self):
+        with self._lock:
+            blob_chars = sum(len(body) for body in self._blobs.values())
+            inline_chars = sum(len(p) for r in self._records for p in r.parts if isinstance(p, str))
+            return {"messages": len(self._records), "agents": len(self._names), "code_blobs": len(self._blobs),
+                    "raw_chars": self._raw_chars, "stored_chars": blob_chars + inline_chars}
@@ -0,0 +1,297 @@
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from speaker_selection import execution_exit_code, has_code_block, message_text
+
+# --- Scripted Responses ---
+APP_CODE = '''```python
+# filename: calculator_v{version}.py
+"""Basic arithmetic operations."""
+
+
+class Calculator:
+    """Perform basic arithmetic operations."""
+
+    def add(self, a, b):
+        """Return a + b."""
+        return a + b
+
+    def divide(self, a, b):
+        """Return a / b, raising ValueError on division by zero."""
+        if b == 0:
+            raise ValueError("Cannot divide by zero.")
+        return a / b
+
+
+if __name__ == "__main__":
+    calc = Calculator()
+    print(calc.add(2, 3), calc.divide(6, 3))
+```'''
+
+TEST_CODE = '''```python
+# filename: test_calculator_v{version}.py
+import unittest
+
+
+def add(a, b):
+    return a + b
+
+
+class TestAdd(unittest.TestCase):
+    def test_add(self):
+        self.assertEqual(add(2, 3), 5)
+
+    def test_add_negative(self):
+        self.assertEqual(add(-2, -3), -5)
+
+
+if __name__ == "__main__":
+    unittest.main()
+```'''
+
+
+def approx_tokens(text):
+    """Rough token count (~4 characters per token), good enough for a stub server."""
+    return max(1, len(text) // 4)
+
+
+class ResponseScript:
+    """
+    Picks a reply for a chat request by looking only at the request itself, so any
+    number of concurrent conversations can share one server. The role is recognised
+    from the agent's system message; 'review_rounds' is how many times the Reviewer
+    asks the Coder for changes before approving.
+    """
+
+    def __init__(self, review_rounds=1):
+        self.review_rounds = review_rounds
+
+    def reply(self, messages):
+        system = message_text(messages[0]) if messages and messages[0].get("role") == "system" else ""
+        last = message_text(messages[-1]) if messages else ""
+        everything = "\n".join(message_text(m) for m in messages)
+
+        if "role play game" in system or "next role" in last:
+            # GroupChatManager speaker selection fallback.
+            return "Admin" if "TERMINATE" in everything else "Coder"
+        if "Code Reviewer" in system:
+            coder_versions = sum(1 for m in messages if m.get("name") == "Coder" and has_code_block(message_text(m)))
+            last_from_coder = messages[-1].get("name") == "Coder"
+            if last_from_coder and coder_versions <= self.review_rounds:
+                return "Please add input validation for non-numeric arguments and expand the module docstring."
+            return "Looks good! Code review complete."
+        if "Test Engineer" in system:
+            versions = sum(1 for m in messages if m.get("role") == "assistant" and has_code_block(message_text(m)))
+            return "Here are the unit tests.\n\n" + TEST_CODE.format(version=versions + 1)
+        if "specialized in Python" in system:
+            if execution_exit_code(last) == 0:
+                return "All tests passed and the script works as expected. TERMINATE"
+            versions = sum(1 for m in messages if m.get("role") == "assistant" and has_code_block(message_text(m)))
+            return "Here is the implementation.\n\n" + APP_CODE.format(version=versions + 1)
+        return "Please continue."
+
+
+# --- HTTP Handler ---
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        # Keep benchmark output clean.
+        return
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _chunks(self, text):
+        words = text.split(" ")
+        return [word + (" " if i < len(words) - 1 else "") for i, word in enumerate(words)]
+
+    def do_GET(self):
+        if self.path.rstrip("/") in ("/api/tags", "/v1/models"):
+            self._send_json({"models": [], "data": []})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        server = self.server
+        start = time.perf_counter()
+        try:
+            request = self._read_json()
+        except ValueError:
+            self._send_json({"error": "invalid JSON"}, status=400)
+            return
+        path = self.path.rstrip("/")
+        if path.endswith("/chat/completions"):
+            handler = self._openai_chat
+        elif path.endswith("/api/chat"):
+            handler = self._ollama_chat
+        elif path.endswith("/api/generate"):
+            handler = self._ollama_generate
+        else:
+            self._send_json({"error": f"unknown endpoint {self.path}"}, status=404)
+            return
+        messages = request.get("messages") or []
+        text = server.script.reply(messages)
+        time.sleep(server.latency)
+        handler(request, text, approx_tokens("".join(message_text(m) for m in messages)))
+        server.record(path, time.perf_counter() - start)
+
+    def _openai_chat(self, request, text, prompt_tokens):
+        model = request.get("model", "mock")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        if not request.get("stream"):
+            self._send_json({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                             "finish_reason": "stop", "logprobs": None}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": approx_tokens(text),
+                          "total_tokens": prompt_tokens + approx_tokens(text)},
+            })
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        chunks = self._chunks(text)
+        for i, chunk in enumerate(chunks):
+            delta = {"content": chunk}
+            if i == 0:
+                delta["role"] = "assistant"
+            payload = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                       "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(self.server.token_latency)
+        final = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                 "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+        self.wfile.flush()
+        self.close_connection = True
+
+    def _ollama_payload(self, request, done, **extra):
+        payload = {"model": request.get("model", "mock"),
+                   "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "done": done}
+        payload.update(extra)
+        return payload
+
+    def _ollama_chat(self, request, text, prompt_tokens):
+        stats = {"done_reason": "stop", "total_duration": int(self.server.latency * 1e9), "load_duration": 0,
+                 "prompt_eval_count": prompt_tokens, "eval_count": approx_tokens(text)}
+        if not request.get("stream", False):
+            self._send_json(self._ollama_payload(request, True, message={"role": "assistant", "content": text}, **stats))
+            return
+        # Like Ollama, stream NDJSON with chunked encoding on a kept-alive connection.
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for chunk in self._chunks(text):
+            line = self._ollama_payload(request, False, message={"role": "assistant", "content": chunk})
+            self._write_chunk((json.dumps(line) + "\n").encode("utf-8"))
+            time.sleep(self.server.token_latency)
+        final = self._ollama_payload(request, True, message={"role": "assistant", "content": ""}, **stats)
+        self._write_chunk((json.dumps(final) + "\n").encode("utf-8"))
+        self._write_chunk(b"")
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _ollama_generate(self, request, text, prompt_tokens):
+        # Used to preload/warm a model: an empty prompt just loads it.
+        self._send_json(self._ollama_payload(request, True, response="", done_reason="load",
+                                             load_duration=int(self.server.latency * 1e9)))
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    """
+    OpenAI- and Ollama-compatible stub server with scripted replies and a configurable
+    per-request 'latency' and per-chunk 'token_latency' (both in seconds).
+
+    Use as a context manager; it serves from a daemon thread on 127.0.0.1.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.0, token_latency=0.0, review_rounds=1):
+        super().__init__(("127.0.0.1", port), MockLLMHandler)
+        self.latency = latency
+        self.token_latency = token_latency
+        self.script = ResponseScript(review_rounds=review_rounds)
+        self.requests = 0
+        self.server_time = 0.0
+        self.by_endpoint = {}
+        self._stats_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def openai_base_url(self):
+        return f"{self.url}/v1"
+
+    def record(self, path, elapsed):
+        with self._stats_lock:
+            self.requests += 1
+            self.server_time += elapsed
+            self.by_endpoint[path] = self.by_endpoint.get(path, 0) + 1
+
+    def stats(self):
+        with self._stats_lock:
+            return {"requests": self.requests, "server_time": round(self.server_time, 4),
+                    "by_endpoint": dict(self.by_endpoint)}
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="mock-llm-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve scripted OpenAI/Ollama-compatible chat completions.")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before every reply")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="seconds between streamed chunks")
+    parser.add_argument("--review-rounds", type=int, default=1)
+    args = parser.parse_args()
+    server = MockLLMServer(args.port, args.latency, args.token_latency, args.review_rounds)
+    print(f"Mock LLM server on {server.url} (OpenAI base_url {server.openai_base_url}, Ollama host {server.url})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+import collections
+import http.client
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from llm_hooks import add_llm_middleware, entry_client, model_key
+from ollama_transport import OllamaError
+
+# Which end of the config_list each role prefers: the first entry is treated as the large
+# model, the last one as the small, fast model.
+DEFAULT_ROLES = {
+    "Coder": "large",
+    "Test_Engineer": "large",
+    "Reviewer": "small",
+    "Admin": "small",
+    "chat_manager": "small",
+}
+DEFAULT_P95_THRESHOLD = 30.0
+DEFAULT_MAX_ERROR_RATE = 0.5
+DEFAULT_WINDOW = 50
+MIN_SAMPLES = 5
+
+
+def _failover_errors():
+    """Errors of the API or the transport; anything else (e.g. a cancelled job) is not the model's fault."""
+    errors = (OSError, http.client.HTTPException, OllamaError)
+    try:
+        import openai
+    except ImportError:
+        return errors
+    return (*errors, openai.APIError)
+
+
+FAILOVER_ERRORS = _failover_errors()
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class ModelStats:
+    """Rolling latency and error window for one model."""
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.samples = collections.deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+        self.hedges_won = 0
+
+    def record(self, latency, ok):
+        self.samples.append((latency, ok))
+        self.calls += 1
+        self.errors += 0 if ok else 1
+
+    def latencies(self):
+        return [latency for latency, ok in self.samples if ok]
+
+    def p95(self):
+        return _percentile(self.latencies(), 95)
+
+    def p50(self):
+        return _percentile(self.latencies(), 50)
+
+    def error_rate(self):
+        return sum(1 for _, ok in self.samples if not ok) / len(self.samples) if self.samples else 0.0
+
+
+class ModelRouter:
+    """
+    Routes every agent's LLM requests across the entries of its config_list.
+
+    Each role has a preferred model ('roles' maps agent names to a model name, "large"
+    or "small"). Rolling latency and error rates are tracked per model; a model whose
+    p95 latency exceeds 'p95_threshold' seconds or whose error rate exceeds
+    'max_error_rate' is moved behind the healthy ones, and a request failing with an
+    API or transport error (FAILOVER_ERRORS) fails over to the next candidate; other
+    errors, such as a cancelled job, are raised as they are. With 'hedge' on, a non-streaming request that has not
+    answered within the primary model's p95 is raced against the next candidate.
+
+    One router is meant to be shared by all teams of a process, so every conversation
+    benefits from the latencies observed by the others.
+    """
+
+    def __init__(self, roles=None, p95_threshold=DEFAULT_P95_THRESHOLD, max_error_rate=DEFAULT_MAX_ERROR_RATE,
+                 window=DEFAULT_WINDOW, hedge=False):
+        self.roles = {**DEFAULT_ROLES, **(roles or {})}
+        self.p95_threshold = p95_threshold
+        self.max_error_rate = max_error_rate
+        self.window = window
+        self.hedge = hedge
+        self.failovers = 0
+        self.hedged = 0
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._hedge_pool = None
+
+    @classmethod
+    def from_env(cls):
+        """
+        MODEL_ROUTES is JSON or 'Role=model,Role=model'; MODEL_P95_THRESHOLD (seconds),
+        MODEL_MAX_ERROR_RATE and MODEL_HEDGE=1 tune the health checks. Returns None when
+        MODEL_ROUTING=0.
+        """
+        if os.getenv("MODEL_ROUTING", "1").lower() in ("0", "false", "no"):
+            return None
+        routes = os.getenv("MODEL_ROUTES", "").strip()
+        if routes.startswith("{"):
+            roles = json.loads(routes)
+        else:
+            roles = dict(part.split("=", 1) for part in routes.split(",") if "=" in part)
+        return cls(
+            roles={k.strip(): v.strip() for k, v in roles.items()},
+            p95_threshold=float(os.getenv("MODEL_P95_THRESHOLD", DEFAULT_P95_THRESHOLD)),
+            max_error_rate=float(os.getenv("MODEL_MAX_ERROR_RATE", DEFAULT_MAX_ERROR_RATE)),
+            hedge=os.getenv("MODEL_HEDGE", "0").lower() in ("1", "true", "yes"),
+        )
+
+    # --- Health ---
+    def stats_for(self, key):
+        with self._lock:
+            if key not in self._stats:
+                self._stats[key] = ModelStats(self.window)
+            return self._stats[key]
+
+    def healthy(self, key):
+        stats = self.stats_for(key)
+        if len(stats.samples) < MIN_SAMPLES:
+            return True
+        p95 = stats.p95()
+        return stats.error_rate() <= self.max_error_rate and (p95 is None or p95 <= self.p95_threshold)
+
+    def preferred(self, role, config_list):
+        """The config_list entry the role prefers."""
+        choice = self.roles.get(role, "large")
+        if choice == "large":
+            return config_list[0]
+        if choice == "small":
+            return config_list[-1]
+        return next((e for e in config_list if e.get("model") == choice), config_list[0])
+
+    def candidates(self, role, config_list):
+        """config_list ordered for 'role': preferred model first, unhealthy models last."""
+        preferred = self.preferred(role, config_list)
+        rest = [e for e in config_list if e is not preferred]
+        # Among the others, known-fast models go first.
+        rest.sort(key=lambda e: self.stats_for(model_key(e)).p50() or float("inf"))
+        ordered = [preferred, *rest]
+        return [e for e in ordered if self.healthy(model_key(e))] + \
+               [e for e in ordered if not self.healthy(model_key(e))]
+
+    def route_llm_config(self, role, llm_config):
+        """Copy of 'llm_config' with the config_list in the role's order (used at agent creation)."""
+        if not llm_config or not llm_config.get("config_list"):
+            return llm_config
+        return {**llm_config, "config_list": self.candidates(role, llm_config["config_list"])}
+
+    # --- Request Routing ---
+    def attach(self, agents):
+        """Install the routing middleware on every agent with an LLM client."""
+        for agent in agents:
+            add_llm_middleware(agent, self._route)
+
+    def _call(self, agent, entry, params, call_next):
+        key = model_key(entry)
+        start = time.perf_counter()
+        try:
+            response = call_next({**params, "llm_client": entry_client(agent, entry)})
+        except FAILOVER_ERRORS:
+            self.stats_for(key).record(time.perf_counter() - start, ok=False)
+            raise
+        self.stats_for(key).record(time.perf_counter() - start, ok=True)
+        return response
+
+    def _route(self, agent, params, call_next):
+        llm_config = agent.llm_config if isinstance(agent.llm_config, dict) else agent.llm_config.model_dump()
+        config_list = llm_config.get("config_list") or []
+        if len(config_list) < 2:
+            return call_next(params)
+        candidates = self.candidates(agent.name, config_list)
+        streaming = params.get("stream", llm_config.get("stream", False))
+        if self.hedge and not streaming:
+            return self._hedged(agent, candidates, params, call_next)
+        last_error = None
+        for i, entry in enumerate(candidates):
+            try:
+                return self._call(agent, entry, params, call_next)
+            except FAILOVER_ERRORS as e:
+                last_error = e
+                if i + 1 < len(candidates):
+                    with self._lock:
+                        self.failovers += 1
+        raise last_error
+
+    def _hedged(self, agent, candidates, params, call_next):
+        """Start the primary; if it is slower than its p95, race it against the next candidate."""
+        with self._lock:
+            if self._hedge_pool is None:
+                self._hedge_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="model-hedge")
+        primary, backups = candidates[0], list(candidates[1:])
+        delay = self.stats_for(model_key(primary)).p95() or self.p95_threshold
+        pending = {self._hedge_pool.submit(self._call, agent, primary, params, call_next): primary}
+        done, _ = wait(pending, timeout=min(delay, self.p95_threshold))
+        last_error = None
+        while pending or backups:
+            if not done:
+                if backups:
+                    entry = backups.pop(0)
+                    with self._lock:
+                        self.hedged += 1
+                    pending[self._hedge_pool.submit(self._call, agent, entry, params, call_next)] = entry
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                entry = pending.pop(future)
+                try:
+                    response = future.result()
+                except FAILOVER_ERRORS as e:
+                    last_error = e
+                    continue
+                if entry is not primary:
+                    self.stats_for(model_key(entry)).hedges_won += 1
+                return response
+            done = set()
+        raise last_error
+
+    def stats(self):
+        with self._lock:
+            items = list(self._stats.items())
+            summary = {"failovers": self.failovers, "hedged": self.hedged, "models": {}}
+        for key, stats in items:
+            p50, p95 = stats.p50(), stats.p95()
+            summary["models"][key] = {
+                "calls": stats.calls, "errors": stats.errors, "error_rate": round(stats.error_rate(), 3),
+                "p50": round(p50, 3) if p50 is not None else None, "p95": round(p95, 3) if p95 is not None else None,
+                "hedges_won": stats.hedges_won, "healthy": self.healthy(key),
+            }
+        return summary
+
+
+_shared_router = None
+_shared_lock = threading.Lock()
+
+
+def shared_router():
+    """The process-wide router configured from the environment (None when routing is off)."""
+    global _shared_router
+    with _shared_lock:
+        if _shared_router is None:
+            _shared_router = ModelRouter.from_env() or False
+        return _shared_router or None
@@ -1,10 +1,18 @@
+import argparse
 import tempfile
 import autogen
-from autogen_ext.models.ollama import OllamaChatCompletionClient
 
 from dotenv import load_dotenv
 import os
 
+import agent_team
+from checkpoint import CheckpointWriter, checkpoint_path, checkpoints_enabled, find_checkpoint, report_resume
+from llm_cache import ResponseCache
+from model_router import shared_router
+from ollama_transport import transport_stats, warm_up_models
+from structured_log import StructuredRuntimeLogger
+from tracing import Tracer, instrument_team, tracing_enabled
+
 # --- Load environment variables ---
 load_dotenv()
 
@@ -13,85 +21,60 @@ load_dotenv()
 # if ollama_api_key:
 #     print("Note: OLLAMA_API_KEY found. Ensure your Ollama server expects an API key if not local.")
 
-# Ensure the 'coding' directory exists for agent output
-if not os.path.exists("coding"):
-    os.makedirs("coding")
-    print("Created 'coding' directory.")
-
-# --- Ollama Client Configuration (for agents) ---
-# Each agent will use this specific Ollama client for its LLM interactions.
-# If you want different models for different agents, create separate OllamaChatCompletionClient instances.
-ollama_client_for_agents = OllamaChatCompletionClient(
-    model="llama2:13b", # Or "llama3:latest", "mistral", etc. - ensure this model is pulled in Ollama
-    temperature=0.7,
-    seed=42,
-    max_tokens=2048,
-    # response_format=SomePydanticModel if you want structured output
-)
+# --- Ollama Transport (for agents) ---
+# Agents talk to Ollama through one shared, pooled transport (see ollama_transport):
+# kept-alive HTTP connections, at most OLLAMA_NUM_PARALLEL concurrent requests and
+# OLLAMA_KEEP_ALIVE (default 30m) so the models stay loaded for the whole conversation.
+
 
 # --- LLM Config for GroupChatManager (for speaker selection) ---
 # The GroupChatManager needs an llm_config to select the next speaker.
 # We'll use a simplified config list for it, pointing to the local Ollama server.
 # This assumes the default Ollama API endpoint.
-manager_llm_config = {
-    "config_list": [
-        {
-            "model": "llama2:13b", # Manager also uses llama2:13b for consistency
-            "api_type": "ollama",
-            "base_url": "http://localhost:11434/api" # Default Ollama API endpoint
-        }
-    ],
-    "temperature": 0.7,
-    "timeout": 600 # Increased timeout for local models if needed
-}
+# OLLAMA_MODELS lists more local models (largest first, e.g. "llama2:13b,llama3.1:latest,llama3.2:latest")
+# so the model router can give small ones to the Reviewer and speaker selection.
+def make_manager_llm_config(base_url="http://localhost:11434/api", models=None): # Default Ollama API endpoint
+    models = models or [m.strip() for m in os.getenv("OLLAMA_MODELS", "llama2:13b").split(",") if m.strip()]
+    return {
+        "config_list": [
+            {
+                "model": model, # Manager also uses llama2:13b for consistency
+                "api_type": "ollama",
+                "base_url": base_url
+            }
+            for model in models
+        ],
+        "temperature": 0.7,
+        "timeout": 600, # Increased timeout for local models if needed
+        "cache_seed": None # Legacy per-seed cache off; the shared ResponseCache is used instead
+    }
+
 
-# --- Start AutoGen Runtime Logging to a .log file ---
-# Create a temporary directory for logs if you want them isolated, otherwise use current dir.
-# current_log_dir = tempfile.TemporaryDirectory() # Use this if you want logs in a temp dir
-logging_session_id = autogen.runtime_logging.start(
-    logger_type="file", config={"filename": "conversation_log.log"}) # Logs in current directory
-print(f"AutoGen logging started. Session ID: {logging_session_id}")
-print("Logs will be saved to 'conversation_log.log'.")
+manager_llm_config = make_manager_llm_config()
+
+TASK_MESSAGE = """
+    Write a Python class for performing basic arithmetic operations and also implement main program to test these arithmetic operations.
+    The script should print these numbers to the console.
+    Ensure the code is reviewed for correctness, efficiency, and proper documentation (docstrings and comments).
+    **After the application code is reviewed, a Test Engineer should generate unit tests for it.
+    The Test Engineer's code should then also be reviewed by the Code Reviewer for quality before I execute those tests to ensure correctness.**
+    Once tests pass and the application code is finalized, I will the provide final approval to run the main script.
+    """
 
 
 # --- Agent Definitions ---
-user_proxy = autogen.UserProxyAgent(
-    name="Admin",
-    system_message="A human administrator who will review the code and provide final approval for execution. You will also execute tests and report results.",
-    # Admin typically doesn't need an LLM for its primary role as human proxy,
-    # but can have one if it needs to generate messages itself.
-    # If it needs one, use the ollama_client_for_agents directly.
-    # model_client=ollama_client_for_agents, # Uncomment if Admin needs to generate LLM responses
-    human_input_mode="ALWAYS",
-    code_execution_config={
-        "work_dir": "coding", # Agents will save/execute code here
-        "use_docker": False,
-    },
-    is_termination_msg=lambda x: x.get(
-        "content", "").rstrip().endswith("TERMINATE"),
-)
-
-coder = autogen.AssistantAgent( # Renamed 'assistant' to 'coder' for clarity matching system message
-    name="Coder",
-    llm_config=manager_llm_config,
-    system_message="""You are a helpful AI assistant specialized in Python programming.
+ADMIN_SYSTEM_MESSAGE = "A human administrator who will review the code and provide final approval for execution. You will also execute tests and report results."
+
+CODER_SYSTEM_MESSAGE = """You are a helpful AI assistant specialized in Python programming.
 You can write Python code, explain concepts, and debug issues.
 When you provide code, ensure it is complete, runnable, and follows good practices including robust error handling, clear documentation, modularity, and reusability.
 Also save your code into a 'coding' sub-folder within the current project directory with appropriate version numbering.
 If you need to run code or tests, suggest it and wait for approval.
 If the requirements are unclear or ambiguous, ask clarifying questions to ensure a precise understanding.
 When providing solutions for complex problems, break them down into smaller, manageable sub-tasks and explain your approach.
-Once the task is complete, reply with 'TERMINATE' to end the conversation.""",
-    code_execution_config={
-        "work_dir": "coding",
-        "use_docker": False,
-    }
-)
+Once the task is complete, reply with 'TERMINATE' to end the conversation."""
 
-reviewer = autogen.AssistantAgent(
-    name="Reviewer",
-    llm_config=manager_llm_config,
-    system_message="""You are a meticulous Code Reviewer.
+REVIEWER_SYSTEM_MESSAGE = """You are a meticulous Code Reviewer.
     Your sole role is to provide feedback, suggestions, and critique on **any Python code presented in the conversation, including application code and test code.**
     **NEVER write or rewrite any code yourself.**
     **NEVER suggest specific code implementations.** Instead, describe *what* needs to be changed or improved conceptually.
@@ -109,12 +92,8 @@ reviewer = autogen.AssistantAgent(
     If changes are needed, clearly explain the areas for improvement.
     Once the code is approved or deemed perfect, you are done.
     """
-)
 
-test_engineer = autogen.AssistantAgent(
-    name="Test_Engineer",
-    llm_config=manager_llm_config,
-    system_message="""You are a skilled Test Engineer specialized in Python.
+TEST_ENGINEER_SYSTEM_MESSAGE = """You are a skilled Test Engineer specialized in Python.
 Your primary role is to create comprehensive unit tests for the Python code provided by the Coder.
 Your tests should:
 - Be written using Python's `unittest` framework unless `pytest` is explicitly requested or already in use within the project.
@@ -127,48 +106,120 @@ Also save your code into a 'coding' sub-folder within the current project direct
 Once the test code is complete, **ensure it is runnable and passes locally (if possible) before presenting it to the Reviewer** for their feedback.
 After the test code has been reviewed and approved, then you can request the Admin to execute the tests.
 If tests look good and no more test cases are needed, signal approval for the main script to proceed.
-    """,
-    code_execution_config={
-        "work_dir": "coding",
-        "use_docker": False,
-    }
-)
-
-# --- Group Chat Setup ---
-groupchat = autogen.GroupChat(
-    agents=[user_proxy, coder, reviewer, test_engineer], # Used 'coder' instead of 'assistant'
-    messages=[],
-    max_round=30,  # Increased max_round again to accommodate more review iterations
-    speaker_selection_method="auto",
-)
-
-manager = autogen.GroupChatManager(groupchat=groupchat, llm_config=manager_llm_config) # Manager uses its own llm_config
-
-# --- Initiate the chat ---
-print("\n--- Starting the AutoGen Conversation ---")
-print("Admin will initiate the conversation with the GroupChatManager.")
-print("Type 'exit' to terminate the human input at any point.")
-
-user_proxy.initiate_chat(
-    manager,
-    message="""
-    Write a Python class for performing basic arithmetic operations and also implement main program to test these arithmetic operations.
-    The script should print these numbers to the console.
-    Ensure the code is reviewed for correctness, efficiency, and proper documentation (docstrings and comments).
-    **After the application code is reviewed, a Test Engineer should generate unit tests for it.
-    The Test Engineer's code should then also be reviewed by the Code Reviewer for quality before I execute those tests to ensure correctness.**
-    Once tests pass and the application code is finalized, I will the provide final approval to run the main script.
     """
-)
 
-print("\n--- Conversation Ended ---")
-print("Check the 'coding' directory for any generated files.")
+SYSTEM_MESSAGES = {
+    "Admin": ADMIN_SYSTEM_MESSAGE,
+    "Coder": CODER_SYSTEM_MESSAGE,
+    "Reviewer": REVIEWER_SYSTEM_MESSAGE,
+    "Test_Engineer": TEST_ENGINEER_SYSTEM_MESSAGE,
+}
 
-# --- Stop AutoGen Runtime Logging ---
-autogen.runtime_logging.stop()
-print("AutoGen logging stopped. You can now review 'conversation_log.log'.")
 
-# Clean up the temporary directory if it was used for logs
-# if 'current_log_dir' in locals():
-#     current_log_dir.cleanup()
-#     print(f"Cleaned up temporary log directory: {current_log_dir.name}")
+def build_team(llm_config=manager_llm_config, human_input_mode="ALWAYS", work_dir="coding", cache=None):
+    """Build this script's Admin/Coder/Reviewer/Test_Engineer group chat as an AgentTeam."""
+    # The agents are wired in agent_team; this script only brings its prompts, lets the
+    # Coder and the Test_Engineer run code too and keeps AutoGen's console for human input.
+    # The Admin is a human proxy here and gets no model.
+    return agent_team.build_team(llm_config=llm_config, admin_llm=False, work_dir=work_dir, cache=cache,
+                                 human_input_mode=human_input_mode, system_messages=SYSTEM_MESSAGES, code_executors=("Admin", "Coder", "Test_Engineer"),
+                                 console=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Admin/Coder/Reviewer/Test_Engineer group chat.")
+    parser.add_argument("--resume", nargs="?", const="latest", metavar="CHECKPOINT",
+                        help="continue an interrupted conversation from its checkpoint (default: the latest one)")
+    args = parser.parse_args(argv)
+    script_name = os.path.splitext(os.path.basename(__file__))[0]
+    # Raises before anything starts when there is nothing to resume.
+    resume_state = find_checkpoint(args.resume, f"{script_name}-*") if args.resume else None
+
+    # Ensure the 'coding' directory exists for agent output
+    if not os.path.exists("coding"):
+        os.makedirs("coding")
+        print("Created 'coding' directory.")
+
+    # --- Shared LLM response cache ---
+    # Passed to initiate_chat, so the GroupChatManager hands it to every agent in the group chat.
+    response_cache = ResponseCache.from_env()
+
+    # --- Start AutoGen Runtime Logging to the structured, rotated log ---
+    # Set RUNTIME_LOG_DIR to keep the logs somewhere else (default logs/runtime).
+    runtime_logger = StructuredRuntimeLogger.from_env()
+    logging_session_id = autogen.runtime_logging.start(logger=runtime_logger)
+    print(f"AutoGen logging started. Session ID: {logging_session_id}")
+    print(f"Logs will be saved to '{runtime_logger.log.log_dir}'.")
+
+    # Load the models up front (instead of on the Coder's first turn) and report the cold start.
+    for model, warm_up in warm_up_models(manager_llm_config).items():
+        print(f"Ollama model '{model}' loaded in {warm_up['seconds']}s (server load {warm_up['load_duration']}s).")
+
+    team = build_team(cache=response_cache)
+    if tracing_enabled():
+        instrument_team(team, Tracer(f"{script_name}-{logging_session_id}"))
+    # Every round is appended to a checkpoint, so a crashed run can be continued with --resume.
+    if resume_state is not None or checkpoints_enabled():
+        path = resume_state.path if resume_state else checkpoint_path(f"{script_name}-{logging_session_id}")
+        CheckpointWriter(path, work_dir="coding", meta={"entry": script_name}, state=resume_state).attach(team)
+
+    # --- Initiate the chat ---
+    print("\n--- Starting the AutoGen Conversation ---")
+    print("Admin will initiate the conversation with the GroupChatManager.")
+    print("Type 'exit' to terminate the human input at any point.")
+
+    if resume_state is not None:
+        print(report_resume(resume_state))
+        team.resume(resume_state)
+    else:
+        team.run(TASK_MESSAGE)
+
+    print("\n--- Conversation Ended ---")
+    print("Check the 'coding' directory for any generated files.")
+    if team.checkpoint is not None:
+        print(f"Checkpoint: '{team.checkpoint.path}' ({team.checkpoint.rounds} rounds).")
+    print(f"Speaker selection: {team.speaker_selector.stats()}")
+    compaction_report = team.compaction.report()
+    print(f"History compaction: {compaction_report['tokens_saved']} tokens saved over "
+          f"{compaction_report['calls']} LLM calls; per round: {team.compaction.savings_by_round()}")
+    if team.execution_cache is not None:
+        print(f"Execution cache: {team.execution_cache.stats()}")
+    if team.fan_out is not None:
+        print(f"Review/test fan-out: {team.fan_out.stats()}")
+    if team.speculation is not None:
+        print(f"Speculative execution: {team.speculation.stats()}")
+    if team.artifacts is not None:
+        artifacts = team.artifacts.stats()
+        print(f"Artifact store: {artifacts['references']} code blocks/outputs referenced, "
+              f"{artifacts['referenced_chars']} characters kept out of messages; {artifacts}")
+    if team.completion is not None:
+        print(f"Early termination: {team.completion.stats(team.groupchat.max_round)}")
+    if team.tokens is not None:
+        tokens = team.tokens.stats()
+        print(f"Token accounting: {tokens['total_tokens']} tokens ({tokens['prompt_tokens']} prompt, "
+              f"{tokens['completion_tokens']} completion) over {tokens['calls']} LLM calls; "
+              f"per agent: { {name: a['total_tokens'] for name, a in tokens['agents'].items()} }")
+        if tokens["actions"]:
+            print(f"Token budget actions: {tokens['actions']}")
+    if shared_router() is not None:
+        print(f"Model routing: {shared_router().stats()}")
+    for stats in transport_stats():
+        print(f"Ollama transport: {stats}")
+    if team.tracer is not None:
+        print(f"Trace: {team.tracer.totals()} written to '{team.tracer.write()}'.")
+    if response_cache is not None:
+        print(f"LLM response cache: {response_cache.stats()}")
+        response_cache.close()
+
+    # --- Stop AutoGen Runtime Logging ---
+    autogen.runtime_logging.stop()
+    print(f"AutoGen logging stopped. Query it with: python structured_log.py query --session {logging_session_id}")
+
+    # Clean up the temporary directory if it was used for logs
+    # if 'current_log_dir' in locals():
+    #     current_log_dir.cleanup()
+    #     print(f"Cleaned up temporary log directory: {current_log_dir.name}")
+
+
+if __name__ == "__main__":
+    main()
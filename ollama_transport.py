@@ -0,0 +1,328 @@
+import http.client
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+DEFAULT_HOST = "http://localhost:11434"
+DEFAULT_KEEP_ALIVE = "30m"
+DEFAULT_NUM_PARALLEL = 4
+DEFAULT_TIMEOUT = 600
+CLIENT_CLS_NAME = "PooledOllamaClient"
+OPTION_KEYS = ("temperature", "seed", "top_p", "top_k", "num_predict", "num_ctx", "repeat_penalty", "stop")
+
+
+class OllamaError(RuntimeError):
+    """The Ollama server answered a request with an error."""
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def host_from_entry(entry):
+    """Server root of a config_list entry: 'client_host', or 'base_url' without its '/api' suffix."""
+    host = entry.get("client_host") or entry.get("base_url") or DEFAULT_HOST
+    host = host.rstrip("/")
+    return host[:-len("/api")] if host.endswith("/api") else host
+
+
+class OllamaTransport:
+    """
+    One Ollama server, shared by every agent of the process.
+
+    HTTP/1.1 connections are kept alive and reused from a small pool instead of opening
+    one per request; at most 'parallel' requests are in flight at once, matching the
+    server's OLLAMA_NUM_PARALLEL slots so extra requests queue here rather than on the
+    server. Every request carries 'keep_alive' so the model stays resident between turns.
+
+    Chats are always streamed from the server, which lets the transport measure the
+    first-token latency of every request; the first request per model is reported
+    separately as the cold start unless warm_up() already loaded the model.
+    """
+
+    def __init__(self, host=DEFAULT_HOST, parallel=DEFAULT_NUM_PARALLEL, keep_alive=DEFAULT_KEEP_ALIVE,
+                 timeout=DEFAULT_TIMEOUT):
+        parts = urlsplit(host if "://" in host else f"http://{host}")
+        self.host = f"{parts.scheme}://{parts.netloc}"
+        self._scheme, self._netloc = parts.scheme, parts.netloc
+        self.parallel = max(1, parallel)
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.parallel)
+        self._lock = threading.Lock()
+        self.connections_opened = 0
+        self.connections_reused = 0
+        self.requests = 0
+        self.errors = 0
+        self.queue_wait = 0.0
+        self.warmups = {}
+        self.cold_start = {}
+        self.first_token = {}
+
+    # --- Connections ---
+    def _connect(self):
+        cls = http.client.HTTPSConnection if self._scheme == "https" else http.client.HTTPConnection
+        with self._lock:
+            self.connections_opened += 1
+        return cls(self._netloc, timeout=self.timeout)
+
+    def _acquire(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect(), False
+        with self._lock:
+            self.connections_reused += 1
+        return conn, True
+
+    def _release(self, conn, response):
+        if response.will_close or self._idle.qsize() >= self.parallel:
+            conn.close()
+        else:
+            self._idle.put(conn)
+
+    def _post(self, path, payload):
+        """Send a POST on a pooled connection; a stale kept-alive connection is retried once on a new one."""
+        body = json.dumps(payload).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        conn, reused = self._acquire()
+        for attempt in (0, 1):
+            try:
+                conn.request("POST", path, body=body, headers=headers)
+                response = conn.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                if not reused or attempt:
+                    raise
+                conn, reused = self._connect(), False
+                continue
+            if response.status >= 400:
+                detail = response.read().decode("utf-8", "replace")
+                conn.close()
+                raise OllamaError(f"Ollama {path} returned HTTP {response.status}: {detail}")
+            return conn, response
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    # --- Requests ---
+    def warm_up(self, model, keep_alive=None):
+        """Load 'model' with an empty generate request; returns wall and server load seconds."""
+        start = time.perf_counter()
+        with self._slots:
+            conn, response = self._post("/api/generate", {
+                "model": model, "prompt": "", "stream": False,
+                "keep_alive": keep_alive if keep_alive is not None else self.keep_alive})
+            payload = json.loads(response.read() or b"{}")
+            self._release(conn, response)
+        result = {"seconds": round(time.perf_counter() - start, 4),
+                  "load_duration": round(payload.get("load_duration", 0) / 1e9, 4)}
+        with self._lock:
+            self.warmups[model] = result
+        return result
+
+    def chat(self, model, messages, options=None, keep_alive=None, on_token=None):
+        """
+        Stream one chat completion and return (text, final server payload, first-token
+        seconds). 'on_token' is called with every content chunk as it arrives.
+        """
+        payload = {"model": model, "messages": messages, "stream": True,
+                   "keep_alive": keep_alive if keep_alive is not None else self.keep_alive}
+        if options:
+            payload["options"] = options
+        queued = time.perf_counter()
+        with self._slots:
+            start = time.perf_counter()
+            first_token = None
+            parts, final = [], {}
+            conn = None
+            try:
+                conn, response = self._post("/api/chat", payload)
+                for line in iter(response.readline, b""):
+                    if not line.strip():
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("error"):
+                        raise OllamaError(f"Ollama error: {chunk['error']}")
+                    content = (chunk.get("message") or {}).get("content") or ""
+                    if content:
+                        if first_token is None:
+                            first_token = time.perf_counter() - start
+                        parts.append(content)
+                        if on_token is not None:
+                            on_token(content)
+                    if chunk.get("done"):
+                        final = chunk
+                        break
+                response.read()
+                self._release(conn, response)
+            except Exception:
+                if conn is not None:
+                    conn.close()
+                with self._lock:
+                    self.errors += 1
+                raise
+        first_token = first_token if first_token is not None else time.perf_counter() - start
+        self._record(model, start - queued, first_token)
+        return "".join(parts), final, first_token
+
+    def _record(self, model, waited, first_token):
+        with self._lock:
+            self.requests += 1
+            self.queue_wait += waited
+            if model not in self.first_token and model not in self.warmups:
+                self.cold_start[model] = round(first_token, 4)
+            self.first_token.setdefault(model, []).append(first_token)
+
+    def stats(self):
+        with self._lock:
+            models = {}
+            for model in set(self.first_token) | set(self.warmups):
+                latencies = self.first_token.get(model, [])
+                p50 = _percentile(latencies, 50)
+                models[model] = {
+                    "requests": len(latencies),
+                    "warm_up": self.warmups.get(model),
+                    "cold_first_token": self.cold_start.get(model),
+                    "first_token": round(latencies[0], 4) if latencies else None,
+                    "first_token_p50": round(p50, 4) if p50 is not None else None,
+                }
+            return {"host": self.host, "parallel": self.parallel, "keep_alive": self.keep_alive,
+                    "requests": self.requests, "errors": self.errors,
+                    "connections_opened": self.connections_opened, "connections_reused": self.connections_reused,
+                    "queue_wait": round(self.queue_wait, 4), "models": models}
+
+
+_transports = {}
+_transports_lock = threading.Lock()
+
+
+def get_transport(host=DEFAULT_HOST):
+    """
+    The process-wide transport for 'host'. OLLAMA_NUM_PARALLEL (the server's parallel
+    slots), OLLAMA_KEEP_ALIVE (e.g. '30m', '-1' to keep models loaded) and
+    OLLAMA_TIMEOUT configure new transports.
+    """
+    host = host_from_entry({"client_host": host})
+    with _transports_lock:
+        if host not in _transports:
+            keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", DEFAULT_KEEP_ALIVE)
+            _transports[host] = OllamaTransport(
+                host,
+                parallel=int(os.getenv("OLLAMA_NUM_PARALLEL", DEFAULT_NUM_PARALLEL)),
+                keep_alive=int(keep_alive) if keep_alive.lstrip("-").isdigit() else keep_alive,
+                timeout=float(os.getenv("OLLAMA_TIMEOUT", DEFAULT_TIMEOUT)),
+            )
+        return _transports[host]
+
+
+def transport_stats():
+    with _transports_lock:
+        transports = list(_transports.values())
+    return [transport.stats() for transport in transports]
+
+
+# --- AutoGen Model Client ---
+def _ollama_message(message):
+    content = message.get("content")
+    if isinstance(content, list):
+        content = "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    role = message.get("role", "user")
+    return {"role": role if role in ("system", "user", "assistant", "tool") else "user", "content": content or ""}
+
+
+class PooledOllamaClient:
+    """
+    AutoGen ModelClient that sends an agent's requests through the shared
+    OllamaTransport of its server. Config entries select it with
+    "model_client_cls": "PooledOllamaClient" (see pooled_llm_config) and agents activate
+    it with register_pooled_clients().
+    """
+
+    def __init__(self, config, **kwargs):
+        self.model = config["model"]
+        self.transport = get_transport(host_from_entry(config))
+        self.keep_alive = config.get("keep_alive")
+
+    def create(self, params):
+        from autogen.io import IOStream
+        from openai.types.chat import ChatCompletion, ChatCompletionMessage
+        from openai.types.chat.chat_completion import Choice
+        from openai.types.completion_usage import CompletionUsage
+
+        options = {k: params[k] for k in OPTION_KEYS if params.get(k) is not None}
+        if params.get("max_tokens") is not None:
+            options.setdefault("num_predict", params["max_tokens"])
+        on_token = None
+        if params.get("stream"):
+            iostream = IOStream.get_default()
+            on_token = lambda token: iostream.print(token, end="", flush=True)  # noqa: E731
+        model = params.get("model") or self.model
+        text, final, _ = self.transport.chat(model, [_ollama_message(m) for m in params["messages"]],
+                                             options=options, keep_alive=self.keep_alive, on_token=on_token)
+        prompt_tokens = final.get("prompt_eval_count", 0) or 0
+        completion_tokens = final.get("eval_count", 0) or 0
+        return ChatCompletion(
+            id=f"ollama-{uuid.uuid4().hex[:12]}", model=model, created=int(time.time()), object="chat.completion",
+            choices=[Choice(index=0, finish_reason="length" if final.get("done_reason") == "length" else "stop",
+                            message=ChatCompletionMessage(role="assistant", content=text))],
+            usage=CompletionUsage(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                                  total_tokens=prompt_tokens + completion_tokens),
+        )
+
+    def message_retrieval(self, response):
+        return [choice.message for choice in response.choices]
+
+    def cost(self, response):
+        return 0.0
+
+    @staticmethod
+    def get_usage(response):
+        return {"prompt_tokens": response.usage.prompt_tokens, "completion_tokens": response.usage.completion_tokens,
+                "total_tokens": response.usage.total_tokens, "cost": 0.0, "model": response.model}
+
+
+# --- Wiring ---
+def pooled_llm_config(llm_config):
+    """Copy of 'llm_config' whose Ollama entries use PooledOllamaClient (set OLLAMA_POOLING=0 to disable)."""
+    if not llm_config or os.getenv("OLLAMA_POOLING", "1").lower() in ("0", "false", "no"):
+        return llm_config
+    config_list = [
+        {**entry, "model_client_cls": CLIENT_CLS_NAME, "client_host": host_from_entry(entry)}
+        if entry.get("api_type") == "ollama" else entry
+        for entry in llm_config.get("config_list", [])
+    ]
+    return {**llm_config, "config_list": config_list}
+
+
+def uses_pooled_client(config_list):
+    return any(entry.get("model_client_cls") == CLIENT_CLS_NAME for entry in config_list or [])
+
+
+def register_pooled_clients(targets):
+    """Activate PooledOllamaClient on agents (or OpenAIWrappers) whose config_list selects it."""
+    for target in targets:
+        client = getattr(target, "client", target)
+        if client is not None and uses_pooled_client(getattr(client, "_config_list", None)):
+            target.register_model_client(model_client_cls=PooledOllamaClient)
+
+
+def warm_up_models(llm_config):
+    """Preload every Ollama model of 'llm_config' on its server; returns {model: warm-up result}."""
+    results = {}
+    for entry in (llm_config or {}).get("config_list", []):
+        if entry.get("api_type") == "ollama" or entry.get("model_client_cls") == CLIENT_CLS_NAME:
+            results[entry["model"]] = get_transport(host_from_entry(entry)).warm_up(entry["model"])
+    return results
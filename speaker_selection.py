@@ -0,0 +1,192 @@
+import re
+
+# --- Message content helpers (shared by the selection guards) ---
+CODE_BLOCK_RE = re.compile(r"```[ \t]*([\w+-]*)[^\n]*\n(.*?)```", re.DOTALL)
+EXIT_CODE_RE = re.compile(r"exitcode:\s*(-?\d+)")
+# The Reviewer's approval phrase ("Looks good!" / "Looks good! Code review complete."), as a whole line.
+APPROVAL_RE = re.compile(r"[\W_]*(?:looks good[!.]*(?:\s+code review complete)?|code review complete)[\W_]*",
+                         re.IGNORECASE)
+CHANGE_REQUEST_RE = re.compile(r"\b(?:but|however|please|should|must|needs?|change|fix|missing|handle|consider|"
+                               r"instead|issue|bug|incorrect|wrong|suggest\w*|improve\w*)\b", re.IGNORECASE)
+
+
+def message_text(message):
+    """Return the textual content of an AutoGen message dict (or plain string)."""
+    if isinstance(message, str):
+        return message
+    content = (message or {}).get("content", "")
+    if isinstance(content, dict) and "message" in content:
+        content = content["message"]
+    if content is None:
+        return ""
+    return content if isinstance(content, str) else str(content)
+
+
+def has_code_block(content):
+    return CODE_BLOCK_RE.search(content or "") is not None
+
+
+def is_approval(content):
+    """
+    True when a Reviewer message is an approval: one line is exactly the approval phrase
+    and nothing else in the message (no code, no other line) asks for a change.
+    """
+    if has_code_block(content):
+        return False
+    lines = [line.strip() for line in (content or "").splitlines() if line.strip()]
+    approvals = [line for line in lines if APPROVAL_RE.fullmatch(line)]
+    return bool(approvals) and not any(CHANGE_REQUEST_RE.search(line) for line in lines if line not in approvals)
+
+
+def execution_exit_code(content):
+    """Exit code reported by a code execution reply, or None if the message is not one."""
+    match = EXIT_CODE_RE.search(content or "")
+    return int(match.group(1)) if match else None
+
+
+class SelectionContext:
+    """
+    The state a transition guard can look at: the message that was just posted, its
+    speaker and the full group chat transcript.
+    """
+
+    def __init__(self, speaker_name, messages):
+        self.speaker = speaker_name
+        self.messages = messages
+        self.message = messages[-1] if messages else {}
+        self.content = message_text(self.message)
+
+    @property
+    def is_task(self):
+        """The last message is the task that opened the conversation."""
+        return len(self.messages) <= 1
+
+    def last_code_author(self, authors, before_last=True):
+        """Name of the most recent agent among ``authors`` that posted a code block."""
+        history = self.messages[:-1] if before_last else self.messages
+        for message in reversed(history):
+            if message.get("name") in authors and has_code_block(message_text(message)):
+                return message.get("name")
+        return None
+
+    def approved_code_from(self, author, reviewer):
+        """True if ``reviewer`` approved the latest code block posted by ``author``."""
+        approved = False
+        for message in reversed(self.messages):
+            name = message.get("name")
+            if name == author and has_code_block(message_text(message)):
+                return approved
+            if name == reviewer and is_approval(message_text(message)):
+                approved = True
+        return False
+
+
+class Transition:
+    """
+    One edge of the speaker graph: after ``source`` speaks, hand over to ``target``
+    when ``guard(ctx)`` holds. ``target`` is an agent name or a callable returning one.
+    """
+
+    def __init__(self, source, target, guard=None, description=""):
+        self.source = source
+        self.target = target
+        self.guard = guard
+        self.description = description
+
+    def matches(self, ctx):
+        return ctx.speaker == self.source and (self.guard is None or bool(self.guard(ctx)))
+
+    def resolve(self, ctx):
+        return self.target(ctx) if callable(self.target) else self.target
+
+
+class StateMachineSpeakerSelector:
+    """
+    Deterministic speaker selection for ``autogen.GroupChat(speaker_selection_method=...)``.
+
+    Transitions are evaluated in declaration order and the first matching one picks the
+    next speaker without any LLM call. When no transition matches (an ambiguous state,
+    e.g. a failing test run or a clarifying question) the selector returns
+    ``fallback`` ("auto" by default) so the GroupChatManager asks the LLM as before.
+    """
+
+    def __init__(self, transitions, fallback="auto"):
+        self.transitions = list(transitions)
+        self.fallback = fallback
+        self.deterministic = 0
+        self.fallbacks = 0
+        self.history = []
+
+    def __call__(self, last_speaker, groupchat):
+        ctx = SelectionContext(last_speaker.name, groupchat.messages)
+        for transition in self.transitions:
+            if not transition.matches(ctx):
+                continue
+            target = transition.resolve(ctx)
+            if target is None:
+                continue
+            try:
+                agent = groupchat.agent_by_name(target)
+            except (KeyError, ValueError):
+                agent = None
+            if agent is not None:
+                self.deterministic += 1
+                self.history.append((ctx.speaker, agent.name, transition.description))
+                return agent
+        self.fallbacks += 1
+        self.history.append((ctx.speaker, self.fallback, "fallback"))
+        return self.fallback
+
+    @property
+    def manager_calls_avoided(self):
+        """Every deterministic pick is one GroupChatManager LLM round trip saved."""
+        return self.deterministic
+
+    def stats(self):
+        total = self.deterministic + self.fallbacks
+        return {
+            "selections": total,
+            "deterministic": self.deterministic,
+            "llm_fallbacks": self.fallbacks,
+            "manager_calls_avoided": self.manager_calls_avoided,
+            "avoided_ratio": self.deterministic / total if total else 0.0,
+        }
+
+    def reset(self):
+        self.deterministic = 0
+        self.fallbacks = 0
+        self.history = []
+
+
+def pipeline_transitions(admin="Admin", coder="Coder", reviewer="Reviewer", test_engineer="Test_Engineer"):
+    """
+    The Coder -> Reviewer -> Test_Engineer -> Reviewer -> Admin -> Coder pipeline
+    used by the entry points, expressed as guarded transitions.
+    """
+    authors = (coder, test_engineer)
+
+    def reviewed_author(ctx):
+        return ctx.last_code_author(authors)
+
+    def tests_approved(ctx):
+        return ctx.approved_code_from(test_engineer, reviewer)
+
+    return [
+        # Admin opens with the task, or reports a successful execution.
+        Transition(admin, coder, lambda ctx: ctx.is_task, "task -> Coder"),
+        Transition(admin, coder, lambda ctx: execution_exit_code(ctx.content) == 0, "execution ok -> Coder"),
+        # Any new code goes to the Reviewer first.
+        Transition(coder, reviewer, lambda ctx: has_code_block(ctx.content), "code -> Reviewer"),
+        Transition(test_engineer, reviewer, lambda ctx: has_code_block(ctx.content), "tests -> Reviewer"),
+        # Approved application code: tests are written next, or run if they already exist.
+        Transition(reviewer, test_engineer,
+                   lambda ctx: is_approval(ctx.content) and reviewed_author(ctx) == coder and not tests_approved(ctx),
+                   "code approved -> Test_Engineer"),
+        Transition(reviewer, admin,
+                   lambda ctx: is_approval(ctx.content) and reviewed_author(ctx) is not None,
+                   "approved -> Admin executes"),
+        # Changes requested: back to whoever wrote the code under review.
+        Transition(reviewer, reviewed_author,
+                   lambda ctx: not is_approval(ctx.content) and reviewed_author(ctx) is not None,
+                   "changes requested -> author"),
+    ]
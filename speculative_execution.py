@@ -0,0 +1,239 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from checkpoint import ArtifactManifest
+from execution_cache import WorkDirFingerprint
+from speaker_selection import has_code_block, message_text
+
+
+def _blocks_key(code_blocks):
+    return tuple((b.language, b.code) for b in code_blocks)
+
+
+def _mirror(src, dst):
+    """Make 'dst' an exact copy of the artifacts under 'src', copying only changed files."""
+    wanted = set()
+    for rel, path in ArtifactManifest(src).walk():
+        wanted.add(rel)
+        target = os.path.join(dst, *rel.split("/"))
+        try:
+            st, dt = os.stat(path), os.stat(target) if os.path.exists(target) else None
+            if dt is not None and (dt.st_size, dt.st_mtime_ns) == (st.st_size, st.st_mtime_ns):
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copy2(path, target)
+        except OSError:
+            continue
+    for rel, path in list(ArtifactManifest(dst).walk()):
+        if rel not in wanted:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class Speculation:
+    """One code message run ahead of time in the sandbox."""
+
+    def __init__(self, author, code_blocks, future):
+        self.author = author
+        self.key = _blocks_key(code_blocks)
+        self.future = future
+
+
+class SpeculativeExecution:
+    """
+    Runs code blocks in a sandbox copy of the work dir while the Reviewer reviews them.
+
+    When the Reviewer starts on a code message from one of the code authors, its blocks
+    are run on a background thread in a private sandbox: the work dir is mirrored into
+    it, and the team's usual executor stack (warm pool, incremental tests) runs there.
+    When an executing agent later runs exactly those blocks and the work dir still
+    holds the files the sandbox started from, the finished result is returned (waiting
+    for it if needed) and the files the run created or changed are copied back, instead
+    of running the code again. A revision from the same author discards the pending
+    run, as does a change to the work dir in between; both fall back to running the
+    code normally, so the transcript is the same either way, only earlier.
+    """
+
+    def __init__(self, work_dir, timeout=None, authors=("Coder", "Test_Engineer")):
+        self.work_dir = os.path.abspath(work_dir)
+        self.timeout = timeout
+        self.authors = tuple(authors)
+        self.groupchat = None
+        self.extractor = None
+        self.fingerprint = WorkDirFingerprint([self.work_dir])
+        self._pending = {}  # author -> Speculation
+        self._sandbox = None
+        self._executor = None
+        self._worker = None
+        self._lock = threading.Lock()
+        self.launched = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.discarded = 0
+        self.failed = 0
+        self.time_saved = 0.0
+
+    def wrap(self, executor):
+        """The executor an agent uses: answers from finished speculations, else runs 'executor'."""
+        self.extractor = self.extractor or executor.code_extractor
+        return SpeculativeCodeExecutor(executor, self)
+
+    def attach(self, groupchat, reviewer):
+        import autogen
+
+        self.groupchat = groupchat
+        reviewer.register_reply([autogen.Agent, None], reply_func=self._launch)
+        return self
+
+    # --- Launch ---
+    def _launch(self, recipient, messages, sender, config):
+        last = self.groupchat.messages[-1] if self.groupchat and self.groupchat.messages else {}
+        author, content = last.get("name"), message_text(last)
+        if author not in self.authors or not has_code_block(content) or self.extractor is None:
+            return False, None
+        code_blocks = self.extractor.extract_code_blocks(content)
+        if not code_blocks:
+            return False, None
+        with self._lock:
+            pending = self._pending.get(author)
+            if pending is not None and pending.key == _blocks_key(code_blocks):
+                return False, None
+            if pending is not None:
+                pending.future.cancel()
+                self.discarded += 1
+            if self._worker is None:
+                # One worker: speculations share the sandbox and run one after the other.
+                self._worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="speculative-exec")
+            self._pending[author] = Speculation(author, code_blocks, self._worker.submit(self._run, code_blocks))
+            self.launched += 1
+        return False, None
+
+    def _sandbox_executor(self):
+        if self._executor is None:
+            from code_execution import build_code_execution_config
+
+            self._sandbox = tempfile.mkdtemp(prefix="speculative-")
+            self._executor = build_code_execution_config(self._sandbox, timeout=self.timeout)["executor"]
+        return self._executor
+
+    def _run(self, code_blocks):
+        """(result, work dir fingerprint it ran against, {file: new bytes or None}, start and finish time)."""
+        started = time.perf_counter()
+        executor = self._sandbox_executor()
+        state = self.fingerprint.compute()
+        _mirror(self.work_dir, self._sandbox)
+        manifest = ArtifactManifest(self._sandbox)
+        manifest.scan()
+        result = executor.execute_code_blocks(code_blocks)
+        # Read now: the next speculation re-mirrors the sandbox before this one is taken.
+        changes = {rel: None if entry is None else _read(os.path.join(self._sandbox, *rel.split("/")))
+                   for rel, entry in manifest.scan().items()}
+        # Paths in tracebacks and the code file should name the real work dir.
+        sandbox = os.path.realpath(self._sandbox)
+        result.output = result.output.replace(sandbox, self.work_dir).replace(self._sandbox, self.work_dir)
+        if result.code_file:
+            result.code_file = result.code_file.replace(sandbox, self.work_dir).replace(self._sandbox, self.work_dir)
+        return result, state, changes, started, time.perf_counter()
+
+    # --- Join ---
+    def take(self, code_blocks):
+        """The finished result of a speculation of 'code_blocks' still valid for the work dir, else None."""
+        key = _blocks_key(code_blocks)
+        with self._lock:
+            speculation = next((s for s in self._pending.values() if s.key == key), None)
+            if speculation is None:
+                self.misses += 1
+                return None
+            del self._pending[speculation.author]
+        wait_start = time.perf_counter()
+        try:
+            result, state, changes, started, finished = speculation.future.result()
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            return None
+        waited = time.perf_counter() - wait_start
+        if state != self.fingerprint.compute():
+            with self._lock:
+                self.stale += 1
+            return None
+        self._apply(changes)
+        with self._lock:
+            self.hits += 1
+            # The run's duration, minus what was still left of it when the code was due.
+            self.time_saved += max(0.0, (finished - started) - waited)
+        return result
+
+    def _apply(self, changes):
+        for rel, data in changes.items():
+            target = os.path.join(self.work_dir, *rel.split("/"))
+            if data is None:
+                try:
+                    os.remove(target)
+                except OSError:
+                    pass
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, "wb") as f:
+                f.write(data)
+
+    def stats(self):
+        with self._lock:
+            return {"launched": self.launched, "hits": self.hits, "misses": self.misses, "stale": self.stale,
+                    "discarded": self.discarded, "failed": self.failed,
+                    "hit_rate": round(self.hits / self.launched, 3) if self.launched else 0.0,
+                    "time_saved": round(self.time_saved, 4)}
+
+    def close(self):
+        """Drop pending speculations and the sandbox; a later launch starts a new one."""
+        with self._lock:
+            for speculation in self._pending.values():
+                speculation.future.cancel()
+            self._pending.clear()
+            worker, self._worker = self._worker, None
+        if worker is not None:
+            worker.shutdown(wait=True)
+        if self._sandbox is not None:
+            from code_execution import close_pool
+
+            close_pool(self._sandbox)
+            shutil.rmtree(self._sandbox, ignore_errors=True)
+            self._sandbox = self._executor = None
+
+
+class SpeculativeCodeExecutor:
+    """AutoGen CodeExecutor that takes finished speculative runs before running code itself."""
+
+    def __init__(self, executor, speculation):
+        self.executor = executor
+        self.speculation = speculation
+
+    @property
+    def code_extractor(self):
+        return self.executor.code_extractor
+
+    def execute_code_blocks(self, code_blocks):
+        result = self.speculation.take(code_blocks)
+        return result if result is not None else self.executor.execute_code_blocks(code_blocks)
+
+    def restart(self):
+        self.executor.restart()
+
+
+def speculative_execution_from_env(work_dir, timeout=None):
+    """A SpeculativeExecution for 'work_dir' when SPECULATIVE_EXECUTION=1 (it is off by default)."""
+    if os.getenv("SPECULATIVE_EXECUTION", "0").lower() not in ("1", "true", "yes"):
+        return None
+    return SpeculativeExecution(work_dir, timeout=timeout)
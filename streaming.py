@@ -0,0 +1,91 @@
+import sys
+
+from speaker_selection import message_text
+
+
+class ConversationStream:
+    """
+    Collects a running group chat as it happens and forwards it to a view.
+
+    An instance plays two roles at once:
+
+    * it is an AutoGen ``IOStream`` (``print``/``input``/``send``), installed with
+      ``IOStream.set_default(stream)`` around ``initiate_chat``. With ``"stream": True``
+      in the llm_config, AutoGen prints every completion chunk with ``end=""``; those
+      chunks are forwarded to the view as tokens of the message being generated.
+    * it is the target of the message logger reply function (``message_received``),
+      which AutoGen calls right before an agent generates its reply. That is the point
+      where the previous message is final and the next speaker starts streaming.
+
+    A view is any object with ``on_start(speaker)``, ``on_tokens(text)`` and
+    ``on_message(sender, recipient, content)`` methods.
+
+    Messages whose code or output was moved to an artifact_store.ArtifactStore (set as
+    ``artifacts``) reach the view materialized.
+    """
+
+    def __init__(self, view=None, echo=False):
+        self.view = view
+        self.echo = echo
+        self.artifacts = None
+        self._pending_speaker = None
+        self._streaming_speaker = None
+        # Messages reported in this run; finish() compares it with how many the chat posted.
+        self._received = 0
+
+    def attach(self, view):
+        """Point the stream at a new view and forget any half-streamed message."""
+        self.view = view
+        self._pending_speaker = None
+        self._streaming_speaker = None
+
+    # --- AutoGen IOStream protocol ---
+    def print(self, *objects, sep=" ", end="\n", flush=False):
+        if end == "" and self._pending_speaker is not None and self.view is not None:
+            # A completion chunk: open the speaker's block on the first token only.
+            if self._streaming_speaker is None:
+                self._streaming_speaker = self._pending_speaker
+                self.view.on_start(self._streaming_speaker)
+            self.view.on_tokens(sep.join(str(obj) for obj in objects))
+        elif self.echo:
+            print(*objects, sep=sep, end=end, flush=flush, file=sys.stdout)
+
+    def input(self, prompt="", *, password=False):
+        # Conversations driven from a stream are headless: an empty reply lets the
+        # agent fall back to its automatic reply.
+        return ""
+
+    def send(self, message):
+        """Newer AutoGen releases emit event objects instead of calling print()."""
+        content = getattr(message, "content", None)
+        if type(message).__name__.startswith("Stream") and isinstance(content, str):
+            self.print(content, end="")
+        elif hasattr(message, "print"):
+            message.print(self.print)
+
+    # --- Transcript events ---
+    def message_received(self, sender, recipient, content):
+        """
+        ``sender``'s message is complete and ``recipient`` is about to reply. Finalize
+        the streamed block (or emit a fresh one for non-streamed messages such as code
+        execution output) and remember who streams next.
+        """
+        if self.artifacts is not None:
+            content = self.artifacts.materialize(content)
+        if self.view is not None:
+            self.view.on_message(sender, recipient, content)
+        self._received += 1
+        self._streaming_speaker = None
+        self._pending_speaker = recipient
+
+    def finish(self, final_message, posted=None):
+        """
+        Flush the last message of the chat, which no agent ever replies to. 'posted' is
+        how many messages the chat posted while streamed; when every one of them was
+        already reported (the chat ended on a reply that was never posted), nothing is
+        flushed.
+        """
+        if final_message and (posted is None or posted > self._received):
+            self.message_received(final_message.get("name", self._pending_speaker), None, message_text(final_message))
+        self._pending_speaker = None
+        self._received = 0
@@ -0,0 +1,350 @@
+import argparse
+import gzip
+import json
+import logging
+import os
+import queue
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+
+try:
+    from autogen.logger.base_logger import BaseLogger
+except ImportError:  # The query CLI works without AutoGen installed.
+    BaseLogger = object
+
+from artifact_store import ArtifactStore, artifact_store_from_env
+
+DEFAULT_LOG_DIR = os.path.join("logs", "runtime")
+DEFAULT_SEGMENT_MB = 16
+INDEX_FILE = "index.sqlite"
+ARTIFACT_DIR = "artifacts"
+SECRET_KEYS = ("api_key", "authorization", "password", "token")
+_STOP = object()
+
+logger = logging.getLogger(__name__)
+
+
+# --- Serialization ---
+def _jsonable(value):
+    """json.dumps fallback for AutoGen/OpenAI objects: pydantic models, agents, clients."""
+    if hasattr(value, "model_dump"):
+        try:
+            return value.model_dump()
+        except Exception:
+            pass
+    if hasattr(value, "name") and isinstance(getattr(value, "name"), str):
+        return {"type": type(value).__name__, "name": value.name}
+    return repr(value)
+
+
+def _redact(value):
+    if isinstance(value, dict):
+        return {k: "***" if any(s in str(k).lower() for s in SECRET_KEYS) else _redact(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_redact(v) for v in value]
+    return value
+
+
+def _source_name(source):
+    if isinstance(source, str):
+        return source
+    return getattr(source, "name", None) or type(source).__name__
+
+
+# --- Segmented JSONL Store ---
+class SegmentedLog:
+    """
+    Append-only JSONL segments with an SQLite index.
+
+    write() redacts and serializes a record on the caller's thread, because AutoGen keeps
+    changing the request and message objects it logs. One background thread writes the
+    lines in batches, so callers never wait for disk I/O. A record that cannot be encoded
+    or written is counted in 'dropped' and logged, and the writer goes on. A segment is
+    closed once it exceeds 'max_segment_bytes' and then gzip-compressed; the index maps
+    session id, agent, round and event type to (segment, line) for every record.
+    """
+
+    def __init__(self, log_dir=DEFAULT_LOG_DIR, max_segment_bytes=DEFAULT_SEGMENT_MB * 1024 * 1024,
+                 compress=True, flush_interval=0.5):
+        self.log_dir = log_dir
+        self.max_segment_bytes = max_segment_bytes
+        self.compress = compress
+        self.flush_interval = flush_interval
+        os.makedirs(log_dir, exist_ok=True)
+        self._queue = queue.Queue()
+        self._segment = None
+        self._file = None
+        self._lines = 0
+        self._lock = threading.Lock()
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._writer, name="structured-log-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, record):
+        try:
+            line = json.dumps({**record, "data": _redact(record.get("data"))}, default=_jsonable, ensure_ascii=False)
+        except Exception:
+            self._drop(record.get("event_type"))
+            return
+        key = (record.get("session_id"), record.get("agent"), record.get("round"), record.get("event_type"))
+        self._queue.put((line, key, record.get("ts")))
+
+    def _drop(self, event_type):
+        with self._lock:
+            self.dropped += 1
+        logger.exception("Dropped a runtime log record (%s).", event_type)
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    # --- Writer thread ---
+    def _writer(self):
+        db = sqlite3.connect(os.path.join(self.log_dir, INDEX_FILE))
+        _create_index(db)
+        running = True
+        while running:
+            batch = []
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+                while True:
+                    if item is _STOP:
+                        running = False
+                        break
+                    batch.append(item)
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            if batch:
+                self._write_batch(db, batch)
+        if self._file:
+            try:
+                self._close_segment(db)
+            except Exception:
+                logger.exception("Could not close runtime log segment %s.", self._segment)
+        db.close()
+
+    def _write_batch(self, db, batch):
+        rows = []
+        for line, key, ts in batch:
+            # One bad record (or a failing disk/index write) must not stop the writer thread.
+            try:
+                if self._file is None:
+                    self._open_segment(db)
+                self._file.write(line + "\n")
+                rows.append((*key, self._segment, self._lines, ts))
+                self._lines += 1
+                if self._file.tell() >= self.max_segment_bytes:
+                    self._flush_index(db, rows)
+                    rows = []
+                    self._close_segment(db)
+            except Exception:
+                self._drop(key[3])
+        if self._file is not None:
+            try:
+                self._flush_index(db, rows)
+            except Exception:
+                logger.exception("Could not index %d runtime log records.", len(rows))
+
+    def _flush_index(self, db, rows):
+        self._file.flush()
+        with db:
+            db.executemany("INSERT INTO events VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            db.execute("UPDATE segments SET records = ?, bytes = ? WHERE name = ?",
+                       (self._lines, self._file.tell(), self._segment))
+
+    def _open_segment(self, db):
+        self._segment = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        self._file = open(os.path.join(self.log_dir, f"{self._segment}.jsonl"), "a", encoding="utf-8")
+        self._lines = 0
+        with db:
+            db.execute("INSERT INTO segments VALUES (?, 0, 0, 0)", (self._segment,))
+
+    def _close_segment(self, db):
+        self._file.close()
+        self._file = None
+        if self.compress:
+            path = os.path.join(self.log_dir, f"{self._segment}.jsonl")
+            with open(path, "rb") as src, gzip.open(path + ".gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(path)
+            with db:
+                db.execute("UPDATE segments SET compressed = 1 WHERE name = ?", (self._segment,))
+        self._segment = None
+
+
+def _create_index(db):
+    with db:
+        db.execute("CREATE TABLE IF NOT EXISTS segments (name TEXT PRIMARY KEY, records INTEGER, bytes INTEGER, compressed INTEGER)")
+        db.execute("CREATE TABLE IF NOT EXISTS events (session_id TEXT, agent TEXT, round INTEGER, event_type TEXT, segment TEXT, line INTEGER, ts REAL)")
+        db.execute("CREATE INDEX IF NOT EXISTS events_session ON events (session_id, round)")
+        db.execute("CREATE INDEX IF NOT EXISTS events_agent ON events (agent, event_type)")
+
+
+# --- AutoGen Runtime Logger ---
+class StructuredRuntimeLogger(BaseLogger):
+    """
+    AutoGen runtime logger writing to a SegmentedLog; pass it to
+    autogen.runtime_logging.start(logger=...). Every record carries the session id, the
+    agent and the group chat round, counted as messages received by 'manager_name'.
+
+    Every chat completion request resends the whole conversation, so with 'artifacts'
+    (an artifact_store.ArtifactStore) the code blocks and outputs in logged messages are
+    written once to the store and logged as references; query --materialize expands them.
+    """
+
+    def __init__(self, log=None, manager_name="chat_manager", artifacts=None):
+        self.log = log or SegmentedLog()
+        self.manager_name = manager_name
+        self.artifacts = artifacts
+        self.session_id = None
+        self.round = 0
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        log_dir = os.getenv("RUNTIME_LOG_DIR", DEFAULT_LOG_DIR)
+        return cls(SegmentedLog(
+            log_dir=log_dir,
+            max_segment_bytes=int(float(os.getenv("RUNTIME_LOG_SEGMENT_MB", DEFAULT_SEGMENT_MB)) * 1024 * 1024),
+            compress=os.getenv("RUNTIME_LOG_COMPRESS", "1").lower() not in ("0", "false", "no"),
+        ), artifacts=artifact_store_from_env(os.path.join(log_dir, ARTIFACT_DIR)))
+
+    def _reference(self, messages):
+        if self.artifacts is None or not isinstance(messages, list):
+            return messages
+        return self.artifacts.reference_messages(messages)
+
+    def _record(self, event_type, agent, data):
+        with self._lock:
+            self._seq += 1
+            record = {"ts": time.time(), "session_id": self.session_id, "seq": self._seq,
+                      "event_type": event_type, "agent": agent, "round": self.round, "data": data}
+        self.log.write(record)
+
+    # --- BaseLogger ---
+    def start(self):
+        self.session_id = str(uuid.uuid4())
+        self._record("session_start", None, {"pid": os.getpid(), "argv": sys.argv})
+        return self.session_id
+
+    def stop(self):
+        self._record("session_stop", None, {"rounds": self.round})
+        self.log.close()
+
+    def get_connection(self):
+        return None
+
+    def log_chat_completion(self, invocation_id, client_id, wrapper_id, source, request, response,
+                            is_cached, cost, start_time, **kwargs):
+        if isinstance(request, dict) and "messages" in request:
+            request = {**request, "messages": self._reference(request["messages"])}
+        self._record("chat_completion", _source_name(source), {
+            "invocation_id": str(invocation_id), "client_id": client_id, "wrapper_id": wrapper_id,
+            "request": request, "response": response, "is_cached": is_cached, "cost": cost,
+            "start_time": start_time, "end_time": time.time(),
+        })
+
+    def log_new_agent(self, agent, init_args=None, **kwargs):
+        self._record("new_agent", _source_name(agent), {"class": type(agent).__name__, "init_args": init_args or {}})
+
+    def log_event(self, source, name, **kwargs):
+        agent = _source_name(source)
+        if name == "received_message" and agent == self.manager_name:
+            with self._lock:
+                self.round += 1
+        if isinstance(kwargs.get("message"), dict):
+            kwargs = {**kwargs, "message": self._reference([kwargs["message"]])[0]}
+        self._record(name, agent, kwargs)
+
+    def log_new_wrapper(self, wrapper, init_args=None, **kwargs):
+        self._record("new_wrapper", None, {"wrapper_id": id(wrapper), "init_args": init_args or {}})
+
+    def log_new_client(self, client, wrapper, init_args=None, **kwargs):
+        self._record("new_client", None, {"client": type(client).__name__, "client_id": id(client),
+                                          "wrapper_id": id(wrapper), "init_args": init_args or {}})
+
+    def log_function_use(self, source, function, args, returns, **kwargs):
+        self._record("function_use", _source_name(source),
+                     {"function": getattr(function, "__name__", repr(function)), "args": args, "returns": returns})
+
+
+# --- Query ---
+def _read_lines(log_dir, segment, compressed, wanted):
+    path = os.path.join(log_dir, f"{segment}.jsonl" + (".gz" if compressed else ""))
+    opener = gzip.open if compressed else open
+    try:
+        with opener(path, "rt", encoding="utf-8") as f:
+            for i, line in enumerate(f):
+                if i in wanted:
+                    yield json.loads(line)
+    except OSError:
+        return
+
+
+def query(log_dir=DEFAULT_LOG_DIR, session=None, agent=None, round=None, event_type=None, limit=None):
+    """Records matching all given filters, in write order; only the matching lines are decoded."""
+    clauses, params = [], []
+    for column, value in (("session_id", session), ("agent", agent), ("round", round), ("event_type", event_type)):
+        if value is not None:
+            clauses.append(f"e.{column} = ?")
+            params.append(value)
+    sql = ("SELECT e.segment, e.line, s.compressed FROM events e JOIN segments s ON s.name = e.segment"
+           + (" WHERE " + " AND ".join(clauses) if clauses else "") + " ORDER BY e.ts, e.segment, e.line")
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+    with sqlite3.connect(os.path.join(log_dir, INDEX_FILE)) as db:
+        rows = db.execute(sql, params).fetchall()
+    by_segment = {}
+    for segment, line, compressed in rows:
+        by_segment.setdefault((segment, compressed), set()).add(line)
+    records = []
+    for (segment, compressed), lines in by_segment.items():
+        records.extend(_read_lines(log_dir, segment, compressed, lines))
+    return sorted(records, key=lambda r: (r.get("ts") or 0, r.get("seq") or 0))
+
+
+def sessions(log_dir=DEFAULT_LOG_DIR):
+    with sqlite3.connect(os.path.join(log_dir, INDEX_FILE)) as db:
+        return db.execute(
+            "SELECT session_id, MIN(ts), MAX(ts), MAX(round), COUNT(*) FROM events "
+            "GROUP BY session_id ORDER BY MIN(ts)").fetchall()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the structured AutoGen runtime log.")
+    parser.add_argument("--log-dir", default=os.getenv("RUNTIME_LOG_DIR", DEFAULT_LOG_DIR))
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("sessions", help="list logged sessions")
+    q = commands.add_parser("query", help="print matching records as JSON lines")
+    q.add_argument("--session")
+    q.add_argument("--agent")
+    q.add_argument("--round", type=int)
+    q.add_argument("--type", dest="event_type", help="e.g. chat_completion, received_message, new_agent")
+    q.add_argument("--limit", type=int)
+    q.add_argument("--materialize", action="store_true", help="expand artifact references in the records")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(os.path.join(args.log_dir, INDEX_FILE)):
+        print(f"No runtime log index in '{args.log_dir}'.", file=sys.stderr)
+        return 1
+    if args.command == "sessions":
+        for session_id, first, last, rounds, count in sessions(args.log_dir):
+            started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(first))
+            print(f"{session_id}  {started}  {last - first:8.1f}s  {rounds or 0:3d} rounds  {count:6d} records")
+    else:
+        artifacts = ArtifactStore(os.path.join(args.log_dir, ARTIFACT_DIR)) if args.materialize else None
+        for record in query(args.log_dir, args.session, args.agent, args.round, args.event_type, args.limit):
+            if artifacts is not None:
+                record = artifacts.materialize_value(record)
+            print(json.dumps(record, default=str, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+import asyncio
+import json
+
+import pytest
+
+from api_server import APIServer
+from job_runner import CANCELLED, COMPLETED, RUNNING, Job
+
+
+class FakeRunner:
+    """The parts of a JobRunner APIServer uses; jobs never run."""
+
+    def __init__(self, *jobs):
+        self._jobs = {job.id: job for job in jobs}
+
+    def jobs(self):
+        return list(self._jobs.values())
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def submit(self, prompt, max_round=30, trace=False):
+        job = Job(prompt, max_round=max_round, trace=trace)
+        self._jobs[job.id] = job
+        return job
+
+    def cancel(self, job_id):
+        job = self._jobs[job_id]
+        job.cancel()
+        job.status = CANCELLED
+
+
+def job(job_id, status=RUNNING, messages=()):
+    job = Job("write primes", job_id=job_id)
+    job.status = status
+    for content in messages:
+        job.on_message("Coder", "chat_manager", content)
+    return job
+
+
+async def _request(server, method, path, headers=(), body=b""):
+    listener = await asyncio.start_server(server.handle, "127.0.0.1", 0)
+    async with listener:
+        port = listener.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        head = [f"{method} {path} HTTP/1.1", "Host: localhost", f"Content-Length: {len(body)}", *headers]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), 5)
+        writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), body
+
+
+def request(server, method, path, headers=(), body=b""):
+    """(status, body) of one request over a real socket."""
+    return asyncio.run(_request(server, method, path, headers, body))
+
+
+@pytest.fixture
+def server(tmp_path):
+    return APIServer(FakeRunner(job("running"), job("done", status=COMPLETED)), work_root=str(tmp_path))
+
+
+def test_sessions_are_created_and_listed(server):
+    status, body = request(server, "POST", "/sessions", body=b'{"prompt": "write primes"}')
+    assert status == 201 and json.loads(body)["status"] == "queued"
+    status, body = request(server, "GET", "/sessions")
+    assert status == 200 and len(json.loads(body)) == 3
+
+
+def test_wrong_or_missing_token_is_401(server):
+    server.token = "s3cret"
+    assert request(server, "GET", "/sessions")[0] == 401
+    assert request(server, "GET", "/sessions", ["Authorization: Bearer wrong"])[0] == 401
+    assert request(server, "GET", "/sessions", ["Authorization: Bearer s3cret"])[0] == 200
+
+
+def test_unknown_paths_and_sessions_are_404(server):
+    assert request(server, "GET", "/nothing")[0] == 404
+    assert request(server, "GET", "/sessions/missing")[0] == 404
+    assert request(server, "GET", "/sessions/running/unknown")[0] == 404
+
+
+def test_wrong_methods_are_405(server):
+    assert request(server, "PUT", "/sessions")[0] == 405
+    assert request(server, "POST", "/sessions/running/events")[0] == 405
+
+
+def test_cancelling_a_finished_session_is_409(server):
+    assert request(server, "POST", "/sessions/done/cancel")[0] == 409
+    assert request(server, "DELETE", "/sessions/running")[0] == 202
+    assert request(server, "DELETE", "/sessions/running")[0] == 409
+
+
+def test_artifacts_outside_the_work_dir_are_rejected(server, tmp_path):
+    (tmp_path / "running").mkdir()
+    (tmp_path / "running" / "primes.py").write_text("print(2)\n")
+    (tmp_path / "secret.txt").write_text("key\n")
+    assert request(server, "GET", "/sessions/running/artifacts/primes.py") == (200, b"print(2)\n")
+    assert request(server, "GET", "/sessions/running/artifacts/../secret.txt")[0] == 404
+    assert request(server, "GET", "/sessions/running/artifacts/%2E%2E%2Fsecret.txt")[0] == 404
+
+
+def events(body):
+    parsed = []
+    for block in body.decode("utf-8").strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        parsed.append((fields["event"], fields.get("id"), json.loads(fields["data"])))
+    return parsed
+
+
+def test_event_stream_resumes_after_last_event_id(tmp_path):
+    finished = job("chat", status=COMPLETED, messages=["one", "two", "three"])
+    server = APIServer(FakeRunner(finished), work_root=str(tmp_path))
+    status, body = request(server, "GET", "/sessions/chat/events", ["Last-Event-ID: 0"])
+    assert status == 200
+    received = events(body)
+    assert [(event, event_id) for event, event_id, _ in received] == \
+        [("message", "1"), ("message", "2"), ("status", None), ("end", None)]
+    assert [data["message"] for _, _, data in received[:2]] == ["two", "three"]
+    assert received[-1][2]["message_count"] == 3
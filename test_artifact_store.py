@@ -0,0 +1,76 @@
+from types import SimpleNamespace
+
+import pytest
+
+from artifact_store import REF_RE, ArtifactStore
+
+CODE = "".join(f"def f{i}(x):\n    return x + {i}\n\n" for i in range(20))
+
+
+def code_message(code, filename=None):
+    header = f"# filename: {filename}\n" if filename else ""
+    return f"Here is the code:\n```python\n{header}{code}```\nTERMINATE when it passes."
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ArtifactStore(str(tmp_path / "artifacts"), min_chars=100, cache_size=2)
+
+
+def test_large_code_blocks_round_trip_through_a_reference(store):
+    message = code_message(CODE, "calculator.py")
+    referenced = store.reference(message, "Coder")
+    assert len(referenced) < len(message)
+    assert "# filename: calculator.py\n" in referenced and referenced.endswith("TERMINATE when it passes.")
+    assert REF_RE.search(referenced)
+    assert store.materialize(referenced) == message
+
+
+def test_small_content_is_left_alone(store):
+    message = code_message("print(1)\n")
+    assert store.reference(message, "Coder") == message
+
+
+def test_execution_output_keeps_its_exit_code_and_tail(store):
+    output = "exitcode: 1 (execution failed)\nCode output: \n" + "line\n" * 100 + "AssertionError: 2 != 3\n"
+    referenced = store.reference(output)
+    assert referenced.startswith("exitcode: 1 (execution failed)\n")
+    assert referenced.endswith("AssertionError: 2 != 3\n")
+    assert store.materialize(referenced) == output
+
+
+def test_identical_blocks_are_stored_once(store):
+    store.reference(code_message(CODE), "Coder")
+    store.reference(code_message(CODE), "Coder")
+    stats = store.stats()
+    assert (stats["objects"], stats["dedup_hits"], stats["references"]) == (1, 1, 2)
+
+
+def test_new_versions_are_stored_as_deltas(store):
+    v1 = store.reference(code_message(CODE, "calculator_v1.py"), "Coder")
+    changed = CODE.replace("return x + 3", "return x - 3")
+    v2 = store.reference(code_message(changed, "calculator_v2.py"), "Coder")
+    assert store.stats()["deltas"] == 1
+    fresh = ArtifactStore(store.root)
+    assert fresh.materialize(v2) == code_message(changed, "calculator_v2.py")
+    assert fresh.materialize(v1) == code_message(CODE, "calculator_v1.py")
+
+
+def test_unknown_references_stay_and_are_counted(store, tmp_path):
+    referenced = store.reference(code_message(CODE), "Coder")
+    other = ArtifactStore(str(tmp_path / "elsewhere"))
+    assert other.materialize(referenced) == referenced
+    assert other.stats()["missing"] == 1
+
+
+def test_attached_chat_stores_references_and_sends_full_text(store):
+    groupchat = SimpleNamespace(messages=[])
+    groupchat.append = lambda message, speaker: groupchat.messages.append(dict(message))
+    sent = []
+    coder = SimpleNamespace(name="Coder", client=SimpleNamespace(create=lambda **params: sent.append(params)))
+    store.attach(groupchat, [coder])
+    message = code_message(CODE, "calculator.py")
+    groupchat.append({"content": message, "name": "Coder"}, coder)
+    assert groupchat.messages[0]["content"] != message
+    coder.client.create(messages=groupchat.messages)
+    assert sent[0]["messages"][0]["content"] == message
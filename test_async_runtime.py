@@ -0,0 +1,155 @@
+import asyncio
+import functools
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from async_runtime import AsyncRuntime
+
+
+class Meter:
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+        self.unbounded = 0
+        self.threads = {}
+        self._lock = threading.Lock()
+
+    def saw(self, name):
+        self.threads.setdefault(name, []).append(threading.get_ident())
+
+
+class FakeAgent:
+    """A ConversableAgent's reply list in AutoGen's order, and how a_generate_reply/generate_reply walk it."""
+
+    def __init__(self, meter, callback=None, hook=None):
+        self.name = "Coder"
+        self.meter = meter
+        self.llm_config = {"config_list": [{"model": "gpt-4"}]}
+        self.requests = []
+        self._reply_func_list = [{"reply_func": FakeAgent.a_generate_oai_reply},
+                                 {"reply_func": FakeAgent.generate_oai_reply}]
+        self._ignore_async_func_in_sync_chat_list = [FakeAgent.a_generate_oai_reply]
+        if callback is not None:
+            self._reply_func_list.insert(0, {"reply_func": callback})
+        self.hook_lists = {"process_all_messages_before_reply": [hook] if hook else []}
+
+    def generate_oai_reply(self, messages=None, sender=None, config=None):
+        meter = self.meter
+        with meter._lock:
+            meter.active += 1
+            meter.peak = max(meter.peak, meter.active)
+        meter.saw("llm")
+        time.sleep(0.05)
+        with meter._lock:
+            meter.active -= 1
+        self.requests.append(messages)
+        return True, "reply"
+
+    async def a_generate_oai_reply(self, messages=None, sender=None, config=None):
+        self.meter.unbounded += 1
+        return await asyncio.get_running_loop().run_in_executor(
+            None, functools.partial(self.generate_oai_reply, messages=messages, sender=sender, config=config))
+
+    def _messages(self, messages):
+        for hook in self.hook_lists["process_all_messages_before_reply"]:
+            messages = hook(messages)
+        return messages
+
+    async def a_generate_reply(self, messages):
+        messages = self._messages(messages)
+        for entry in self._reply_func_list:
+            func = entry["reply_func"]
+            if asyncio.iscoroutinefunction(func):
+                final, reply = await func(self, messages=messages, sender=None, config=None)
+            else:
+                final, reply = func(self, messages=messages, sender=None, config=None)
+            if final:
+                return reply
+
+    def generate_reply(self, messages):
+        unignored = [e["reply_func"] for e in self._reply_func_list if asyncio.iscoroutinefunction(e["reply_func"])
+                     and e["reply_func"] not in self._ignore_async_func_in_sync_chat_list]
+        if unignored:
+            raise RuntimeError("async reply functions in a sync chat")
+        messages = self._messages(messages)
+        for entry in self._reply_func_list:
+            func = entry["reply_func"]
+            if asyncio.iscoroutinefunction(func):
+                continue
+            final, reply = func(self, messages=messages, sender=None, config=None)
+            if final:
+                return reply
+
+
+def team_of(agent):
+    async def a_run(prompt):
+        return await agent.a_generate_reply([{"content": "task"}, {"content": prompt}])
+
+    return SimpleNamespace(agents=[agent], a_run=a_run)
+
+
+@pytest.fixture
+def runtime():
+    runtime = AsyncRuntime(limits={"openai": 2})
+    yield runtime
+    runtime.close()
+
+
+def test_semaphore_limits_concurrent_llm_requests(runtime):
+    meter = Meter()
+    teams = [team_of(FakeAgent(meter)) for _ in range(6)]
+    results = asyncio.run(runtime.run_many([(team, f"task {i}") for i, team in enumerate(teams)]))
+    assert results == ["reply"] * 6
+    assert meter.peak == 2
+    assert meter.unbounded == 0  # AutoGen's a_generate_oai_reply was replaced, not bypassed.
+    stats = runtime.stats()
+    assert stats["calls"]["openai:default"] == 6
+    assert stats["peak_in_flight"]["openai:default"] == 2
+
+
+def test_repo_reply_functions_run_off_the_loop(runtime):
+    meter = Meter()
+
+    def callback(recipient, messages, sender, config):
+        meter.saw("callback")
+        return False, None
+
+    agent = FakeAgent(meter, callback=callback)
+    loop_thread = threading.get_ident()
+    assert asyncio.run(runtime.run(team_of(agent), "task")) == "reply"
+    assert meter.threads["callback"] != [loop_thread]
+    assert runtime.stats()["calls"]["callback"] == 1
+
+
+def test_message_hooks_run_with_the_llm_request(runtime):
+    meter = Meter()
+
+    def hook(messages):
+        meter.saw("hook")
+        return messages[-1:]
+
+    agent = FakeAgent(meter, hook=hook)
+    asyncio.run(runtime.run(team_of(agent), "task"))
+    assert meter.threads["hook"] == meter.threads["llm"]
+    assert meter.threads["hook"] != [threading.get_ident()]
+    assert agent.requests == [[{"content": "task"}]]
+
+
+def test_adapted_agent_still_works_in_sync_chats(runtime):
+    meter = Meter()
+    calls = []
+
+    def callback(recipient, messages, sender, config):
+        calls.append(threading.get_ident())
+        return False, None
+
+    agent = FakeAgent(meter, callback=callback, hook=lambda messages: messages[-1:])
+    runtime.adapt(agent)
+    runtime.adapt(agent)
+    assert len(agent._reply_func_list) == 4
+    assert agent.generate_reply([{"content": "a"}, {"content": "b"}]) == "reply"
+    assert calls == [threading.get_ident()]
+    assert agent.requests == [[{"content": "b"}]]
@@ -0,0 +1,100 @@
+from types import SimpleNamespace
+
+import pytest
+
+import async_runtime
+from checkpoint import CheckpointState, CheckpointWriter, checkpoint_path, find_checkpoint, report_resume
+
+
+class FakeGroupChat:
+    def __init__(self):
+        self.messages = []
+
+    def append(self, message, speaker):
+        self.messages.append({**message, "name": speaker.name})
+
+
+def agent(name):
+    return SimpleNamespace(name=name)
+
+
+@pytest.fixture
+def async_chat():
+    token = async_runtime._in_async_chat.set(True)
+    yield
+    async_runtime._in_async_chat.reset(token)
+
+
+def test_async_chat_rounds_are_written_in_order_on_flush(tmp_path, async_chat):
+    work_dir = tmp_path / "coding"
+    work_dir.mkdir()
+    team = SimpleNamespace(groupchat=FakeGroupChat())
+    writer = CheckpointWriter(str(tmp_path / "chat.jsonl"), work_dir=str(work_dir)).attach(team)
+    writer.start("task")
+    for i in range(5):
+        (work_dir / f"step{i}.py").write_text(f"print({i})\n", encoding="utf-8")
+        team.groupchat.append({"content": f"message {i}"}, agent("Coder"))
+    writer.finish()
+    state = CheckpointState(writer.path)
+    assert [m["content"] for m in state.messages] == [f"message {i}" for i in range(5)]
+    assert state.finished and set(state.manifest) == {f"step{i}.py" for i in range(5)}
+
+
+@pytest.fixture
+def chat(tmp_path):
+    work_dir = tmp_path / "coding"
+    work_dir.mkdir()
+    team = SimpleNamespace(groupchat=FakeGroupChat())
+    writer = CheckpointWriter(checkpoint_path("chat", str(tmp_path)), work_dir=str(work_dir), meta={"setup": "x"})
+    writer.attach(team).start("write primes")
+    return team, writer, work_dir
+
+
+def test_rounds_and_artifacts_are_replayed(chat):
+    team, writer, work_dir = chat
+    team.groupchat.append({"content": "```python\nprint(2)\n```"}, agent("Coder"))
+    (work_dir / "primes.py").write_text("print(2)\n", encoding="utf-8")
+    team.groupchat.append({"content": "exitcode: 0"}, agent("Admin"))
+    state = CheckpointState(writer.path)
+    assert (state.task, state.meta["setup"], state.finished) == ("write primes", "x", None)
+    assert state.speakers == ["Coder", "Admin"] and state.last_speaker == "Admin"
+    assert list(state.manifest) == ["primes.py"]
+    assert state.verify_artifacts() == {}
+
+
+def test_a_torn_last_line_is_ignored_and_cut_on_resume(chat):
+    team, writer, work_dir = chat
+    team.groupchat.append({"content": "one"}, agent("Coder"))
+    with open(writer.path, "a", encoding="utf-8") as f:
+        f.write('{"type": "round", "mess')
+    state = CheckpointState(writer.path)
+    assert state.rounds == 1
+    resumed = SimpleNamespace(groupchat=FakeGroupChat())
+    resumed.groupchat.messages = list(state.messages)
+    CheckpointWriter(writer.path, work_dir=str(work_dir), state=state).attach(resumed)
+    resumed.groupchat.append({"content": "two"}, agent("Reviewer"))
+    assert [m["content"] for m in CheckpointState(writer.path).messages] == ["one", "two"]
+
+
+def test_changed_artifacts_are_reported(chat):
+    team, writer, work_dir = chat
+    (work_dir / "primes.py").write_text("print(2)\n", encoding="utf-8")
+    (work_dir / "test_primes.py").write_text("assert True\n", encoding="utf-8")
+    team.groupchat.append({"content": "saved"}, agent("Admin"))
+    (work_dir / "primes.py").write_text("print(3)\n", encoding="utf-8")
+    (work_dir / "test_primes.py").unlink()
+    state = CheckpointState(writer.path)
+    assert state.verify_artifacts() == {"primes.py": "changed", "test_primes.py": "missing"}
+    assert "primes.py changed, test_primes.py missing" in report_resume(state)
+
+
+def test_latest_finds_the_newest_unfinished_checkpoint(chat, tmp_path):
+    team, writer, _ = chat
+    team.groupchat.append({"content": "one"}, agent("Coder"))
+    done = CheckpointWriter(checkpoint_path("done", str(tmp_path)))
+    done.attach(SimpleNamespace(groupchat=FakeGroupChat())).start("finished task")
+    done.finish()
+    assert find_checkpoint("latest", directory=str(tmp_path)).path == writer.path
+    writer.finish()
+    with pytest.raises(FileNotFoundError):
+        find_checkpoint("latest", directory=str(tmp_path))
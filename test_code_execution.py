@@ -0,0 +1,75 @@
+import os
+import time
+
+import pytest
+
+from code_execution import (ResourceLimits, TIMEOUT_EXIT_CODE, WarmInterpreterPool, close_pool, get_pool)
+
+
+@pytest.fixture
+def pool():
+    pool = WarmInterpreterPool(size=1, acquire_timeout=0.5)
+    yield pool
+    pool.close()
+
+
+def script(tmp_path, name, code):
+    path = tmp_path / name
+    path.write_text(code, encoding="utf-8")
+    return str(path)
+
+
+def test_runs_a_script_in_a_warm_worker(pool, tmp_path):
+    exit_code, output = pool.run(script(tmp_path, "hello.py", "print('hello')\n"), str(tmp_path))
+    assert (exit_code, output) == (0, "hello\n")
+
+
+def test_traceback_shows_only_the_script_frames(pool, tmp_path):
+    path = script(tmp_path, "boom.py", "def f():\n    raise ValueError('boom')\n\nf()\n")
+    exit_code, output = pool.run(path, str(tmp_path))
+    assert exit_code == 1
+    assert "ValueError: boom" in output and "boom.py" in output
+    assert "<frozen" not in output and "runpy" not in output and "code_execution.py" not in output
+
+
+def test_failed_respawn_does_not_block_execution(pool, tmp_path):
+    deadline = time.monotonic() + 30
+    while pool._idle.empty() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    # The only live slot is taken by a worker that never comes back, as after a failed respawn.
+    pool._idle.get_nowait().stop()
+    exit_code, output = pool.run(script(tmp_path, "ok.py", "print('ok')\n"), str(tmp_path))
+    assert (exit_code, output) == (0, "ok\n")
+
+
+def test_input_gets_end_of_file_instead_of_blocking(pool, tmp_path):
+    path = script(tmp_path, "ask.py", "try:\n    input('name? ')\nexcept EOFError:\n    print('no input')\n")
+    started = time.monotonic()
+    exit_code, output = pool.run(path, str(tmp_path), limits=ResourceLimits(wall_seconds=10, output_bytes=None))
+    assert (exit_code, output) == (0, "name? no input\n")
+    assert time.monotonic() - started < 5
+    assert pool.run(script(tmp_path, "ok.py", "print('ok')\n"), str(tmp_path)) == (0, "ok\n")
+
+
+def test_timeout_kills_the_script(pool, tmp_path):
+    path = script(tmp_path, "slow.py", "import time\ntime.sleep(30)\n")
+    exit_code, output = pool.run(path, str(tmp_path), limits=ResourceLimits(wall_seconds=1, output_bytes=None))
+    assert exit_code == TIMEOUT_EXIT_CODE
+    assert "Timeout" in output
+
+
+def test_long_output_keeps_head_and_tail(pool, tmp_path):
+    path = script(tmp_path, "loud.py", "for i in range(5000):\n    print('line', i)\n")
+    exit_code, output = pool.run(path, str(tmp_path), limits=ResourceLimits(wall_seconds=30, output_bytes=1024))
+    assert exit_code == 0
+    assert output.startswith("line 0\n") and output.rstrip().endswith("line 4999")
+    assert "bytes of output omitted" in output
+    assert os.path.exists(path + ".out")
+
+
+def test_close_pool_returns_the_closed_pool(tmp_path):
+    pool = get_pool(str(tmp_path))
+    assert close_pool(str(tmp_path)) is pool and pool._closed
+    assert close_pool(str(tmp_path)) is None
+    assert get_pool(str(tmp_path)) is not pool
+    close_pool(str(tmp_path))
@@ -0,0 +1,81 @@
+import pytest
+
+from artifact_store import REF_RE, ArtifactStore
+from early_termination import CompletionDetector
+
+UNITTEST_OK = ".....\n" + "-" * 70 + "\nRan 5 tests in 0.003s\n\nOK\n"
+
+
+def message(name, content):
+    return {"name": name, "content": content}
+
+
+def code(name, text):
+    return message(name, f"```python\n{text}\n```")
+
+
+def run_output(output, exit_code=0):
+    status = "execution succeeded" if exit_code == 0 else "execution failed"
+    return message("Admin", f"exitcode: {exit_code} ({status})\nCode output: {output}")
+
+
+@pytest.fixture
+def detector():
+    return CompletionDetector(required=("tests_passed",), keyword=None)
+
+
+def test_unittest_ok_reaches_tests_passed(detector):
+    assert not detector(code("Test_Engineer", "import unittest"))
+    assert detector(run_output(UNITTEST_OK))
+    assert detector.reason == "complete" and detector.milestones["tests_passed"] == 2
+
+
+def test_failed_run_is_not_a_pass(detector):
+    assert not detector(run_output(UNITTEST_OK.replace("OK", "FAILED (failures=1)"), exit_code=1))
+    assert detector.milestones["tests_passed"] is None
+
+
+def test_incremental_runner_summaries_reach_tests_passed():
+    ran = ("Incremental test run of test_calc.py: 2 of 2 tests affected by the latest changes.\n"
+           "Ran 2 tests: 2 passed.\n\nOK\n")
+    unaffected = ("Incremental test run of test_calc.py: 0 of 2 tests affected by the latest changes.\n"
+                  "2 unaffected tests passed before and were not re-run.\n\nOK\n")
+    for output in (ran, unaffected):
+        detector = CompletionDetector(required=("tests_passed",), keyword=None)
+        assert detector(run_output(output)), output
+
+
+def test_referenced_output_still_reaches_tests_passed(detector, tmp_path):
+    output = "".join(f"checking case {i}\n" for i in range(200)) + UNITTEST_OK
+    referenced = ArtifactStore(str(tmp_path)).reference(run_output(output)["content"])
+    assert REF_RE.search(referenced) and "checking case 100" not in referenced
+    assert detector(message("Admin", referenced))
+
+
+def test_new_application_code_resets_the_milestones():
+    detector = CompletionDetector(required=("code_approved", "tests_passed"), keyword=None)
+    detector(code("Coder", "def add(a, b): return a + b"))
+    detector(message("Reviewer", "Looks good."))
+    detector(code("Coder", "def add(a, b): return a + b + 0"))
+    assert not detector(run_output(UNITTEST_OK))
+    assert detector.milestones["code_approved"] is None
+
+
+@pytest.mark.parametrize("loop_repeats", [1, 2, 3])
+def test_loop_fires_at_loop_repeats(loop_repeats):
+    detector = CompletionDetector(keyword=None, loop_repeats=loop_repeats)
+    detector(code("Coder", "def add(a, b): return a + b"))
+    repeat = message("Reviewer", "The function looks fine to me, waiting for the tests.")
+    for _ in range(loop_repeats):
+        assert not detector(repeat)
+    assert detector(repeat)
+    assert detector.reason == "loop" and detector.loops == 1
+
+
+def test_new_code_ends_a_loop_streak():
+    detector = CompletionDetector(keyword=None, loop_repeats=2)
+    repeat = message("Reviewer", "The function looks fine to me, waiting for the tests.")
+    detector(repeat)
+    detector(repeat)
+    detector(code("Coder", "def add(a, b): return a + b"))
+    assert not detector(repeat)
@@ -0,0 +1,89 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from execution_cache import ExecutionCache, MemoizingCodeExecutor, new_code_check
+
+
+class CountingExecutor:
+    code_extractor = None
+
+    def __init__(self, work_dir):
+        self.work_dir = work_dir
+        self.runs = 0
+
+    def execute_code_blocks(self, code_blocks):
+        self.runs += 1
+        for block in code_blocks:
+            with open(self.target(block), "w", encoding="utf-8") as f:
+                f.write(block.code)
+        return SimpleNamespace(exit_code=0, output=f"run {self.runs}")
+
+    def target(self, block):
+        return os.path.join(self.work_dir, "script.py")
+
+
+def block(code):
+    return SimpleNamespace(language="python", code=code)
+
+
+@pytest.fixture
+def executor(tmp_path):
+    inner = CountingExecutor(str(tmp_path))
+    return MemoizingCodeExecutor(inner, ExecutionCache([str(tmp_path)]), target_file=inner.target)
+
+
+def test_repeated_code_is_answered_from_the_cache(executor):
+    first = executor.execute_code_blocks([block("print(1)")])
+    second = executor.execute_code_blocks([block("print(1)")])
+    assert executor.executor.runs == 1 and second is first
+    assert executor.cache.stats()["hits"] == 1
+
+
+def test_other_files_in_the_work_dir_split_the_key(executor, tmp_path):
+    executor.execute_code_blocks([block("import helper")])
+    (tmp_path / "helper.py").write_text("X = 2\n", encoding="utf-8")
+    executor.execute_code_blocks([block("import helper")])
+    assert executor.executor.runs == 2
+
+
+def test_a_hit_restores_the_saved_block(executor, tmp_path):
+    executor.execute_code_blocks([block("print(1)")])
+    executor.execute_code_blocks([block("print(2)")])
+    executor.execute_code_blocks([block("print(1)")])
+    assert executor.executor.runs == 2
+    assert (tmp_path / "script.py").read_text(encoding="utf-8") == "print(1)"
+
+
+def test_new_code_versions_invalidate_unchanged_ones_do_not(executor):
+    cache = executor.cache
+    executor.execute_code_blocks([block("print(1)")])
+    assert cache.note_code("def f(): pass")
+    assert not cache.note_code("def f(): pass\n")
+    cache.invalidate()
+    executor.execute_code_blocks([block("print(1)")])
+    assert executor.executor.runs == 2
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_oldest_entry_is_dropped_at_capacity(tmp_path):
+    cache = ExecutionCache([str(tmp_path)], max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.set(key, key, 0.1)
+    assert cache.get("a") is None and cache.get("c") == "c"
+
+
+def test_new_code_after_history_compaction_invalidates(tmp_path):
+    cache = ExecutionCache([str(tmp_path)])
+    check = new_code_check(cache)
+    coder = [{"name": "Coder", "content": f"```python\nprint({i})\n```"} for i in (1, 2)]
+    chat = [{"name": "Admin", "content": "task"}, coder[0]] + \
+        [{"name": "Reviewer", "content": f"comment {i}"} for i in range(4)]
+    check(None, chat, None, None)
+    cache.set("key", "result", 0.1)
+    # Compaction replaced the older messages with a summary; then the Coder posted v2.
+    compacted = [{"name": "Admin", "content": "summary"}, chat[-1], coder[1]] + \
+        [{"name": "Reviewer", "content": f"review {i}"} for i in range(4)]
+    check(None, compacted, None, None)
+    assert cache.stats()["invalidations"] == 1 and cache.get("key") is None
@@ -0,0 +1,97 @@
+from concurrent.futures import wait
+from types import SimpleNamespace
+
+import pytest
+
+from fan_out import ReviewFanOut
+from llm_hooks import add_llm_middleware
+
+
+class FakeClient:
+    """Answers with the last message it was sent; the first 'failures' requests fail."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.requests = []
+
+    def create(self, **params):
+        self.requests.append(params)
+        if len(self.requests) <= self.failures:
+            raise ConnectionError("reset")
+        return SimpleNamespace(reply_to=params["messages"][-1]["content"])
+
+
+class Agent:
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeTestEngineer(Agent):
+    """The parts of a ConversableAgent ReviewFanOut touches."""
+
+    def __init__(self, manager, groupchat, client):
+        super().__init__("Test_Engineer")
+        self.client = client
+        self.chat_messages = {manager: groupchat.messages}
+
+    def generate_oai_reply(self, messages, sender):
+        self.client.create(messages=messages)
+
+
+def code(text):
+    return {"name": "Coder", "content": f"```python\n{text}\n```"}
+
+
+@pytest.fixture
+def fan_out():
+    groupchat, manager = SimpleNamespace(messages=[]), Agent("chat_manager")
+    test_engineer = FakeTestEngineer(manager, groupchat, FakeClient())
+    fan_out = ReviewFanOut(groupchat, manager, Agent("Coder"), Agent("Reviewer"), test_engineer)
+    add_llm_middleware(test_engineer, fan_out._join)
+    return fan_out
+
+
+def post(fan_out, message):
+    """Append 'message'; a Coder message is what the Reviewer then replies to."""
+    fan_out.groupchat.messages.append(message)
+    if message["name"] == "Coder":
+        fan_out._fan_out(fan_out.reviewer, fan_out.groupchat.messages, fan_out.manager, None)
+        wait([fan_out._pending[1]])
+
+
+def ask_test_engineer(fan_out):
+    return fan_out.test_engineer.client.create(messages=fan_out.groupchat.messages)
+
+
+def test_approved_draft_is_returned_without_a_second_request(fan_out):
+    post(fan_out, code("def add(a, b): return a + b"))
+    post(fan_out, {"name": "Reviewer", "content": "Looks good."})
+    assert ask_test_engineer(fan_out).reply_to == code("def add(a, b): return a + b")["content"]
+    assert len(fan_out.test_engineer.client.requests) == 1
+    assert fan_out.stats()["joined"] == 1
+
+
+def test_requested_changes_discard_the_draft(fan_out):
+    post(fan_out, code("def add(a, b): return a - b"))
+    post(fan_out, {"name": "Reviewer", "content": "add subtracts; please fix it."})
+    assert ask_test_engineer(fan_out).reply_to == "add subtracts; please fix it."
+    assert len(fan_out.test_engineer.client.requests) == 2
+    assert (fan_out.stats()["joined"], fan_out.stats()["discarded"]) == (0, 1)
+
+
+def test_a_new_revision_replaces_the_pending_draft(fan_out):
+    post(fan_out, code("def add(a, b): return a - b"))
+    post(fan_out, code("def add(a, b): return a + b"))
+    post(fan_out, {"name": "Reviewer", "content": "Looks good."})
+    assert ask_test_engineer(fan_out).reply_to == code("def add(a, b): return a + b")["content"]
+    stats = fan_out.stats()
+    assert (stats["launched"], stats["discarded"], stats["joined"]) == (2, 1, 1)
+
+
+def test_a_failed_draft_falls_back_to_a_normal_request(fan_out):
+    fan_out.test_engineer.client.failures = 1
+    post(fan_out, code("def add(a, b): return a + b"))
+    post(fan_out, {"name": "Reviewer", "content": "Looks good."})
+    assert ask_test_engineer(fan_out).reply_to == "Looks good."
+    assert len(fan_out.test_engineer.client.requests) == 2
+    assert fan_out.stats()["failed"] == 1
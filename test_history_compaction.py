@@ -0,0 +1,54 @@
+from history_compaction import HistoryCompactor, message_tokens
+
+
+def code(name, body):
+    return f"```python\n# filename: {name}\n{body}\n```"
+
+
+def msg(name, content):
+    return {"role": "user", "name": name, "content": content}
+
+
+def long_history():
+    filler = "\n".join(f"line {i} " + "x" * 60 for i in range(40))
+    return [
+        msg("Admin", "Write calc.py with tests."),
+        msg("Coder", code("calc_v1.py", "def add(a, b):\n    return a + b\n" + filler)),
+        msg("Reviewer", "Please handle negative inputs. " + "r" * 2000),
+        msg("Coder", code("calc_v2.py", "def add(a, b):\n    return abs(a) + b\n" + filler)),
+        msg("Reviewer", "Looks good!"),
+        msg("Admin", "exitcode: 0 (execution succeeded)\nCode output: " + "o" * 3000),
+        msg("Admin", "exitcode: 1 (execution failed)\nCode output: " + "f" * 3000),
+        msg("Test_Engineer", "Working on the tests."),
+        msg("Admin", "Noted."),
+        msg("Test_Engineer", "Still writing the tests."),
+        msg("Admin", "Go on."),
+    ]
+
+
+def test_superseded_code_becomes_a_reference():
+    messages = long_history()
+    compacted = HistoryCompactor("Coder", max_tokens=0)._compact(messages)
+    assert "[superseded calc_v1.py" in compacted[1]["content"]
+    assert compacted[3]["content"] == messages[3]["content"]
+    assert messages[1]["content"].startswith("```python")  # the stored history is untouched
+
+
+def test_budget_keeps_latest_code_and_review_verbatim():
+    messages = long_history()
+    compactor = HistoryCompactor("Coder", max_tokens=750)
+    compacted = compactor._compact(messages)
+    contents = [m["content"] for m in compacted]
+    assert messages[3]["content"] in contents
+    assert "Looks good!" in contents
+    assert any("omitted to stay within the context budget" in c for c in contents)
+    assert not any("calc_v1.py" in c for c in contents)
+
+
+def test_outputs_are_condensed_before_messages_are_dropped():
+    messages = long_history()
+    budget = message_tokens(HistoryCompactor("Coder", max_tokens=0)._compact(messages)) - 500
+    compacted = HistoryCompactor("Coder", max_tokens=budget)._compact(messages)
+    assert len(compacted) == len(messages)
+    assert "[condensed" in compacted[6]["content"]
+    assert message_tokens(compacted) <= budget
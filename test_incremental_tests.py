@@ -0,0 +1,119 @@
+import pytest
+
+from code_execution import ResourceLimits, close_pool, get_pool
+from incremental_tests import IncrementalTestRunner
+
+CALC = '''\
+from util import check
+
+
+def _check(x):
+    return x
+
+
+def add(a, b):
+    return _check(a) + b
+
+
+class Calc:
+    def _validate(self, b):
+        return check(b)
+
+    def divide(self, a, b):
+        return a / self._validate(b)
+'''
+
+UTIL = '''\
+def check(x):
+    return x
+'''
+
+TESTS = '''\
+import unittest
+
+from calc import Calc, add
+
+
+class TestCalc(unittest.TestCase):
+    def test_add(self):
+        self.assertEqual(add(1, 2), 3)
+
+    def test_divide(self):
+        self.assertEqual(Calc().divide(6, 3), 2)
+'''
+
+
+@pytest.fixture
+def work_dir(tmp_path):
+    (tmp_path / "calc.py").write_text(CALC)
+    (tmp_path / "util.py").write_text(UTIL)
+    (tmp_path / "test_calc.py").write_text(TESTS)
+    return tmp_path
+
+
+@pytest.fixture(params=[False, True], ids=["process", "warm_pool"])
+def warm_pool(request, work_dir):
+    yield request.param
+    close_pool(str(work_dir))
+
+
+@pytest.fixture
+def runner(work_dir, warm_pool):
+    return IncrementalTestRunner(str(work_dir), max_shards=1, warm_pool=warm_pool)
+
+
+def run(runner, work_dir):
+    return runner.run(runner.analyse(str(work_dir / "test_calc.py")))
+
+
+def test_unchanged_tests_are_not_run_again(runner, work_dir):
+    assert run(runner, work_dir)[0] == 0
+    exit_code, output = run(runner, work_dir)
+    assert exit_code == 0
+    assert "0 of 2 tests affected" in output
+
+
+def test_changed_helpers_rerun_the_tests(runner, work_dir):
+    assert run(runner, work_dir)[0] == 0
+    broken = CALC.replace("    return x\n", "    return x + 1\n").replace("return check(b)", "return check(b) * 2")
+    (work_dir / "calc.py").write_text(broken)
+    exit_code, output = run(runner, work_dir)
+    assert exit_code == 1
+    assert "2 of 2 tests affected" in output and "FAILED (2 of 2 tests)" in output
+
+
+def test_changed_transitive_import_reruns_the_tests(runner, work_dir):
+    assert run(runner, work_dir)[0] == 0
+    (work_dir / "util.py").write_text(UTIL.replace("return x", "return x * 10"))
+    exit_code, output = run(runner, work_dir)
+    assert exit_code == 1
+    assert "2 of 2 tests affected" in output
+
+
+def test_changed_test_code_reruns_only_that_test(runner, work_dir):
+    assert run(runner, work_dir)[0] == 0
+    (work_dir / "test_calc.py").write_text(TESTS.replace("add(1, 2), 3", "add(2, 2), 4"))
+    exit_code, output = run(runner, work_dir)
+    assert exit_code == 0
+    assert "1 of 2 tests affected" in output
+
+
+def test_warm_pool_shards_run_in_the_pools_workers(work_dir):
+    runner = IncrementalTestRunner(str(work_dir), max_shards=4, warm_pool=True)
+    try:
+        exit_code, output = run(runner, work_dir)
+        assert exit_code == 0 and "Ran 2 tests: 2 passed." in output
+        assert get_pool(str(work_dir)).stats()["runs"] == 1
+        assert not [p.name for p in work_dir.iterdir() if p.name.startswith("shard_") or p.suffix == ".out"]
+    finally:
+        close_pool(str(work_dir))
+
+
+def test_a_shard_over_its_memory_limit_is_stopped(work_dir, warm_pool):
+    pytest.importorskip("resource")
+    (work_dir / "test_calc.py").write_text(TESTS.replace("add(1, 2), 3", "len(b'x' * (1024 ** 3)), 3"))
+    limits = ResourceLimits(memory_mb=64)
+    runner = IncrementalTestRunner(str(work_dir), max_shards=1, warm_pool=warm_pool, limits=limits)
+    exit_code, output = run(runner, work_dir)
+    assert exit_code == 1
+    assert "MemoryError" in output and "1 errored" in output
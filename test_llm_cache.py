@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from llm_cache import ResponseCache, make_cache_key
+
+
+def request(content, **params):
+    return json.dumps({"model": "gpt-4", "messages": [{"role": "user", "content": content}], **params})
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResponseCache(cache_dir=str(tmp_path / "llm"))
+    yield cache
+    cache.close()
+
+
+def test_cosmetic_differences_share_a_key():
+    assert make_cache_key(request("def f():\r\n    return 1  \r\n\r\n")) == make_cache_key(request("def f():\n    return 1"))
+    assert make_cache_key(request("hi", stream=True, user="a")) == make_cache_key(request("hi"))
+
+
+def test_semantic_differences_split_the_key():
+    assert make_cache_key(request("def f():\n    return 1")) != make_cache_key(request("def f():\n  return 1"))
+    assert make_cache_key(request("hi", temperature=0)) != make_cache_key(request("hi", temperature=1))
+
+
+def test_hit_after_set_and_miss_before(cache):
+    assert cache.get(request("hi")) is None
+    cache.set(request("hi"), {"text": "hello"})
+    assert cache.get(request("hi", stream=True)) == {"text": "hello"}
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+
+def test_entries_persist_across_instances(tmp_path):
+    first = ResponseCache(cache_dir=str(tmp_path))
+    first.set(request("hi"), "hello")
+    first.close()
+    second = ResponseCache(cache_dir=str(tmp_path))
+    assert second.get(request("hi")) == "hello"
+    second.close()
+
+
+def test_expired_entries_are_misses(cache):
+    cache.set(request("hi"), "hello")
+    cache._conn.execute("UPDATE entries SET created = created - ?", (cache.ttl + 1,))
+    assert cache.get(request("hi")) is None
+    assert cache.stats()["expired"] == 1
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResponseCache(cache_dir=str(tmp_path), max_bytes=250)
+    cache.set(request("a"), "x" * 100)
+    cache.set(request("b"), "x" * 100)
+    cache.get(request("a"))
+    cache._conn.execute("UPDATE entries SET accessed = accessed + 10 WHERE key = ?", (make_cache_key(request("a")),))
+    cache.set(request("c"), "x" * 100)
+    assert cache.get(request("b")) is None
+    assert cache.get(request("a")) == "x" * 100 and cache.get(request("c")) == "x" * 100
+    assert cache.stats()["evictions"] == 1
+    cache.close()
+
+
+def test_exiting_the_context_keeps_the_cache_open(cache):
+    with cache:
+        cache.set(request("hi"), "hello")
+    assert cache.get(request("hi")) == "hello"
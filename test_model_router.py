@@ -0,0 +1,127 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from job_runner import JobCancelled
+from llm_hooks import model_key
+from model_router import MIN_SAMPLES, ModelRouter
+
+LARGE = {"model": "gpt-4"}
+SMALL = {"model": "gpt-4o-mini"}
+
+
+class FakeClient:
+    def __init__(self, model, delay=0.0, fail=False):
+        self.model, self.delay, self.fail = model, delay, fail
+        self.calls = 0
+        self.total_usage_summary = self.actual_usage_summary = None
+
+    def create(self, **params):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise self.fail if isinstance(self.fail, Exception) else ConnectionError(self.model)
+        # What OpenAIWrapper records for one uncached response.
+        usage = {"total_cost": 0.01, self.model: {"cost": 0.01, "prompt_tokens": 10, "completion_tokens": 5,
+                                                   "total_tokens": 15}}
+        self.total_usage_summary = self.actual_usage_summary = usage
+        return SimpleNamespace(model=self.model)
+
+
+def agent(name, large=None, small=None):
+    large, small = large or FakeClient("gpt-4"), small or FakeClient("gpt-4o-mini")
+    agent = SimpleNamespace(name=name, llm_config={"config_list": [LARGE, SMALL]},
+                            client=SimpleNamespace(create=lambda **params: pytest.fail("unrouted request"),
+                                                   total_usage_summary=None, actual_usage_summary=None))
+    agent._routed_clients = {model_key(LARGE): large, model_key(SMALL): small}
+    return agent
+
+
+def routed(router, agent):
+    router.attach([agent])
+    return agent
+
+
+def test_roles_pick_their_end_of_the_config_list():
+    router = ModelRouter(roles={"Planner": "gpt-4o-mini"})
+    assert router.candidates("Coder", [LARGE, SMALL]) == [LARGE, SMALL]
+    assert router.candidates("Reviewer", [LARGE, SMALL]) == [SMALL, LARGE]
+    assert router.candidates("Planner", [LARGE, SMALL]) == [SMALL, LARGE]
+
+
+def test_unhealthy_models_move_behind_healthy_ones():
+    router = ModelRouter(max_error_rate=0.5)
+    for _ in range(MIN_SAMPLES):
+        router.stats_for(model_key(LARGE)).record(0.1, ok=False)
+    assert router.candidates("Coder", [LARGE, SMALL]) == [SMALL, LARGE]
+    assert not router.stats()["models"][model_key(LARGE)]["healthy"]
+
+
+def test_failed_request_fails_over_to_the_next_model():
+    router = ModelRouter()
+    coder = routed(router, agent("Coder", large=FakeClient("gpt-4", fail=True)))
+    assert coder.client.create(messages=[]).model == "gpt-4o-mini"
+    stats = router.stats()
+    assert stats["failovers"] == 1
+    assert stats["models"][model_key(LARGE)]["errors"] == 1
+
+
+def test_all_models_failing_raises_the_last_error():
+    router = ModelRouter()
+    coder = routed(router, agent("Coder", large=FakeClient("gpt-4", fail=True),
+                                 small=FakeClient("gpt-4o-mini", fail=True)))
+    with pytest.raises(ConnectionError, match="gpt-4o-mini"):
+        coder.client.create(messages=[])
+
+
+def test_slow_primary_is_hedged_against_the_next_model():
+    router = ModelRouter(p95_threshold=0.05, hedge=True)
+    coder = routed(router, agent("Coder", large=FakeClient("gpt-4", delay=0.5)))
+    assert coder.client.create(messages=[]).model == "gpt-4o-mini"
+    assert router.hedged == 1
+    assert router.stats_for(model_key(SMALL)).hedges_won == 1
+
+
+def test_streaming_requests_are_not_hedged():
+    router = ModelRouter(p95_threshold=0.05, hedge=True)
+    coder = routed(router, agent("Coder", large=FakeClient("gpt-4", delay=0.1)))
+    assert coder.client.create(messages=[], stream=True).model == "gpt-4"
+    assert router.hedged == 0
+
+
+def test_routed_usage_is_recorded_on_the_agents_client():
+    router = ModelRouter()
+    coder = routed(router, agent("Coder", large=FakeClient("gpt-4", fail=True)))
+    coder.client.create(messages=[])
+    coder.client.create(messages=[])
+    usage = coder.client.total_usage_summary
+    assert usage["gpt-4o-mini"]["total_tokens"] == 30 and usage["total_cost"] == pytest.approx(0.02)
+    assert coder.client.actual_usage_summary == usage
+    assert coder._routed_clients[model_key(SMALL)].total_usage_summary is None
+
+
+def test_a_cancelled_job_is_not_failed_over_or_held_against_the_model():
+    router = ModelRouter()
+    coder = routed(router, agent("Coder", large=FakeClient("gpt-4", fail=JobCancelled("Job 1 was cancelled."))))
+    with pytest.raises(JobCancelled):
+        coder.client.create(messages=[])
+    assert coder._routed_clients[model_key(SMALL)].calls == 0
+    stats = router.stats()
+    assert stats["failovers"] == 0
+    assert all(model["calls"] == model["errors"] == 0 for model in stats["models"].values())
+
+
+def test_a_cancelled_hedged_request_is_not_failed_over():
+    router = ModelRouter(p95_threshold=0.05, hedge=True)
+    coder = routed(router, agent("Coder", large=FakeClient("gpt-4", fail=JobCancelled("Job 1 was cancelled."))))
+    with pytest.raises(JobCancelled):
+        coder.client.create(messages=[])
+    assert coder._routed_clients[model_key(SMALL)].calls == 0
+    assert router.stats_for(model_key(LARGE)).errors == 0
+
+
+def test_a_hedged_request_failing_fast_fails_over():
+    router = ModelRouter(p95_threshold=5.0, hedge=True)
+    coder = routed(router, agent("Coder", large=FakeClient("gpt-4", fail=True)))
+    assert coder.client.create(messages=[]).model == "gpt-4o-mini"
@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+
+import pytest
+
+from speaker_selection import StateMachineSpeakerSelector, is_approval, pipeline_transitions
+
+CODE = "```python\n# filename: calc.py\nprint(1)\n```"
+
+
+class FakeGroupChat:
+    def __init__(self, messages, names=("Admin", "Coder", "Reviewer", "Test_Engineer")):
+        self.messages = messages
+        self.agents = {name: SimpleNamespace(name=name) for name in names}
+
+    def agent_by_name(self, name):
+        return self.agents[name]
+
+
+def select(messages):
+    selector = StateMachineSpeakerSelector(pipeline_transitions())
+    speaker = SimpleNamespace(name=messages[-1]["name"])
+    picked = selector(speaker, FakeGroupChat(messages))
+    return picked if isinstance(picked, str) else picked.name
+
+
+@pytest.mark.parametrize("content", [
+    "Looks good!",
+    "Looks good! Code review complete.",
+    "**Looks good!**",
+    "Nice work.\nLooks good!",
+])
+def test_approval_phrase(content):
+    assert is_approval(content)
+
+
+@pytest.mark.parametrize("content", [
+    "Looks good overall, but please handle negative inputs.",
+    "Looks good!\nPlease add a docstring.",
+    "The loop looks good but the base case is wrong.",
+    "Looks good!\n" + CODE,
+    "",
+])
+def test_change_requests_are_not_approvals(content):
+    assert not is_approval(content)
+
+
+def test_pipeline_hands_code_to_reviewer_and_approval_to_test_engineer():
+    messages = [{"name": "Admin", "content": "Write calc.py"}, {"name": "Coder", "content": CODE}]
+    assert select(messages) == "Reviewer"
+    messages.append({"name": "Reviewer", "content": "Looks good! Code review complete."})
+    assert select(messages) == "Test_Engineer"
+
+
+def test_partial_approval_goes_back_to_coder():
+    messages = [{"name": "Admin", "content": "Write calc.py"}, {"name": "Coder", "content": CODE},
+                {"name": "Reviewer", "content": "Looks good overall, but please handle negative inputs."}]
+    assert select(messages) == "Coder"
+
+
+def test_ambiguous_state_falls_back_to_auto():
+    messages = [{"name": "Admin", "content": "Write calc.py"}, {"name": "Coder", "content": "Which Python version?"}]
+    assert select(messages) == "auto"
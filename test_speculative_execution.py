@@ -0,0 +1,98 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from speaker_selection import CODE_BLOCK_RE
+from speculative_execution import SpeculativeCodeExecutor, SpeculativeExecution
+
+
+class BlockExtractor:
+    def extract_code_blocks(self, message):
+        return [SimpleNamespace(language=lang, code=code) for lang, code in CODE_BLOCK_RE.findall(message)]
+
+
+class FileExecutor:
+    """Saves each block to out.txt in its work dir, like a script that writes its result."""
+
+    code_extractor = BlockExtractor()
+
+    def __init__(self, work_dir, fail=False):
+        self.work_dir = work_dir
+        self.fail = fail
+        self.runs = 0
+
+    def execute_code_blocks(self, code_blocks):
+        self.runs += 1
+        if self.fail:
+            raise RuntimeError("sandbox broke")
+        with open(os.path.join(self.work_dir, "out.txt"), "w", encoding="utf-8") as f:
+            f.write("".join(b.code for b in code_blocks))
+        return SimpleNamespace(exit_code=0, output=f"ran in {self.work_dir}", code_file=None)
+
+
+def code_message(code):
+    return {"name": "Coder", "content": f"```python\n{code}\n```"}
+
+
+@pytest.fixture
+def speculation(tmp_path):
+    work_dir = tmp_path / "coding"
+    work_dir.mkdir()
+    (work_dir / "helper.py").write_text("X = 1\n", encoding="utf-8")
+    speculation = SpeculativeExecution(str(work_dir))
+    speculation.groupchat = SimpleNamespace(messages=[])
+    speculation.extractor = BlockExtractor()
+    speculation._sandbox = str(tmp_path / "sandbox")
+    os.makedirs(speculation._sandbox)
+    speculation._executor = FileExecutor(speculation._sandbox)
+    yield speculation
+    speculation.close()
+
+
+def launch(speculation, code):
+    speculation.groupchat.messages.append(code_message(code))
+    speculation._launch(None, speculation.groupchat.messages, None, None)
+    return speculation.extractor.extract_code_blocks(code_message(code)["content"])
+
+
+def test_finished_run_is_taken_and_its_files_copied_back(speculation):
+    blocks = launch(speculation, "print(1)")
+    result = speculation.take(blocks)
+    assert result.output == f"ran in {speculation.work_dir}"
+    with open(os.path.join(speculation.work_dir, "out.txt"), encoding="utf-8") as f:
+        assert f.read() == "print(1)\n"
+    assert speculation.stats()["hits"] == 1
+
+
+def test_work_dir_change_makes_the_run_stale(speculation):
+    blocks = launch(speculation, "print(1)")
+    speculation._pending["Coder"].future.result()
+    with open(os.path.join(speculation.work_dir, "helper.py"), "w", encoding="utf-8") as f:
+        f.write("X = 2\n")
+    assert speculation.take(blocks) is None
+    assert speculation.stats()["stale"] == 1
+    assert not os.path.exists(os.path.join(speculation.work_dir, "out.txt"))
+
+
+def test_a_revision_discards_the_pending_run(speculation):
+    first = launch(speculation, "print(1)")
+    second = launch(speculation, "print(2)")
+    assert speculation.take(first) is None
+    assert speculation.take(second).exit_code == 0
+    stats = speculation.stats()
+    assert (stats["launched"], stats["discarded"], stats["misses"], stats["hits"]) == (2, 1, 1, 1)
+
+
+def test_messages_from_other_agents_launch_nothing(speculation):
+    speculation.groupchat.messages.append({"name": "Reviewer", "content": "```python\nprint(1)\n```"})
+    assert speculation._launch(None, speculation.groupchat.messages, None, None) == (False, None)
+    assert speculation.stats()["launched"] == 0
+
+
+def test_executor_runs_the_code_itself_when_the_speculation_failed(speculation):
+    speculation._executor.fail = True
+    blocks = launch(speculation, "print(1)")
+    inner = FileExecutor(speculation.work_dir)
+    assert SpeculativeCodeExecutor(inner, speculation).execute_code_blocks(blocks).exit_code == 0
+    assert inner.runs == 1 and speculation.stats()["failed"] == 1
@@ -0,0 +1,42 @@
+from streaming import ConversationStream
+
+
+class RecordingView:
+    def __init__(self):
+        self.events = []
+
+    def on_start(self, speaker):
+        self.events.append(("start", speaker))
+
+    def on_tokens(self, text):
+        self.events.append(("tokens", text))
+
+    def on_message(self, sender, recipient, content):
+        self.events.append(("message", sender, content))
+
+
+def test_tokens_stream_into_the_next_speakers_block():
+    view = RecordingView()
+    stream = ConversationStream(view)
+    stream.message_received("Admin", "Coder", "write primes")
+    stream.print("def ", end="")
+    stream.print("primes():", end="")
+    assert view.events == [("message", "Admin", "write primes"), ("start", "Coder"), ("tokens", "def "),
+                           ("tokens", "primes():")]
+
+
+def test_final_message_equal_to_the_previous_one_is_flushed():
+    view = RecordingView()
+    stream = ConversationStream(view)
+    stream.message_received("Coder", "Reviewer", "Looks good.")
+    stream.finish({"name": "Reviewer", "content": "Looks good."}, posted=2)
+    assert view.events[-1] == ("message", "Reviewer", "Looks good.")
+
+
+def test_an_already_reported_final_message_is_not_repeated():
+    view = RecordingView()
+    stream = ConversationStream(view)
+    stream.message_received("Admin", "Coder", "write primes")
+    stream.message_received("Coder", "Reviewer", "```python\nprint(2)\n```")
+    stream.finish({"name": "Coder", "content": "```python\nprint(2)\n```"}, posted=2)
+    assert len(view.events) == 2
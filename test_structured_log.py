@@ -0,0 +1,81 @@
+from artifact_store import ArtifactStore
+from structured_log import SegmentedLog, StructuredRuntimeLogger, query, sessions
+
+
+def record(seq, data, event_type="received_message", agent="Coder"):
+    return {"ts": float(seq), "session_id": "s1", "seq": seq, "event_type": event_type, "agent": agent,
+            "round": seq, "data": data}
+
+
+class Unserializable:
+    def model_dump(self):
+        raise RuntimeError("not now")
+
+    def __repr__(self):
+        raise RuntimeError("still not")
+
+
+def test_records_are_indexed_and_queried(tmp_path):
+    log = SegmentedLog(log_dir=str(tmp_path), flush_interval=0.01)
+    for seq in range(1, 4):
+        log.write(record(seq, {"n": seq}, agent="Reviewer" if seq == 2 else "Coder"))
+    log.close()
+    assert [r["data"]["n"] for r in query(str(tmp_path), agent="Coder")] == [1, 3]
+    assert [r["seq"] for r in query(str(tmp_path), round=2)] == [2]
+    assert sessions(str(tmp_path))[0][0] == "s1"
+
+
+def test_secrets_are_masked(tmp_path):
+    log = SegmentedLog(log_dir=str(tmp_path), flush_interval=0.01)
+    log.write(record(1, {"config": {"api_key": "sk-secret", "model": "gpt-4"}}))
+    log.close()
+    assert query(str(tmp_path))[0]["data"]["config"] == {"api_key": "***", "model": "gpt-4"}
+
+
+def test_record_is_logged_as_it_was_when_written(tmp_path):
+    log = SegmentedLog(log_dir=str(tmp_path), flush_interval=0.01)
+    message = {"content": "first version"}
+    log.write(record(1, {"message": message}))
+    message["content"] = "changed by the chat afterwards"
+    log.close()
+    assert query(str(tmp_path))[0]["data"]["message"]["content"] == "first version"
+
+
+def test_bad_record_does_not_stop_the_writer(tmp_path):
+    log = SegmentedLog(log_dir=str(tmp_path), flush_interval=0.01)
+    log.write(record(1, {"value": Unserializable()}))
+    log.write(record(2, {"ok": True}))
+    log.close()
+    assert log.dropped == 1
+    assert [r["seq"] for r in query(str(tmp_path))] == [2]
+
+
+def test_failed_write_does_not_stop_the_writer(tmp_path, monkeypatch):
+    log = SegmentedLog(log_dir=str(tmp_path), flush_interval=0.01)
+    original, calls = log._open_segment, []
+
+    def flaky_open(db):
+        calls.append(1)
+        if len(calls) == 1:
+            raise OSError("disk full")
+        return original(db)
+
+    monkeypatch.setattr(log, "_open_segment", flaky_open)
+    log.write(record(1, {"n": 1}))
+    log.write(record(2, {"n": 2}))
+    log.close()
+    assert log.dropped == 1
+    assert [r["seq"] for r in query(str(tmp_path))] == [2]
+
+
+def test_runtime_logger_references_code_in_messages(tmp_path):
+    artifacts = ArtifactStore(str(tmp_path / "artifacts"), min_chars=50)
+    runtime_logger = StructuredRuntimeLogger(SegmentedLog(log_dir=str(tmp_path), flush_interval=0.01),
+                                             artifacts=artifacts)
+    runtime_logger.start()
+    code = "```python\n" + "print('hello')\n" * 10 + "```"
+    runtime_logger.log_event("chat_manager", "received_message", message={"content": code, "name": "Coder"})
+    runtime_logger.stop()
+    logged = next(r for r in query(str(tmp_path)) if r["event_type"] == "received_message")
+    assert "[artifact:" in logged["data"]["message"]["content"]
+    assert artifacts.materialize_value(logged)["data"]["message"]["content"] == code
@@ -0,0 +1,123 @@
+from types import SimpleNamespace
+
+import pytest
+
+from history_compaction import count_tokens
+from llm_hooks import model_key
+from token_budget import MESSAGE_OVERHEAD, TokenAccountant, estimate_prompt_tokens, estimate_tokens, parse_budgets
+
+LARGE = {"model": "gpt-4"}
+SMALL = {"model": "gpt-4o-mini"}
+
+
+def response(model, prompt_tokens=0, completion_tokens=0, content="ok"):
+    usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+    return SimpleNamespace(model=model, usage=usage,
+                           choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class FakeClient:
+    def __init__(self, model, **usage):
+        self.model, self.usage = model, usage
+        self.requests = []
+        self.total_usage_summary = self.actual_usage_summary = None
+
+    def create(self, **params):
+        self.requests.append(params)
+        # What OpenAIWrapper records for each uncached response.
+        summary = self.total_usage_summary or {"total_cost": 0}
+        calls = summary.get(self.model, {}).get("calls", 0) + 1
+        self.total_usage_summary = self.actual_usage_summary = {**summary, self.model: {"calls": calls}}
+        return response(self.model, **self.usage)
+
+
+def agent(name, config_list=(LARGE,), **usage):
+    clients = {model_key(e): FakeClient(e["model"], **usage) for e in config_list}
+    agent = SimpleNamespace(name=name, llm_config={"config_list": list(config_list)},
+                            client=clients[model_key(config_list[0])])
+    agent._routed_clients = clients
+    return agent
+
+
+def ask(agent, text="hello"):
+    return agent.client.create(messages=[{"role": "system", "content": "You are a coder."},
+                                         {"role": "user", "content": text}])
+
+
+def test_parse_budgets():
+    assert parse_budgets("Coder=20000, Reviewer=8000") == {"Coder": 20000, "Reviewer": 8000}
+    assert parse_budgets(None) == {}
+
+
+def test_local_models_count_more_tokens():
+    text = "def add(a, b):\n    return a + b\n" * 10
+    assert estimate_tokens(text, {"api_type": "ollama"}) > estimate_tokens(text, LARGE) == count_tokens(text)
+
+
+def test_reported_usage_is_counted_per_agent_and_round():
+    groupchat = SimpleNamespace(messages=[{}, {}])
+    accountant = TokenAccountant(groupchat=groupchat)
+    coder, reviewer = agent("Coder", prompt_tokens=100, completion_tokens=20), agent("Reviewer", prompt_tokens=50)
+    accountant.attach([coder, reviewer])
+    ask(coder)
+    ask(reviewer)
+    stats = accountant.stats()
+    assert stats["total_tokens"] == 170 and stats["calls"] == 2
+    assert stats["agents"]["Coder"]["estimated_calls"] == 0
+    assert stats["rounds"] == {2: {"Coder": 120, "Reviewer": 50}}
+
+
+def test_missing_usage_is_estimated():
+    accountant = TokenAccountant()
+    coder = agent("Coder")
+    accountant.attach([coder])
+    ask(coder)
+    usage = accountant.stats()["agents"]["Coder"]
+    assert usage["estimated_calls"] == 1
+    assert usage["prompt_tokens"] == count_tokens("You are a coder.") + count_tokens("hello") + 2 * MESSAGE_OVERHEAD
+    assert usage["completion_tokens"] == count_tokens("ok")
+    assert usage["system_tokens"] == count_tokens("You are a coder.") + MESSAGE_OVERHEAD
+
+
+def test_budget_pressure_compacts_then_downgrades():
+    compactor = SimpleNamespace(max_tokens=1000, apply_transform=lambda messages: messages[-1:])
+    accountant = TokenAccountant(agent_budgets={"Coder": 1000}, compact_at=0.5, downgrade_at=0.8,
+                                 compaction=SimpleNamespace(compactors={"Coder": compactor}))
+    coder = agent("Coder", config_list=(LARGE, SMALL), prompt_tokens=300)
+    accountant.attach([coder])
+    for _ in range(3):
+        ask(coder)
+    assert [a["action"] for a in accountant.actions] == ["compact"]
+    assert compactor.max_tokens == 500
+    assert [m["role"] for m in coder.client.requests[2]["messages"]] == ["system", "user"]
+    ask(coder)
+    assert [a["action"] for a in accountant.actions] == ["compact", "downgrade"]
+    assert len(coder._routed_clients[model_key(SMALL)].requests) == 1
+    # AutoGen's cost summary reads the agent's own client.
+    assert coder.client.total_usage_summary["gpt-4o-mini"] == {"calls": 1}
+
+
+def test_pressure_is_rechecked_after_compacting():
+    messages = [{"role": "system", "content": "You are a coder."},
+                {"role": "user", "content": "def f(x):\n    return x\n" * 200}]
+    budget = int(estimate_prompt_tokens(messages) / 0.9)
+    compactor = SimpleNamespace(max_tokens=1000, apply_transform=lambda messages: [{"role": "user", "content": "f"}])
+    accountant = TokenAccountant(agent_budgets={"Coder": budget}, compact_at=0.5, downgrade_at=0.8,
+                                 compaction=SimpleNamespace(compactors={"Coder": compactor}))
+    coder = agent("Coder", config_list=(LARGE, SMALL))
+    accountant.attach([coder])
+    coder.client.create(messages=messages)
+    assert [a["action"] for a in accountant.actions] == ["compact"]
+    assert len(coder.client.requests) == 1
+
+
+def test_spent_budget_terminates_without_calling_the_model():
+    pytest.importorskip("openai")
+    accountant = TokenAccountant(budget=100)
+    coder = agent("Coder", prompt_tokens=100)
+    accountant.attach([coder])
+    ask(coder)
+    reply = ask(coder)
+    assert reply.choices[0].message.content.endswith("TERMINATE")
+    assert len(coder.client.requests) == 1
+    assert accountant.stats()["stopped"] == "conversation"
@@ -0,0 +1,118 @@
+import asyncio
+from types import SimpleNamespace
+
+from llm_hooks import add_llm_middleware
+from tracing import Tracer, instrument_team
+
+
+def sync_reply(recipient, messages=None, sender=None, config=None):
+    return False, None
+
+
+async def async_reply(recipient, messages=None, sender=None, config=None):
+    return True, "async"
+
+
+class FakeAgent:
+    """The parts of a ConversableAgent instrument_team() touches, and how AutoGen picks replies."""
+
+    def __init__(self, name):
+        self.name = name
+        self.client = None
+        self._reply_func_list = [{"reply_func": async_reply}, {"reply_func": sync_reply}]
+        self._ignore_async_func_in_sync_chat_list = [async_reply]
+
+    def generate_reply(self):
+        for entry in self._reply_func_list:
+            if asyncio.iscoroutinefunction(entry["reply_func"]):
+                continue
+            entry["reply_func"](self)
+        unignored = [entry["reply_func"] for entry in self._reply_func_list
+                     if asyncio.iscoroutinefunction(entry["reply_func"])
+                     and entry["reply_func"] not in self._ignore_async_func_in_sync_chat_list]
+        if unignored:
+            raise RuntimeError("async reply functions in a sync chat")
+
+    async def a_generate_reply(self):
+        for entry in self._reply_func_list:
+            func = entry["reply_func"]
+            final, reply = await func(self) if asyncio.iscoroutinefunction(func) else func(self)
+            if final:
+                return reply
+
+
+def team_of(agent):
+    groupchat = SimpleNamespace(append=lambda message, speaker: None, select_speaker=lambda *a: agent)
+    return SimpleNamespace(groupchat=groupchat, agents=[agent], manager=FakeAgent("chat_manager"))
+
+
+def test_async_reply_functions_stay_async():
+    agent, tracer = FakeAgent("Coder"), Tracer()
+    instrument_team(team_of(agent), tracer)
+    traced_async, traced_sync = (entry["reply_func"] for entry in agent._reply_func_list)
+    assert asyncio.iscoroutinefunction(traced_async)
+    assert not asyncio.iscoroutinefunction(traced_sync)
+    assert traced_async.__name__ == "async_reply"
+
+
+def test_sync_chat_skips_the_traced_async_reply():
+    agent, tracer = FakeAgent("Coder"), Tracer()
+    instrument_team(team_of(agent), tracer)
+    agent.generate_reply()
+    assert [span["name"] for span in tracer.spans] == ["sync_reply Coder"]
+
+
+def test_async_chat_awaits_the_traced_async_reply():
+    agent, tracer = FakeAgent("Coder"), Tracer()
+    instrument_team(team_of(agent), tracer)
+    assert asyncio.run(agent.a_generate_reply()) == "async"
+    assert [span["name"] for span in tracer.spans] == ["async_reply Coder"]
+
+
+def test_wrapping_keeps_markers():
+    def reply(recipient, messages=None, sender=None, config=None):
+        return False, None
+
+    reply._async_twinned = True
+    agent = FakeAgent("Coder")
+    agent._reply_func_list = [{"reply_func": reply}]
+    instrument_team(team_of(agent), Tracer())
+    assert agent._reply_func_list[0]["reply_func"]._async_twinned
+
+
+class FlakyClient:
+    """A per-config client whose first request fails."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def create(self, **params):
+        self.calls += 1
+        if self.calls == 1:
+            raise ConnectionError("reset")
+        return SimpleNamespace(model="gpt-4o-mini")
+
+
+class RetryingWrapper:
+    """An OpenAIWrapper over one client that retries a failed request once."""
+
+    def __init__(self, client):
+        self._clients = [client]
+
+    def create(self, **params):
+        try:
+            return self._clients[0].create(**params)
+        except ConnectionError:
+            return self._clients[0].create(**params)
+
+
+def test_retries_of_routed_requests_are_counted():
+    agent, tracer = FakeAgent("Coder"), Tracer()
+    agent.client = SimpleNamespace(create=lambda **params: None, _clients=[])
+    routed = RetryingWrapper(FlakyClient())
+    agent._routed_clients = {"openai:gpt-4o-mini": routed}
+    instrument_team(team_of(agent), tracer)
+    add_llm_middleware(agent, lambda agent, params, call_next: call_next({**params, "llm_client": routed}))
+    assert agent.client.create(messages=[]).model == "gpt-4o-mini"
+    span, = [span for span in tracer.spans if span["name"] == "llm Coder"]
+    assert span["args"]["retries"] == 1
@@ -0,0 +1,281 @@
+import os
+import threading
+import time
+import uuid
+
+from history_compaction import count_tokens
+from llm_hooks import add_llm_middleware, entry_client, response_usage
+from speaker_selection import message_text
+
+# Chat formats wrap every message in a few tokens of role/name markup.
+MESSAGE_OVERHEAD = 4
+# Llama-family SentencePiece vocabularies split English and code into roughly a quarter
+# more tokens than cl100k does; used for local models, whose tokenizer is not available offline.
+LOCAL_TOKEN_RATIO = 1.25
+DEFAULT_COMPACT_AT = 0.7
+DEFAULT_DOWNGRADE_AT = 0.85
+STOP_MESSAGE = "Token budget exhausted ({scope}: {used} of {budget} tokens). TERMINATE"
+
+
+def is_local_model(entry):
+    return (entry or {}).get("api_type") == "ollama" or (entry or {}).get("model_client_cls") == "PooledOllamaClient"
+
+
+def estimate_tokens(text, entry=None):
+    """Tokens of 'text' for the model of config_list 'entry' (cl100k, scaled for local models)."""
+    tokens = count_tokens(text or "")
+    return int(tokens * LOCAL_TOKEN_RATIO + 0.5) if is_local_model(entry) else tokens
+
+
+def estimate_prompt_tokens(messages, entry=None):
+    return sum(estimate_tokens(message_text(m), entry) + MESSAGE_OVERHEAD for m in messages)
+
+
+def parse_budgets(value):
+    """'Coder=20000,Reviewer=8000' -> {'Coder': 20000, 'Reviewer': 8000}."""
+    budgets = {}
+    for part in (value or "").split(","):
+        if "=" in part:
+            name, tokens = part.split("=", 1)
+            budgets[name.strip()] = int(tokens)
+    return budgets
+
+
+def _llm_config(agent):
+    config = agent.llm_config
+    return config if isinstance(config, dict) else config.model_dump()
+
+
+def _stop_response(text, model):
+    """A finished completion carrying 'text', returned instead of calling the model."""
+    from openai.types.chat import ChatCompletion, ChatCompletionMessage
+    from openai.types.chat.chat_completion import Choice
+    from openai.types.completion_usage import CompletionUsage
+
+    response = ChatCompletion(
+        id=f"budget-{uuid.uuid4().hex[:12]}", model=model or "token-budget", created=int(time.time()),
+        object="chat.completion",
+        choices=[Choice(index=0, finish_reason="stop", message=ChatCompletionMessage(role="assistant", content=text))],
+        usage=CompletionUsage(prompt_tokens=0, completion_tokens=0, total_tokens=0),
+    )
+    # What OpenAIWrapper.create() attaches to every response it returns.
+    response.message_retrieval_function = lambda r: [choice.message for choice in r.choices]
+    response.cost = 0.0
+    return response
+
+
+class AgentUsage:
+    def __init__(self, budget=None):
+        self.budget = budget
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.calls = 0
+        self.estimated_calls = 0
+        self.system_tokens = 0
+        self.model = None
+
+    @property
+    def total_tokens(self):
+        return self.prompt_tokens + self.completion_tokens
+
+    def summary(self):
+        return {"prompt_tokens": self.prompt_tokens, "completion_tokens": self.completion_tokens,
+                "total_tokens": self.total_tokens, "calls": self.calls, "estimated_calls": self.estimated_calls,
+                "system_tokens": self.system_tokens, "budget": self.budget, "model": self.model}
+
+
+class TokenAccountant:
+    """
+    Counts the prompt and completion tokens of every LLM request of a group chat, per
+    agent, per round and for the whole conversation, and enforces token budgets.
+
+    The server's reported usage is used when there is one; otherwise (or when a
+    response carries no usage) the prompt is counted locally with estimate_tokens(),
+    which also approximates local Ollama models. Each agent's system message is
+    counted separately as 'system_tokens', since it is resent with every request.
+
+    'budget' limits the whole conversation and 'agent_budgets' single agents (by
+    name). Before each request the agent's spend, plus the prompt about to be sent, is
+    compared with its tightest budget and the agent degrades step by step:
+    at 'compact_at' its history budget is halved and the prompt compacted (see
+    history_compaction), at 'downgrade_at' its requests go to the cheapest model of its
+    config_list ('cheap_model', else the last entry), and once a budget is spent the
+    request is answered with a TERMINATE message instead, which ends the chat.
+    """
+
+    def __init__(self, groupchat=None, budget=None, agent_budgets=None, compact_at=DEFAULT_COMPACT_AT,
+                 downgrade_at=DEFAULT_DOWNGRADE_AT, compaction=None, cheap_model=None):
+        self.groupchat = groupchat
+        self.budget = budget or None
+        self.agent_budgets = dict(agent_budgets or {})
+        self.compact_at = compact_at
+        self.downgrade_at = downgrade_at
+        self.compaction = compaction
+        self.cheap_model = cheap_model
+        self.agents = {}
+        self.rounds = {}
+        self.actions = []
+        self.stopped = None
+        self._downgraded = {}
+        self._compacted = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        """
+        TOKEN_BUDGET limits the conversation, AGENT_TOKEN_BUDGETS ('Coder=20000,Reviewer=8000')
+        single agents, and TOKEN_BUDGET_COMPACT_AT / TOKEN_BUDGET_DOWNGRADE_AT (fractions
+        of a budget) set where degradation starts. Without budgets tokens are only
+        counted. Returns None when TOKEN_ACCOUNTING=0.
+        """
+        if os.getenv("TOKEN_ACCOUNTING", "1").lower() in ("0", "false", "no"):
+            return None
+        kwargs.setdefault("budget", int(os.getenv("TOKEN_BUDGET", "0")))
+        kwargs.setdefault("agent_budgets", parse_budgets(os.getenv("AGENT_TOKEN_BUDGETS")))
+        kwargs.setdefault("compact_at", float(os.getenv("TOKEN_BUDGET_COMPACT_AT", DEFAULT_COMPACT_AT)))
+        kwargs.setdefault("downgrade_at", float(os.getenv("TOKEN_BUDGET_DOWNGRADE_AT", DEFAULT_DOWNGRADE_AT)))
+        return cls(**kwargs)
+
+    def attach(self, agents):
+        """Count (and budget) the LLM requests of 'agents'. Attach after the model router so downgrades win."""
+        for agent in agents:
+            if add_llm_middleware(agent, self._account):
+                self._usage(agent.name)
+        return self
+
+    def _usage(self, name):
+        with self._lock:
+            if name not in self.agents:
+                self.agents[name] = AgentUsage(self.agent_budgets.get(name))
+            return self.agents[name]
+
+    @property
+    def prompt_tokens(self):
+        return sum(u.prompt_tokens for u in self.agents.values())
+
+    @property
+    def completion_tokens(self):
+        return sum(u.completion_tokens for u in self.agents.values())
+
+    @property
+    def total_tokens(self):
+        return self.prompt_tokens + self.completion_tokens
+
+    # --- Budgets ---
+    def _pressure(self, usage, prompt_tokens):
+        """(fraction of the tightest budget this request would reach, scope, used, budget)."""
+        worst = (0.0, None, 0, None)
+        for scope, used, budget in (("conversation", self.total_tokens, self.budget),
+                                    ("agent", usage.total_tokens, usage.budget)):
+            if budget:
+                fraction = (used + prompt_tokens) / budget
+                if fraction > worst[0]:
+                    worst = (fraction, scope, used, budget)
+        return worst
+
+    def _record_action(self, agent, action, scope, used, budget):
+        self.actions.append({"agent": agent.name, "round": self._round(), "action": action, "scope": scope,
+                             "used": used, "budget": budget})
+
+    def _compact(self, agent, params):
+        compactor = self.compaction.compactors.get(agent.name) if self.compaction else None
+        if compactor is None or agent.name in self._compacted:
+            return params
+        self._compacted.add(agent.name)
+        compactor.max_tokens = max(1, compactor.max_tokens // 2)
+        messages = list(params.get("messages") or [])
+        head = messages[:1] if messages and messages[0].get("role") == "system" else []
+        return {**params, "messages": head + compactor.apply_transform(messages[len(head):])}
+
+    def _cheap_entry(self, agent, current):
+        config_list = _llm_config(agent).get("config_list") or []
+        if len(config_list) < 2:
+            return None
+        cheap = next((e for e in config_list if e.get("model") == self.cheap_model), config_list[-1])
+        return None if current is not None and current.get("model") == cheap.get("model") else cheap
+
+    # --- Middleware ---
+    def _round(self):
+        return len(self.groupchat.messages) if self.groupchat is not None else None
+
+    def _account(self, agent, params, call_next):
+        usage = self._usage(agent.name)
+        routed = params.get("llm_client")
+        config_list = getattr(routed, "_config_list", None) or _llm_config(agent).get("config_list") or [{}]
+        entry = self._downgraded.get(agent.name) or config_list[0]
+        messages = params.get("messages") or []
+        prompt_estimate = estimate_prompt_tokens(messages, entry)
+
+        fraction, scope, used, budget = self._pressure(usage, prompt_estimate)
+        if fraction >= 1.0:
+            with self._lock:
+                self.stopped = self.stopped or scope
+                self._record_action(agent, "stop", scope, used, budget)
+            return _stop_response(STOP_MESSAGE.format(scope=scope, used=used, budget=budget), entry.get("model"))
+        if fraction >= self.compact_at and agent.name not in self._compacted:
+            params = self._compact(agent, params)
+            with self._lock:
+                self._record_action(agent, "compact", scope, used, budget)
+            messages = params.get("messages") or []
+            prompt_estimate = estimate_prompt_tokens(messages, entry)
+            fraction, scope, used, budget = self._pressure(usage, prompt_estimate)
+        if fraction >= self.downgrade_at and agent.name not in self._downgraded:
+            cheap = self._cheap_entry(agent, entry)
+            if cheap is not None:
+                with self._lock:
+                    self._downgraded[agent.name] = entry = cheap
+                    self._record_action(agent, "downgrade", scope, used, budget)
+        if agent.name in self._downgraded:
+            params = {**params, "llm_client": entry_client(agent, entry)}
+            prompt_estimate = estimate_prompt_tokens(messages, entry)
+
+        response = call_next(params)
+
+        prompt_tokens, completion_tokens, model = response_usage(response)
+        estimated = not (prompt_tokens or completion_tokens)
+        if estimated:
+            prompt_tokens = prompt_estimate
+            completion_tokens = sum(estimate_tokens(getattr(choice.message, "content", None) or "", entry)
+                                    for choice in getattr(response, "choices", None) or [])
+        system = next((m for m in messages if m.get("role") == "system"), None)
+        with self._lock:
+            usage.prompt_tokens += prompt_tokens
+            usage.completion_tokens += completion_tokens
+            usage.calls += 1
+            usage.estimated_calls += 1 if estimated else 0
+            usage.model = model or entry.get("model")
+            if system is not None:
+                usage.system_tokens = estimate_tokens(message_text(system), entry) + MESSAGE_OVERHEAD
+            round_ = self._round()
+            per_round = self.rounds.setdefault(round_, {})
+            per_round[agent.name] = per_round.get(agent.name, 0) + prompt_tokens + completion_tokens
+        return response
+
+    # --- Reporting ---
+    def stats(self):
+        with self._lock:
+            agents = {name: usage.summary() for name, usage in self.agents.items()}
+            total = sum(a["total_tokens"] for a in agents.values())
+            return {
+                "prompt_tokens": sum(a["prompt_tokens"] for a in agents.values()),
+                "completion_tokens": sum(a["completion_tokens"] for a in agents.values()),
+                "total_tokens": total,
+                "calls": sum(a["calls"] for a in agents.values()),
+                "budget": self.budget,
+                "remaining": self.budget - total if self.budget else None,
+                "agents": agents,
+                "rounds": {r: dict(per_agent) for r, per_agent in sorted(self.rounds.items(), key=lambda i: i[0] or 0)},
+                "actions": list(self.actions),
+                "stopped": self.stopped,
+            }
+
+
+def attach_token_accounting(groupchat, agents, compaction=None, config_list=None):
+    """
+    Count every LLM request of 'agents' with a TokenAccountant configured from the
+    environment; None when TOKEN_ACCOUNTING=0. 'config_list' is the team's model list,
+    whose last entry is the cheap model agents are downgraded to.
+    """
+    cheap_model = config_list[-1].get("model") if config_list else None
+    accountant = TokenAccountant.from_env(groupchat=groupchat, compaction=compaction, cheap_model=cheap_model)
+    return accountant.attach(agents) if accountant is not None else None
@@ -0,0 +1,178 @@
+import asyncio
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+
+from llm_hooks import add_client_hook, add_llm_middleware, response_usage
+
+DEFAULT_TRACE_DIR = "traces"
+PHASES = ("llm", "manager", "code", "callback")
+
+
+def tracing_enabled():
+    return os.getenv("TRACE", "0").lower() in ("1", "true", "yes")
+
+
+class Tracer:
+    """
+    Collects spans for one conversation: LLM requests, GroupChatManager speaker
+    selection, code execution and this repo's reply-function callbacks. Each span keeps
+    the group chat round it started in, and traces are exported in the Chrome Trace
+    Event format (open them in chrome://tracing or https://ui.perfetto.dev).
+
+    A conversation without a Tracer is not instrumented at all; see instrument_team().
+    """
+
+    def __init__(self, name="conversation"):
+        self.name = name
+        self.round = 0
+        self.speakers = {}
+        self.spans = []
+        self._origin = time.perf_counter()
+        self._wall_origin = time.time()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def now(self):
+        return time.perf_counter() - self._origin
+
+    @contextlib.contextmanager
+    def span(self, name, phase, **args):
+        start = self.now()
+        span = {"name": name, "phase": phase, "round": self.round, "start": start, "end": start,
+                "thread": threading.get_ident(), "args": args}
+        try:
+            yield span["args"]
+        except BaseException as e:
+            span["args"]["error"] = type(e).__name__
+            raise
+        finally:
+            span["end"] = self.now()
+            with self._lock:
+                self.spans.append(span)
+
+    def next_round(self, speaker):
+        with self._lock:
+            self.round += 1
+            self.speakers[self.round] = speaker
+
+    # --- Reporting ---
+    def totals(self):
+        totals = {phase: 0.0 for phase in PHASES}
+        tokens = {"prompt_tokens": 0, "completion_tokens": 0}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            totals[span["phase"]] = totals.get(span["phase"], 0.0) + span["end"] - span["start"]
+            tokens["prompt_tokens"] += span["args"].get("prompt_tokens", 0)
+            tokens["completion_tokens"] += span["args"].get("completion_tokens", 0)
+        return {"seconds": {k: round(v, 4) for k, v in totals.items()}, "rounds": self.round,
+                "wall": round(self.now(), 4), **tokens}
+
+    def summary(self):
+        """Per-round spans (relative seconds) and totals, for the Streamlit panel and job stats."""
+        with self._lock:
+            spans = [dict(s, args=dict(s["args"])) for s in self.spans]
+            speakers = dict(self.speakers)
+        for span in spans:
+            span["speaker"] = speakers.get(span["round"] + 1, "")
+            span.pop("thread", None)
+        return {"spans": spans, "totals": self.totals()}
+
+    def chrome_trace(self):
+        with self._lock:
+            spans = list(self.spans)
+        events = [{"name": "process_name", "ph": "M", "pid": os.getpid(), "args": {"name": self.name}}]
+        for span in spans:
+            events.append({
+                "name": span["name"], "cat": span["phase"], "ph": "X", "pid": os.getpid(), "tid": span["thread"],
+                "ts": round((self._wall_origin + span["start"]) * 1e6), "dur": round((span["end"] - span["start"]) * 1e6),
+                "args": {"round": span["round"], **span["args"]},
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write(self, path=None):
+        path = path or os.path.join(os.getenv("TRACE_DIR", DEFAULT_TRACE_DIR), f"{self.name}.trace.json")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f, default=str)
+        return path
+
+
+# --- Instrumentation ---
+def _llm_span(tracer):
+    def middleware(agent, params, call_next):
+        tracer._local.attempts = 0
+        with tracer.span(f"llm {agent.name}", "llm", agent=agent.name) as args:
+            response = call_next(params)
+            prompt, completion, model = response_usage(response)
+            args.update(model=model, prompt_tokens=prompt, completion_tokens=completion,
+                        retries=max(0, getattr(tracer._local, "attempts", 1) - 1))
+            return response
+    return middleware
+
+
+def _count_attempts(tracer, client):
+    original = client.create
+
+    def create(*args, **kwargs):
+        tracer._local.attempts = getattr(tracer._local, "attempts", 0) + 1
+        return original(*args, **kwargs)
+
+    client.create = create
+
+
+def _timed(tracer, func, name, phase):
+    # Coroutine functions stay coroutine functions: AutoGen skips them in sync chats and
+    # awaits them in async ones. functools.wraps keeps markers such as _async_twinned.
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def traced(*args, **kwargs):
+            with tracer.span(name, phase):
+                return await func(*args, **kwargs)
+    else:
+        @functools.wraps(func)
+        def traced(*args, **kwargs):
+            with tracer.span(name, phase):
+                return func(*args, **kwargs)
+    return traced
+
+
+def instrument_team(team, tracer):
+    """
+    Wrap, on this team's instances only: every agent's LLM client (through llm_hooks),
+    GroupChat.select_speaker and append, the agents' code executors and the reply
+    functions this repo registers. Sets team.tracer.
+    """
+    groupchat = team.groupchat
+    original_append = groupchat.append
+
+    def append(message, speaker):
+        tracer.next_round(getattr(speaker, "name", str(speaker)))
+        return original_append(message, speaker)
+
+    groupchat.append = append
+    groupchat.select_speaker = _timed(tracer, groupchat.select_speaker, "select_speaker", "manager")
+
+    for agent in [*team.agents, team.manager]:
+        if add_llm_middleware(agent, _llm_span(tracer)):
+            # Every underlying client call, routed ones included, is an attempt; more than
+            # one means a retry/failover.
+            add_client_hook(agent, functools.partial(_count_attempts, tracer))
+        executor = getattr(agent, "_code_executor", None)
+        if executor is not None:
+            executor.execute_code_blocks = _timed(tracer, executor.execute_code_blocks, f"execute {agent.name}", "code")
+        for entry in agent._reply_func_list:
+            func = entry["reply_func"]
+            if not getattr(func, "__module__", "").startswith("autogen"):
+                name = getattr(func, "__name__", "reply_func")
+                entry["reply_func"] = _timed(tracer, func, f"{name} {agent.name}", "callback")
+                ignored = getattr(agent, "_ignore_async_func_in_sync_chat_list", None)
+                if ignored is not None and func in ignored:
+                    # Registered with ignore_async_in_sync_chat=True; the wrapper is too.
+                    ignored.append(entry["reply_func"])
+    team.tracer = tracer
+    return tracer